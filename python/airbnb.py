@@ -1,6 +1,10 @@
 import os
 from tzafon import Computer
-from utils import ensure_dir, timestamp, download_to_file
+from cas import dedupe
+from rate_limit import throttle_create
+from readiness import Readiness
+from storage import new_result_path
+from utils import ensure_dir, download_to_file
 
 
 def run() -> None:
@@ -8,12 +12,10 @@ def run() -> None:
     ensure_dir(out_dir)
 
     client = Computer()
+    throttle_create()
     computer = client.create(kind="browser")
     computer.navigate("https://www.airbnb.com/")
-    try:
-        computer.wait(2)
-    except Exception:
-        pass
+    Readiness.from_env().settle(computer, "https://www.airbnb.com/")
 
     result = computer.screenshot()
     try:
@@ -22,8 +24,9 @@ def run() -> None:
         url = None
     print(f"Screenshot: {url}")
     if url:
-        img = os.path.join(out_dir, f"{timestamp('airbnb_')}.png")
+        img = new_result_path(out_dir, 'airbnb_')
         download_to_file(url, img)
+        img = dedupe(img, label="airbnb")
         print(f"Saved: {img}")
 
 
@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from playwright_runtime import PlaywrightThread
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class _Slot:
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.thread: Optional[PlaywrightThread] = None
+        self.browser: Any = None
+        self.pages = 0
+        self.launched_at = 0.0
+
+
+class BrowserPool:
+    """Pre-launched Chromium browsers shared by request handlers.
+
+    Each slot owns a ``PlaywrightThread`` and the browser launched on it, so
+    callers on any thread can borrow a browser through ``run``. When every
+    slot is busy callers queue (FIFO) until one is released or
+    ``acquire_timeout_s`` expires. Slots are relaunched after ``max_pages``
+    pages or ``max_age_s`` seconds, and whenever the browser disconnects.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_pages: int = 200,
+        max_age_s: float = 900.0,
+        acquire_timeout_s: float = 60.0,
+        launch_options: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.size = max(1, int(size))
+        self.max_pages = max(1, int(max_pages))
+        self.max_age_s = float(max_age_s)
+        self.acquire_timeout_s = float(acquire_timeout_s)
+        self.launch_options: Dict[str, Any] = dict(launch_options or {'headless': True})
+        self._slots: List[_Slot] = [_Slot(i) for i in range(self.size)]
+        self._idle: Deque[_Slot] = deque()
+        self._cond = threading.Condition()
+        self._waiting = 0
+        self._launches = 0
+        self._recycled = 0
+        self._closed = False
+
+    # --- lifecycle ---
+    def start(self) -> 'BrowserPool':
+        """Launch every slot in parallel; blocks until all browsers are up."""
+        with ThreadPoolExecutor(max_workers=self.size) as ex:
+            for fut in [ex.submit(self._boot, slot) for slot in self._slots]:
+                fut.result()
+        return self
+
+    def _boot(self, slot: _Slot) -> None:
+        slot.thread = PlaywrightThread(name=f'browser-pool-{slot.index}').start()
+        self._launch(slot)
+        with self._cond:
+            self._idle.append(slot)
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._idle.clear()
+            self._cond.notify_all()
+        for slot in self._slots:
+            self._close_browser(slot)
+            if slot.thread is not None:
+                slot.thread.stop()
+                slot.thread = None
+
+    def _launch(self, slot: _Slot) -> None:
+        assert slot.thread is not None
+        opts = self.launch_options
+        slot.browser = slot.thread.call(lambda p: p.chromium.launch(**opts))
+        slot.pages = 0
+        slot.launched_at = time.monotonic()
+        with self._cond:
+            self._launches += 1
+
+    def _close_browser(self, slot: _Slot) -> None:
+        browser, slot.browser = slot.browser, None
+        if browser is None or slot.thread is None:
+            return
+        try:
+            slot.thread.call(lambda _p: browser.close(), timeout=30)
+        except Exception:
+            pass
+
+    def _healthy(self, slot: _Slot) -> bool:
+        if slot.browser is None or slot.thread is None:
+            return False
+        browser = slot.browser
+        try:
+            return bool(slot.thread.call(lambda _p: browser.is_connected(), timeout=10))
+        except Exception:
+            return False
+
+    def _needs_recycle(self, slot: _Slot) -> bool:
+        if slot.pages >= self.max_pages:
+            return True
+        return self.max_age_s > 0 and (time.monotonic() - slot.launched_at) >= self.max_age_s
+
+    # --- leasing ---
+    def _acquire(self, timeout: Optional[float]) -> _Slot:
+        limit = self.acquire_timeout_s if timeout is None else timeout
+        deadline = time.monotonic() + limit
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._idle:
+                    if self._closed:
+                        raise RuntimeError('browser pool is closed')
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f'no browser available after {limit:.1f}s')
+                    self._cond.wait(remaining)
+                return self._idle.popleft()
+            finally:
+                self._waiting -= 1
+
+    def _release(self, slot: _Slot) -> None:
+        if self._closed:
+            return
+        if self._needs_recycle(slot) or not self._healthy(slot):
+            # Relaunch in the background so the caller is not held up.
+            with self._cond:
+                self._recycled += 1
+            threading.Thread(
+                target=self._relaunch, args=(slot,), name=f'browser-pool-recycle-{slot.index}', daemon=True,
+            ).start()
+            return
+        with self._cond:
+            self._idle.append(slot)
+            self._cond.notify()
+
+    def _relaunch(self, slot: _Slot) -> None:
+        try:
+            self._close_browser(slot)
+            self._launch(slot)
+        except Exception:
+            slot.browser = None
+        with self._cond:
+            if not self._closed:
+                self._idle.append(slot)
+                self._cond.notify()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None) -> Iterator[_Slot]:
+        slot = self._acquire(timeout)
+        try:
+            if not self._healthy(slot):
+                self._close_browser(slot)
+                self._launch(slot)
+            yield slot
+        finally:
+            self._release(slot)
+
+    def run(self, fn: Callable[..., Any], *args: Any, pages: int = 1, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """Run ``fn(browser, *args, **kwargs)`` on a pooled browser's thread.
+
+        ``pages`` is the number of pages the call opens; it counts towards
+        the slot's recycle threshold.
+        """
+        with self.lease(timeout) as slot:
+            browser = slot.browser
+            try:
+                return slot.thread.call(lambda _p: fn(browser, *args, **kwargs))  # type: ignore[union-attr]
+            finally:
+                slot.pages += max(0, int(pages))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'busy': self.size - len(self._idle),
+                'waiting': self._waiting,
+                'launches': self._launches,
+                'recycled': self._recycled,
+            }
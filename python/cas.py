@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from storage import pack
+from utils import ensure_dir
+
+try:  # optional: perceptual hashing for near-duplicates
+    from PIL import Image  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    Image = None  # type: ignore
+
+# dHash bands used to find near-duplicate candidates: with a threshold below
+# _BANDS, two hashes that close must agree exactly on at least one band
+_BANDS = 4
+_BAND_BITS = 64 // _BANDS
+
+
+def dhash(path_or_file: Any) -> int:
+    """64-bit difference hash of an image (needs Pillow)."""
+    if Image is None:
+        raise RuntimeError('Pillow not installed. Run: pip install pillow')
+    with Image.open(path_or_file) as img:
+        pixels = list(img.convert('L').resize((9, 8), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+class ContentStore:
+    """Content-addressed screenshot store.
+
+    Images are stored once under ``blobs/ab/cd/<sha256>.png`` and every
+    capture appends a line to ``manifest.jsonl`` pointing at its blob, so
+    identical captures cost one file. With ``perceptual`` (requires
+    Pillow), an image whose dHash is within ``threshold`` bits of a stored
+    one is treated as a duplicate of it and not written at all. Writes go
+    through ``writer`` (a ``WriteBehind``) when given.
+    """
+
+    def __init__(self, root: str, perceptual: bool = False, threshold: int = 3, writer: Any = None) -> None:
+        self.root = root
+        self.threshold = max(0, min(int(threshold), _BANDS - 1))
+        self.perceptual = bool(perceptual)
+        if self.perceptual and Image is None:
+            print('[cas] Pillow not installed; perceptual dedup disabled')
+            self.perceptual = False
+        self.writer = writer
+        self._lock = threading.Lock()
+        self._pending: Dict[str, 'Future[int]'] = {}  # digest -> write in flight
+        self._bands: List[Dict[int, List[Tuple[int, str]]]] = [{} for _ in range(_BANDS)]
+        self._stored = 0
+        self._duplicates = 0
+        self._near = 0
+        self._bytes_saved = 0
+        ensure_dir(os.path.join(root, 'blobs'))
+        if self.perceptual:
+            self._load_hashes()
+
+    @classmethod
+    def from_env(cls, writer: Any = None) -> Optional['ContentStore']:
+        """Build from RESULTS_CAS_* variables; None unless RESULTS_CAS_DIR is set."""
+        root = os.environ.get('RESULTS_CAS_DIR')
+        if not root:
+            return None
+        return cls(
+            root,
+            perceptual=os.environ.get('RESULTS_CAS_PERCEPTUAL', '0') == '1',
+            threshold=int(os.environ.get('RESULTS_CAS_THRESHOLD', '3')),
+            writer=writer,
+        )
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'blobs', digest[:2], digest[2:4], f'{digest}.png')
+
+    def has(self, digest: str) -> bool:
+        """True if an image with this SHA-256 is stored (or being written)."""
+        with self._lock:
+            if digest in self._pending:
+                return True
+        return os.path.exists(self.blob_path(digest))
+
+    def put(self, data: Any, **meta: Any) -> Dict[str, Any]:
+        """Store PNG bytes; returns ``{'path', 'sha256', 'duplicate', 'saved'}``.
+
+        ``path`` is the shared blob; ``saved`` is the pending write (a
+        ``Future``) or None when nothing had to be written.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        size = memoryview(data).nbytes
+        phash = dhash(_BytesReader(data)) if self.perceptual else None
+        return self._admit(digest, size, phash, meta, lambda path: self._write(path, data))
+
+    def put_file(self, path: str, **meta: Any) -> Dict[str, Any]:
+        """Move an already written file into the store (or delete it if it is a duplicate)."""
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        size = os.path.getsize(path)
+        phash = dhash(path) if self.perceptual else None
+
+        def move(blob: str) -> None:
+            ensure_dir(os.path.dirname(blob))
+            os.replace(path, blob)
+
+        stored = self._admit(digest, size, phash, meta, move)
+        if stored['duplicate'] and os.path.exists(path):
+            os.remove(path)
+        return stored
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'stored': self._stored,
+                'duplicates': self._duplicates,
+                'near_duplicates': self._near,
+                'bytes_saved': self._bytes_saved,
+                'perceptual': self.perceptual,
+            }
+
+    # --- internals ---
+    def _admit(self, digest: str, size: int, phash: Optional[int], meta: Dict[str, Any], store: Any) -> Dict[str, Any]:
+        saved: Optional['Future[int]'] = None
+        near: Optional[str] = None
+        with self._lock:
+            duplicate = digest in self._pending or os.path.exists(self.blob_path(digest))
+            if not duplicate and phash is not None:
+                near = self._find_near(phash)
+            if duplicate or near:
+                saved = self._pending.get(digest) if duplicate else self._pending.get(near or '')
+                self._duplicates += 1
+                self._near += 0 if duplicate else 1
+                self._bytes_saved += size
+            else:
+                saved = Future()
+                self._pending[digest] = saved
+                self._stored += 1
+                if phash is not None:
+                    self._index_hash(phash, digest)
+        target = near or digest
+        if not duplicate and not near:
+            assert saved is not None
+            try:
+                result = store(self.blob_path(digest))
+            except BaseException as e:
+                with self._lock:
+                    self._pending.pop(digest, None)
+                saved.set_exception(e)
+                raise
+            self._chain(digest, saved, result)
+        self._record(target, digest, phash, duplicate or bool(near), meta)
+        return {'path': self.blob_path(target), 'sha256': target, 'duplicate': duplicate or bool(near), 'saved': saved}
+
+    def _write(self, blob: str, data: Any) -> Any:
+        if self.writer is not None:
+            return self.writer.write(blob, data)
+        ensure_dir(os.path.dirname(blob))
+        part = f'{blob}.{os.getpid()}.{threading.get_ident()}.part'
+        with open(part, 'wb') as f:
+            f.write(data)
+        os.replace(part, blob)
+        return None
+
+    def _chain(self, digest: str, saved: 'Future[int]', result: Any) -> None:
+        # Settle our future when the underlying write (sync or write-behind) is done
+        def done(fut: Optional[Future] = None) -> None:
+            with self._lock:
+                self._pending.pop(digest, None)
+            if fut is not None and fut.exception() is not None:
+                saved.set_exception(fut.exception())
+            else:
+                saved.set_result(fut.result() if fut is not None else 0)
+
+        if isinstance(result, Future):
+            result.add_done_callback(done)
+        else:
+            done()
+
+    def _record(self, target: str, digest: str, phash: Optional[int], duplicate: bool, meta: Dict[str, Any]) -> None:
+        entry: Dict[str, Any] = {'ts': round(time.time(), 3), 'sha256': target, 'duplicate': duplicate}
+        if digest != target:
+            entry['near_of'] = target
+            entry['own_sha256'] = digest
+        if phash is not None:
+            entry['dhash'] = f'{phash:016x}'
+        entry.update(meta)
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            with open(os.path.join(self.root, 'manifest.jsonl'), 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def _index_hash(self, phash: int, digest: str) -> None:  # lock held
+        for band in range(_BANDS):
+            key = (phash >> (band * _BAND_BITS)) & ((1 << _BAND_BITS) - 1)
+            self._bands[band].setdefault(key, []).append((phash, digest))
+
+    def _find_near(self, phash: int) -> Optional[str]:  # lock held
+        for band in range(_BANDS):
+            key = (phash >> (band * _BAND_BITS)) & ((1 << _BAND_BITS) - 1)
+            for other, digest in self._bands[band].get(key, ()):
+                if bin(other ^ phash).count('1') <= self.threshold:
+                    return digest
+        return None
+
+    def _load_hashes(self) -> None:
+        try:
+            f = open(os.path.join(self.root, 'manifest.jsonl'), 'r', encoding='utf-8')
+        except OSError:
+            return
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('duplicate') or 'dhash' not in entry:
+                    continue
+                self._index_hash(int(entry['dhash'], 16), entry['sha256'])
+
+
+class _BytesReader:
+    """Minimal file object over a bytes-like buffer, for Pillow, without copying it."""
+
+    def __init__(self, data: Any) -> None:
+        self._view = memoryview(data).cast('B')
+        self._pos = 0
+
+    def read(self, n: int = -1) -> bytes:
+        end = len(self._view) if n is None or n < 0 else min(len(self._view), self._pos + n)
+        chunk = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return chunk
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        base = {0: 0, 1: self._pos, 2: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+_DEFAULT: Optional[ContentStore] = None
+_DEFAULT_LOCK = threading.Lock()
+_DEFAULT_READY = False
+
+
+def dedupe(path: str, **meta: Any) -> str:
+    """Move a finished result file into the env-configured store; returns the path to use.
+
+    Without RESULTS_CAS_DIR the file is packed into a segment when
+    RESULTS_LAYOUT=segment and returned unchanged otherwise.
+    """
+    global _DEFAULT, _DEFAULT_READY
+    with _DEFAULT_LOCK:
+        if not _DEFAULT_READY:
+            _DEFAULT = ContentStore.from_env()
+            _DEFAULT_READY = True
+    if _DEFAULT is None:
+        return pack(path)
+    if not path or not os.path.exists(path):
+        return path
+    return _DEFAULT.put_file(path, **meta)['path']
@@ -0,0 +1,290 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from playwright_runtime import PlaywrightThread
+
+
+class _Connection:
+    def __init__(self, endpoint: str, thread: PlaywrightThread, browser: Any) -> None:
+        self.endpoint = endpoint
+        self.thread = thread
+        self.browser = browser
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        self.uses = 0
+
+
+class _Stale(Exception):
+    """The connection was found dropped on the driver thread, before or during a call."""
+
+
+class CdpConnectionCache:
+    """Open ``connect_over_cdp`` sessions kept alive between requests.
+
+    Connections are keyed by endpoint (``cdp_url`` or ``ws_url``) and share
+    a small fixed set of ``PlaywrightThread`` drivers (``drivers``, one Node
+    process each); a new connection goes to the driver holding the fewest.
+    Calls on the same driver are serialised, so ``drivers`` bounds both the
+    driver processes and how many captures run at once.
+    Entries idle for ``idle_timeout_s`` are closed (by a background reaper
+    once ``start_reaper`` is called, and on every checkout), the least recently used
+    idle entry is evicted beyond ``max_size``, and a connection that has been
+    idle for ``probe_after_s`` is probed with a CDP round trip before reuse.
+    If a call fails because the connection dropped, it is reconnected and
+    the call retried once.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 16,
+        idle_timeout_s: float = 300.0,
+        probe_after_s: float = 30.0,
+        drivers: int = 2,
+    ) -> None:
+        self.max_size = max(1, int(max_size))
+        self.drivers = max(1, int(drivers))
+        self._drivers: List[Optional[PlaywrightThread]] = [None] * self.drivers
+        self._connecting = [0] * self.drivers
+        self.idle_timeout_s = float(idle_timeout_s)
+        self.probe_after_s = float(probe_after_s)
+        self._conns: 'OrderedDict[str, _Connection]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._reconnects = 0
+        self._evictions = 0
+        self._stop = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+
+    def run(self, endpoint: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn(browser, *args, **kwargs)`` against a cached connection."""
+        for attempt in range(2):
+            conn, probe = self._checkout(endpoint)
+            browser = conn.browser
+
+            def _call(_p: Any) -> Any:
+                # Probe and liveness check run in the same driver call as fn,
+                # so they never time out queued behind other connections' work
+                if probe and not _round_trip(browser):
+                    raise _Stale(f'CDP connection to {endpoint} dropped')
+                try:
+                    return fn(browser, *args, **kwargs)
+                except Exception as e:
+                    if not attempt and not browser.is_connected():
+                        raise _Stale(f'CDP connection to {endpoint} dropped') from e
+                    raise
+
+            try:
+                return conn.thread.call(_call)
+            except _Stale as e:
+                if attempt:
+                    raise e.__cause__ or e
+                with self._lock:
+                    self._reconnects += 1
+                self._drop(conn)
+            finally:
+                self._checkin(conn)
+        raise RuntimeError('unreachable')  # pragma: no cover
+
+    def discard(self, endpoint: str) -> None:
+        with self._lock:
+            conn = self._conns.pop(endpoint, None)
+        if conn is not None:
+            self._close(conn)
+
+    def discard_local(self, port: int) -> None:
+        """Drop every connection to a local debugging ``port``, whether keyed by ``cdp_url`` or ``ws_url``."""
+        with self._lock:
+            conns = []
+            for endpoint in list(self._conns):
+                try:
+                    parsed = urlparse(endpoint)
+                    local = parsed.hostname in ('127.0.0.1', 'localhost') and parsed.port == port
+                except ValueError:
+                    continue
+                if local:
+                    conns.append(self._conns.pop(endpoint))
+        for conn in conns:
+            self._close(conn)
+
+    def close_all(self) -> None:
+        self._stop.set()
+        with self._lock:
+            conns = list(self._conns.values())
+            self._conns.clear()
+            drivers = [d for d in self._drivers if d is not None]
+            self._drivers = [None] * self.drivers
+        for conn in conns:
+            self._close(conn)
+        for driver in drivers:
+            driver.stop()
+
+    def start_reaper(self) -> None:
+        if self._reaper is not None or self.idle_timeout_s <= 0:
+            return
+        self._reaper = threading.Thread(target=self._reap_loop, name='cdp-cache-reaper', daemon=True)
+        self._reaper.start()
+
+    def stats(self) -> Dict[str, Any]:
+        self._reap()
+        with self._lock:
+            return {
+                'open': len(self._conns),
+                'max_size': self.max_size,
+                'drivers': sum(1 for d in self._drivers if d is not None),
+                'hits': self._hits,
+                'misses': self._misses,
+                'reconnects': self._reconnects,
+                'evictions': self._evictions,
+            }
+
+    # --- internals ---
+    def _checkout(self, endpoint: str) -> Tuple[_Connection, bool]:
+        """Check out a connection to ``endpoint``; the flag says whether to probe it before use."""
+        self._reap()
+        probe = False
+        with self._lock:
+            conn = self._conns.get(endpoint)
+            if conn is not None:
+                self._conns.move_to_end(endpoint)
+                now = time.monotonic()
+                # Only an unused connection can be idle
+                probe = conn.in_use == 0 and now - conn.last_used >= self.probe_after_s
+                conn.in_use += 1
+                conn.last_used = now
+                self._hits += 1
+                return conn, probe
+
+        new = self._connect(endpoint)
+        with self._lock:
+            self._misses += 1
+            existing = self._conns.get(endpoint)
+            if existing is not None:
+                # Another thread connected first; keep theirs
+                existing.in_use += 1
+                self._conns.move_to_end(endpoint)
+                conn = existing
+            else:
+                new.in_use += 1
+                self._conns[endpoint] = new
+                conn = new
+            evicted = self._evict_over_capacity()
+        if conn is not new:
+            self._close(new)
+        for old in evicted:
+            self._close(old)
+        return conn, False
+
+    def _checkin(self, conn: _Connection) -> None:
+        with self._lock:
+            conn.in_use = max(0, conn.in_use - 1)
+            conn.uses += 1
+            conn.last_used = time.monotonic()
+
+    def _connect(self, endpoint: str) -> _Connection:
+        thread, slot = self._driver()
+        try:
+            browser = thread.call(lambda p: p.chromium.connect_over_cdp(endpoint))
+        finally:
+            with self._lock:
+                self._connecting[slot] -= 1
+        return _Connection(endpoint, thread, browser)
+
+    def _driver(self) -> Tuple[PlaywrightThread, int]:
+        """Return the shared driver holding the fewest connections and its slot, starting it if needed.
+
+        The caller's connect is counted against the slot until it
+        decrements ``_connecting[slot]``.
+        """
+        with self._lock:
+            load = list(self._connecting)
+            for conn in self._conns.values():
+                for i, d in enumerate(self._drivers):
+                    if conn.thread is d:
+                        load[i] += 1
+            index = min(range(self.drivers), key=lambda i: load[i])
+            self._connecting[index] += 1
+            driver = self._drivers[index]
+            if driver is not None and not driver.closed:
+                return driver, index
+            driver = self._drivers[index] = PlaywrightThread(name=f'cdp-driver-{index}')
+        # Started outside the lock; calls from racing callers queue behind start()
+        try:
+            return driver.start(), index
+        except Exception:
+            with self._lock:
+                self._connecting[index] -= 1
+                if self._drivers[index] is driver:
+                    self._drivers[index] = None
+            driver.stop()
+            raise
+
+    def _drop(self, conn: _Connection) -> None:
+        with self._lock:
+            if self._conns.get(conn.endpoint) is conn:
+                del self._conns[conn.endpoint]
+        self._close(conn)
+
+    def _close(self, conn: _Connection) -> None:
+        browser = conn.browser
+        try:
+            conn.thread.call(lambda _p: browser.close(), timeout=15)
+        except Exception:
+            pass
+
+    def _evict_over_capacity(self) -> List[_Connection]:
+        # Caller holds self._lock
+        evicted: List[_Connection] = []
+        if len(self._conns) <= self.max_size:
+            return evicted
+        for endpoint in list(self._conns.keys()):
+            if len(self._conns) <= self.max_size:
+                break
+            conn = self._conns[endpoint]
+            if conn.in_use == 0:
+                del self._conns[endpoint]
+                evicted.append(conn)
+                self._evictions += 1
+        return evicted
+
+    def _reap_loop(self) -> None:
+        while not self._stop.wait(self.idle_timeout_s):
+            try:
+                self._reap()
+            except Exception as e:  # noqa: BLE001
+                print(f"[cdp-cache-reaper] {e}")
+
+    def _reap(self) -> None:
+        if self.idle_timeout_s <= 0:
+            return
+        now = time.monotonic()
+        expired: List[_Connection] = []
+        with self._lock:
+            for endpoint, conn in list(self._conns.items()):
+                if conn.in_use == 0 and now - conn.last_used >= self.idle_timeout_s:
+                    del self._conns[endpoint]
+                    expired.append(conn)
+                    self._evictions += 1
+        for conn in expired:
+            self._close(conn)
+
+
+def _round_trip(browser: Any) -> bool:
+    """CDP round trip on a connected browser; runs on its driver thread."""
+    try:
+        if not browser.is_connected():
+            return False
+        session = browser.new_browser_cdp_session()
+        try:
+            session.send('Browser.getVersion')
+        finally:
+            try:
+                session.detach()
+            except Exception:
+                pass
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,313 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Hashable, Iterator, List, Optional
+
+from browser_pool import PoolTimeout
+
+
+class _Entry:
+    __slots__ = ('item', 'created_at', 'leased_at')
+
+    def __init__(self, item: Any) -> None:
+        self.item = item
+        self.created_at = time.monotonic()
+        self.leased_at = 0.0
+
+
+class ComputerPool:
+    """Pre-created cloud computers, refilled in the background.
+
+    ``create()`` provisions one computer and ``destroy(item)`` shuts it down;
+    items must be hashable (an id or an SDK object). A filler thread keeps
+    ``size`` computers ready, so ``acquire`` usually returns at once; when
+    none is ready the caller creates one itself if there is room. Ready,
+    leased, creating and closing computers together never exceed
+    ``max_total`` (the account's concurrency limit); past that, callers wait
+    up to ``acquire_timeout_s``. Ready computers older than ``max_age_s`` or
+    failing ``healthy`` are closed and replaced. A leased computer counts
+    until it is released or ``forget``-ed; one leased for longer than
+    ``max_lease_s`` is closed and counts until that is done.
+    """
+
+    def __init__(
+        self,
+        create: Callable[[], Hashable],
+        destroy: Callable[[Any], None],
+        healthy: Optional[Callable[[Any], bool]] = None,
+        size: int = 2,
+        max_total: int = 10,
+        max_age_s: float = 600.0,
+        max_lease_s: float = 3600.0,
+        acquire_timeout_s: float = 180.0,
+        health_interval_s: float = 30.0,
+    ) -> None:
+        self._create = create
+        self._destroy = destroy
+        self._healthy = healthy
+        self.max_total = max(1, int(max_total))
+        self.size = max(0, min(int(size), self.max_total))
+        self.max_age_s = float(max_age_s)
+        self.max_lease_s = float(max_lease_s)
+        self.acquire_timeout_s = float(acquire_timeout_s)
+        self.health_interval_s = max(1.0, float(health_interval_s))
+        self._ready: Deque[_Entry] = deque()
+        self._leased: Dict[Any, _Entry] = {}
+        self._creating = 0
+        self._closing = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._backoff_s = 0.0
+        self._backoff_until = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=max(2, self.size), thread_name_prefix='computer-pool')
+        self._filler: Optional[threading.Thread] = None
+        self._created = 0
+        self._create_errors = 0
+        self._recycled = 0
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def from_env(
+        cls, create: Callable[[], Hashable], destroy: Callable[[Any], None], healthy: Optional[Callable[[Any], bool]] = None,
+    ) -> Optional['ComputerPool']:
+        """Build from COMPUTER_POOL_* variables; None when COMPUTER_POOL_SIZE is 0."""
+        size = int(os.environ.get('COMPUTER_POOL_SIZE', '0'))
+        if size <= 0:
+            return None
+        return cls(
+            create,
+            destroy,
+            healthy,
+            size=size,
+            max_total=int(os.environ.get('COMPUTER_POOL_MAX', '10')),
+            max_age_s=float(os.environ.get('COMPUTER_POOL_MAX_AGE_S', '600')),
+            max_lease_s=float(os.environ.get('COMPUTER_POOL_MAX_LEASE_S', '3600')),
+            acquire_timeout_s=float(os.environ.get('COMPUTER_POOL_WAIT_S', '180')),
+        )
+
+    # --- lifecycle ---
+    def start(self) -> 'ComputerPool':
+        """Start the background filler; does not wait for the first computers."""
+        if self._filler is None:
+            self._filler = threading.Thread(target=self._fill_loop, name='computer-pool-filler', daemon=True)
+            self._filler.start()
+        return self
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            ready = [e.item for e in self._ready]
+            self._ready.clear()
+            self._cond.notify_all()
+        for item in ready:
+            self._safe_destroy(item)
+        self._executor.shutdown(wait=False)
+
+    # --- leasing ---
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        limit = self.acquire_timeout_s if timeout is None else timeout
+        deadline = time.monotonic() + limit
+        stale: List[_Entry] = []
+        try:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError('computer pool is closed')
+                    while self._ready:
+                        entry = self._ready.popleft()
+                        if self._expired(entry):
+                            stale.append(entry)
+                            self._closing += 1
+                            continue
+                        self._hits += 1
+                        self._lease(entry)
+                        self._cond.notify_all()  # wake the filler to replace it
+                        return entry.item
+                    if self._total() < self.max_total:
+                        # Nothing warm: provision on the caller's thread rather than wait for the filler
+                        self._creating += 1
+                        self._misses += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f'no computer available after {limit:.1f}s ({self.max_total} in use)')
+                    self._cond.wait(remaining)
+        finally:
+            for entry in stale:
+                self._submit(self._retire, entry.item)
+
+        try:
+            item = self._create()
+        except Exception:
+            with self._cond:
+                self._creating -= 1
+                self._create_errors += 1
+                self._cond.notify_all()
+            raise
+        entry = _Entry(item)
+        with self._cond:
+            self._creating -= 1
+            self._created += 1
+            self._lease(entry)
+        return item
+
+    def release(self, item: Any, reuse: bool = False) -> None:
+        """Hand a leased computer back; it is closed unless ``reuse`` and still fresh."""
+        with self._cond:
+            entry = self._leased.pop(item, None)
+            if entry is None:
+                return
+            if reuse and not self._closed and not self._expired(entry):
+                self._ready.append(entry)
+                self._cond.notify_all()
+                return
+            self._closing += 1
+        self._submit(self._retire, item)
+
+    def forget(self, item: Any) -> None:
+        """Stop counting a leased computer that the caller closed itself."""
+        with self._cond:
+            if self._leased.pop(item, None) is not None:
+                self._cond.notify_all()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None, reuse: bool = False) -> Iterator[Any]:
+        item = self.acquire(timeout)
+        ok = False
+        try:
+            yield item
+            ok = True
+        finally:
+            self.release(item, reuse=reuse and ok)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'size': self.size,
+                'max_total': self.max_total,
+                'ready': len(self._ready),
+                'leased': len(self._leased),
+                'creating': self._creating,
+                'closing': self._closing,
+                'created': self._created,
+                'create_errors': self._create_errors,
+                'recycled': self._recycled,
+                'hits': self._hits,
+                'misses': self._misses,
+            }
+
+    # --- internals (call with the lock held where noted) ---
+    def _total(self) -> int:  # lock held
+        return len(self._ready) + len(self._leased) + self._creating + self._closing
+
+    def _lease(self, entry: _Entry) -> None:  # lock held
+        entry.leased_at = time.monotonic()
+        self._leased[entry.item] = entry
+
+    def _expired(self, entry: _Entry) -> bool:
+        return self.max_age_s > 0 and time.monotonic() - entry.created_at >= self.max_age_s
+
+    def _submit(self, fn: Callable[..., None], *args: Any) -> None:
+        try:
+            self._executor.submit(fn, *args)
+        except RuntimeError:
+            fn(*args)  # executor already shut down by close()
+
+    def _safe_destroy(self, item: Any) -> None:
+        try:
+            self._destroy(item)
+        except Exception as e:  # noqa: BLE001
+            print(f"[computer-pool] close failed: {e}")
+
+    def _retire(self, item: Any) -> None:
+        self._safe_destroy(item)
+        with self._cond:
+            self._closing -= 1
+            self._recycled += 1
+            self._cond.notify_all()
+
+    def _fill_one(self) -> None:
+        try:
+            item = self._create()
+        except Exception as e:  # noqa: BLE001
+            with self._cond:
+                self._creating -= 1
+                self._create_errors += 1
+                # Back off (capacity errors, outages) instead of hammering the API
+                self._backoff_s = min(max(1.0, self._backoff_s * 2), 60.0)
+                self._backoff_until = time.monotonic() + self._backoff_s
+                self._cond.notify_all()
+            print(f"[computer-pool] create failed, retrying in {self._backoff_s:.0f}s: {e}")
+            return
+        with self._cond:
+            self._creating -= 1
+            self._created += 1
+            self._backoff_s = 0.0
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                self._ready.append(_Entry(item))
+            self._cond.notify_all()
+        if closed:
+            self._safe_destroy(item)
+
+    def _fill_loop(self) -> None:
+        next_sweep = time.monotonic() + self.health_interval_s
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                n = 0
+                if now >= self._backoff_until:
+                    want = self.size - len(self._ready) - self._creating
+                    n = max(0, min(want, self.max_total - self._total()))
+                    self._creating += n
+                if n == 0:
+                    wake = min(next_sweep, self._backoff_until) if self._backoff_until > now else next_sweep
+                    self._cond.wait(max(0.05, wake - now))
+            for _ in range(n):
+                self._submit(self._fill_one)
+            if time.monotonic() >= next_sweep:
+                self._sweep()
+                next_sweep = time.monotonic() + self.health_interval_s
+
+    def _sweep(self) -> None:
+        """Close ready computers that are too old or unhealthy, and overdue leases."""
+        now = time.monotonic()
+        overdue = []
+        with self._cond:
+            if self.max_lease_s > 0:
+                for item, entry in list(self._leased.items()):
+                    if now - entry.leased_at >= self.max_lease_s:
+                        # Still running until destroyed: keep it counted as closing
+                        del self._leased[item]
+                        self._closing += 1
+                        overdue.append(item)
+            candidates = list(self._ready)
+        for item in overdue:
+            print(f"[computer-pool] lease exceeded {self.max_lease_s:.0f}s; closing it")
+            self._submit(self._retire, item)
+        bad = [e for e in candidates if self._expired(e) or (self._healthy is not None and not self._probe(e.item))]
+        with self._cond:
+            retired = []
+            for entry in bad:
+                if entry in self._ready:
+                    self._ready.remove(entry)
+                    self._closing += 1
+                    retired.append(entry.item)
+            self._cond.notify_all()
+        for item in retired:
+            self._submit(self._retire, item)
+
+    def _probe(self, item: Any) -> bool:
+        assert self._healthy is not None
+        try:
+            return bool(self._healthy(item))
+        except Exception:
+            return False
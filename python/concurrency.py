@@ -0,0 +1,123 @@
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class AimdController:
+    """Shared in-flight limit for computer creation, tuned by capacity errors.
+
+    Workers ``acquire`` a slot before creating a computer and ``release`` it
+    once the computer is gone. Every successful create (``on_success``)
+    grows the limit: by one per success until the first capacity error
+    (slow start), then by one per ``limit`` successes (additive increase).
+    A capacity error (``on_capacity``, e.g. a 429) multiplies it by
+    ``decrease``, at most once per ``cooldown_s`` so one burst of 429s
+    counts once. The limit stays between ``min_limit`` and ``max_limit``.
+    While errors keep coming, ``backoff_s`` grows for everyone at once
+    instead of per worker, so retries do not arrive as a herd.
+    """
+
+    def __init__(
+        self,
+        initial: int = 2,
+        min_limit: int = 1,
+        max_limit: int = 10,
+        decrease: float = 0.5,
+        cooldown_s: float = 5.0,
+    ) -> None:
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.decrease = min(max(float(decrease), 0.1), 0.9)
+        self.cooldown_s = max(0.0, float(cooldown_s))
+        self._limit = float(min(max(int(initial), self.min_limit), self.max_limit))
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._slow_start = True
+        self._last_cut = 0.0
+        self._streak = 0  # capacity errors since the last success
+        self._successes = 0
+        self._capacity_errors = 0
+        self._cuts = 0
+        self._peak = 0
+
+    @classmethod
+    def from_env(cls, max_limit: int) -> 'AimdController':
+        """Adaptive controller up to ``max_limit``; AIMD_START (2), AIMD_DECREASE (0.5), AIMD_COOLDOWN_S (5)."""
+        return cls(
+            initial=int(os.environ.get('AIMD_START', '2')),
+            max_limit=max_limit,
+            decrease=float(os.environ.get('AIMD_DECREASE', '0.5')),
+            cooldown_s=float(os.environ.get('AIMD_COOLDOWN_S', '5')),
+        )
+
+    @classmethod
+    def fixed(cls, limit: int) -> 'AimdController':
+        """A controller that never changes its limit (a plain semaphore with shared backoff)."""
+        return cls(initial=limit, min_limit=limit, max_limit=limit)
+
+    @property
+    def limit(self) -> int:
+        with self._cond:
+            return int(self._limit)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._in_flight < int(self._limit), timeout):
+                return False
+            self._in_flight += 1
+            self._peak = max(self._peak, self._in_flight)
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def over_limit(self) -> bool:
+        """True when more slots are held than the (lowered) limit allows."""
+        with self._cond:
+            return self._in_flight > int(self._limit)
+
+    def on_success(self) -> None:
+        with self._cond:
+            self._successes += 1
+            self._streak = 0
+            if self._slow_start:
+                self._limit += 1.0
+            else:
+                self._limit += 1.0 / max(self._limit, 1.0)
+            self._limit = min(self._limit, float(self.max_limit))
+            self._cond.notify_all()
+
+    def on_capacity(self) -> None:
+        with self._cond:
+            self._capacity_errors += 1
+            self._streak += 1
+            self._slow_start = False
+            now = time.monotonic()
+            if now - self._last_cut < self.cooldown_s:
+                return
+            self._last_cut = now
+            self._cuts += 1
+            self._limit = max(float(self.min_limit), self._limit * self.decrease)
+
+    def backoff_s(self) -> float:
+        """How long a worker should wait before retrying after a capacity error (jittered)."""
+        with self._cond:
+            streak = self._streak
+        return min(60.0, 2.0 ** min(streak, 6)) * random.uniform(0.5, 1.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'peak': self._peak,
+                'max_limit': self.max_limit,
+                'slow_start': self._slow_start,
+                'successes': self._successes,
+                'capacity_errors': self._capacity_errors,
+                'cuts': self._cuts,
+            }
@@ -0,0 +1,131 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:  # optional HTTP/2 backend
+    import httpx  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    httpx = None  # type: ignore
+
+# Exceptions either backend raises when a request could not complete (timeouts, resets, DNS, ...)
+TRANSPORT_ERRORS: Tuple[type, ...] = (requests.RequestException,) + ((httpx.HTTPError,) if httpx is not None else ())
+
+
+class HttpClient:
+    """Process-wide keep-alive connection pool for Tzafon API calls and downloads.
+
+    Backed by one ``requests.Session`` whose adapter keeps up to
+    ``per_host`` connections to each of ``hosts`` hosts; with ``block`` a
+    caller that would open one more waits for a free connection instead, so
+    no host sees more than ``per_host`` at once. With ``http2`` and ``httpx``
+    (plus ``h2``) installed, an ``httpx.Client`` multiplexing requests over
+    HTTP/2 is used instead; it caps connections per client, not per host.
+    Both are safe to share between threads.
+    """
+
+    def __init__(self, per_host: int = 8, hosts: int = 16, block: bool = True, http2: bool = False) -> None:
+        self.per_host = max(1, int(per_host))
+        self.hosts = max(1, int(hosts))
+        self.block = bool(block)
+        self.http2 = bool(http2) and httpx is not None
+        self._client: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> str:
+        return 'httpx/h2' if self.http2 else 'requests'
+
+    def _get(self) -> Any:
+        with self._lock:
+            if self._client is None:
+                self._client = self._build()
+            return self._client
+
+    def _build(self) -> Any:
+        if self.http2:
+            try:
+                limits = httpx.Limits(
+                    max_connections=self.per_host * self.hosts,
+                    max_keepalive_connections=self.per_host * self.hosts,
+                )
+                return httpx.Client(http2=True, limits=limits, follow_redirects=True)
+            except Exception as e:  # noqa: BLE001 - e.g. h2 missing
+                print(f"[http-client] HTTP/2 unavailable ({e}); using requests")
+                self.http2 = False
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.hosts, pool_maxsize=self.per_host, pool_block=self.block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def request(self, method: str, url: str, timeout: Any = 30, **kwargs: Any) -> Any:
+        """Like ``requests.request``; the response has ``status_code``/``json()``/``raise_for_status()``."""
+        return self._get().request(method, url, timeout=timeout, **kwargs)
+
+    @contextmanager
+    def stream(
+        self, url: str, headers: Optional[Dict[str, str]] = None, timeout: Any = 30, chunk_size: int = 64 * 1024,
+    ) -> Iterator[Tuple[Any, Iterator[bytes]]]:
+        """GET ``url`` without buffering the body: yields ``(response, chunks)``."""
+        client = self._get()
+        if self.http2:
+            if isinstance(timeout, tuple):  # requests-style (connect, read)
+                timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+            with client.stream('GET', url, headers=headers, timeout=timeout) as resp:
+                yield resp, resp.iter_bytes(chunk_size)
+            return
+        resp = client.get(url, headers=headers, timeout=timeout, stream=True)
+        try:
+            yield resp, resp.iter_content(chunk_size)
+        finally:
+            resp.close()
+
+    def close(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.backend, 'per_host': self.per_host, 'hosts': self.hosts, 'block': self.block}
+
+
+_DEFAULT: Optional[HttpClient] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def _from_env(per_host: Optional[int] = None) -> HttpClient:
+    return HttpClient(
+        per_host=per_host or int(os.environ.get('HTTP_POOL_PER_HOST', '8')),
+        hosts=int(os.environ.get('HTTP_POOL_HOSTS', '16')),
+        block=os.environ.get('HTTP_POOL_BLOCK', '1') != '0',
+        http2=os.environ.get('HTTP_CLIENT_HTTP2', '0') == '1',
+    )
+
+
+def configure(per_host: Optional[int] = None) -> HttpClient:
+    """Size the shared client (e.g. to the service's worker count); call before first use.
+
+    Other settings come from HTTP_POOL_HOSTS (16), HTTP_POOL_BLOCK (1) and
+    HTTP_CLIENT_HTTP2 (0); ``per_host`` defaults to HTTP_POOL_PER_HOST (8).
+    """
+    global _DEFAULT
+    new = _from_env(per_host)
+    with _DEFAULT_LOCK:
+        old, _DEFAULT = _DEFAULT, new
+    if old is not None:
+        old.close()
+    return new
+
+
+def client() -> HttpClient:
+    """The shared client, built from the environment on first use."""
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            _DEFAULT = _from_env()
+        return _DEFAULT
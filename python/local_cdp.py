@@ -0,0 +1,318 @@
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from playwright_runtime import PlaywrightThread
+
+
+def find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+def _port_answers(port: int) -> bool:
+    try:
+        requests.get(f'http://127.0.0.1:{port}/json/version', timeout=2)
+        return True
+    except Exception:
+        return False
+
+
+class _Instance:
+    def __init__(self, instance_id: str, pw: PlaywrightThread, browser: Any, port: int, headless: bool) -> None:
+        self.id = instance_id
+        self.pw = pw
+        self.browser = browser
+        self.port = port
+        self.headless = headless
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    @property
+    def cdp_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+
+class LocalCdpRegistry:
+    """Bounded registry of locally launched CDP-enabled Chromium instances.
+
+    All browsers are launched through a small fixed set of shared
+    Playwright drivers (``drivers``, one by default) instead of one Node
+    driver per browser; a new instance goes to the least loaded driver.
+    At most ``max_size`` instances live at once; creating one more closes
+    the least recently used. A background reaper closes instances idle for
+    ``idle_timeout_s``, drops ones whose browser died, and keeps retrying
+    debugging ports that still answer after their instance was closed
+    (orphans) until the process behind them is gone; an orphaned port is
+    not handed to a new instance until then. ``on_close`` is called
+    with the debugging port of every instance that is closed, so caches of
+    sessions to it (by ``cdp_url`` or ``ws_url``) can drop them.
+    """
+
+    KILL_TIMEOUT_MS = 5000
+
+    def __init__(
+        self,
+        max_size: int = 16,
+        idle_timeout_s: float = 600.0,
+        reap_interval_s: float = 30.0,
+        drivers: int = 1,
+        on_close: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        self.max_size = max(1, int(max_size))
+        self.drivers = max(1, int(drivers))
+        self._drivers: List[Optional[PlaywrightThread]] = [None] * self.drivers
+        self._launching = [0] * self.drivers  # browsers being launched on each driver
+        self.idle_timeout_s = float(idle_timeout_s)
+        self.reap_interval_s = max(1.0, float(reap_interval_s))
+        self._on_close = on_close
+        self._instances: 'OrderedDict[str, _Instance]' = OrderedDict()
+        self._orphans: Set[int] = set()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+        self._created = 0
+        self._evicted = 0
+        self._reaped = 0
+
+    # --- public API ---
+    def create(self, headless: bool = True, port: Optional[int] = None) -> Dict[str, Any]:
+        victims: List[_Instance] = []
+        with self._lock:
+            if port and int(port) in self._orphans:
+                raise RuntimeError(f'port {port} is still held by an orphaned browser')
+            while self._instances and len(self._instances) + self._pending >= self.max_size:
+                _, victim = self._instances.popitem(last=False)
+                victims.append(victim)
+                self._evicted += 1
+            if len(self._instances) + self._pending >= self.max_size:
+                raise RuntimeError(f'local CDP capacity reached ({self.max_size})')
+            self._pending += 1
+        instance: Optional[_Instance] = None
+        slot: Optional[int] = None
+        try:
+            for victim in victims:
+                self._shutdown(victim)
+            pw, slot = self._driver(launching=True)
+            instance = self._launch(pw, headless, int(port or 0) or self._free_port())
+        finally:
+            with self._lock:
+                self._pending -= 1
+                if slot is not None:
+                    self._launching[slot] -= 1
+                if instance is not None:
+                    # Registered in the same step, so _driver never loses sight of this browser
+                    self._instances[instance.id] = instance
+                    self._created += 1
+
+        ws_url: Optional[str] = None
+        try:
+            meta = requests.get(f'{instance.cdp_url}/json/version', timeout=5).json()
+            ws_url = meta.get('webSocketDebuggerUrl')
+        except Exception:
+            ws_url = None
+        return {
+            'id': instance.id,
+            'cdp_url': instance.cdp_url,
+            'ws_url': ws_url,
+            'port': instance.port,
+            'headless': instance.headless,
+        }
+
+    def get(self, instance_id: str) -> Optional[_Instance]:
+        """Look up an instance and mark it as recently used."""
+        with self._lock:
+            instance = self._instances.get(instance_id)
+            if instance is not None:
+                instance.last_used = time.monotonic()
+                self._instances.move_to_end(instance_id)
+            return instance
+
+    def touch_endpoint(self, endpoint: str) -> None:
+        """Mark the instance behind a raw ``cdp_url``/``ws_url`` as used, if it is ours."""
+        try:
+            parsed = urlparse(endpoint)
+        except Exception:
+            return
+        if parsed.hostname not in ('127.0.0.1', 'localhost') or not parsed.port:
+            return
+        with self._lock:
+            for instance in self._instances.values():
+                if instance.port == parsed.port:
+                    instance.last_used = time.monotonic()
+                    self._instances.move_to_end(instance.id)
+                    return
+
+    def close(self, instance_id: str) -> bool:
+        with self._lock:
+            instance = self._instances.pop(instance_id, None)
+        if instance is None:
+            return False
+        self._shutdown(instance)
+        return True
+
+    def close_all(self) -> None:
+        self._stop.set()
+        with self._lock:
+            instances = list(self._instances.values())
+            self._instances.clear()
+            drivers = [d for d in self._drivers if d is not None]
+            self._drivers = [None] * self.drivers
+        for instance in instances:
+            self._shutdown(instance)
+        for driver in drivers:
+            driver.stop()
+
+    def start_reaper(self) -> None:
+        if self._reaper is not None:
+            return
+        self._reaper = threading.Thread(target=self._reap_loop, name='local-cdp-reaper', daemon=True)
+        self._reaper.start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'open': len(self._instances),
+                'max_size': self.max_size,
+                'drivers': sum(1 for d in self._drivers if d is not None),
+                'created': self._created,
+                'evicted': self._evicted,
+                'reaped': self._reaped,
+                'orphaned_ports': sorted(self._orphans),
+            }
+
+    # --- internals ---
+    def _free_port(self) -> int:
+        """Pick a free port that is not listed as orphaned.
+
+        Orphaned ports stay off limits until the reaper drops them, so it
+        never sends ``Browser.close`` to a new browser that reused one.
+        """
+        for _ in range(16):
+            port = find_free_port()
+            with self._lock:
+                if port not in self._orphans:
+                    return port
+        raise RuntimeError('no free debugging port outside the orphaned ones')
+
+    def _driver(self, launching: bool = False) -> Tuple[PlaywrightThread, int]:
+        """Return the shared driver with the fewest instances and its slot, starting it if needed.
+
+        Launches still in progress count towards a driver's load, so concurrent
+        creates spread out. With ``launching`` the caller's launch is counted
+        too; it must decrement ``_launching[slot]`` when done.
+        """
+        with self._lock:
+            load = list(self._launching)
+            for instance in self._instances.values():
+                for i, d in enumerate(self._drivers):
+                    if instance.pw is d:
+                        load[i] += 1
+            index = min(range(self.drivers), key=lambda i: load[i])
+            if launching:
+                self._launching[index] += 1
+            driver = self._drivers[index]
+            if driver is not None and not driver.closed:
+                return driver, index
+            driver = self._drivers[index] = PlaywrightThread(name=f'local-cdp-driver-{index}')
+        # Started outside the lock; calls from racing callers queue behind start()
+        try:
+            return driver.start(), index
+        except Exception:
+            with self._lock:
+                if launching:
+                    self._launching[index] -= 1
+                if self._drivers[index] is driver:
+                    self._drivers[index] = None
+            driver.stop()
+            raise
+
+    def _launch(self, pw: PlaywrightThread, headless: bool, port: int) -> _Instance:
+        # Browsers share a driver, so they can be closed from any HTTP worker
+        # or from the reaper through that driver's thread
+        browser = pw.call(lambda p: p.chromium.launch(headless=headless, args=[f'--remote-debugging-port={port}']))
+        return _Instance(uuid.uuid4().hex[:12], pw, browser, port, headless)
+
+    def _shutdown(self, instance: _Instance) -> None:
+        if self._on_close is not None:
+            try:
+                self._on_close(instance.port)
+            except Exception:
+                pass
+        browser = instance.browser
+        try:
+            instance.pw.call(lambda _p: browser.close(), timeout=30)
+        except Exception:
+            pass
+        if _port_answers(instance.port) and not self._kill_port(instance.pw, instance.port):
+            with self._lock:
+                self._orphans.add(instance.port)
+
+    def _kill_port(self, pw: PlaywrightThread, port: int) -> bool:
+        """Ask whatever Chromium listens on ``port`` to exit via CDP ``Browser.close``."""
+
+        def _close(p: Any) -> None:
+            # Bounded on its own so a hung orphan does not hold up the shared driver
+            browser = p.chromium.connect_over_cdp(f'http://127.0.0.1:{port}', timeout=self.KILL_TIMEOUT_MS)
+            try:
+                browser.new_browser_cdp_session().send('Browser.close')
+            except Exception:
+                pass
+
+        try:
+            pw.call(_close, timeout=15)
+        except Exception:
+            pass
+        return not _port_answers(port)
+
+    def _reap_loop(self) -> None:
+        while not self._stop.wait(self.reap_interval_s):
+            try:
+                self._reap()
+            except Exception as e:  # noqa: BLE001
+                print(f"[local-cdp-reaper] {e}")
+
+    def _reap(self) -> None:
+        now = time.monotonic()
+        expired: List[_Instance] = []
+        with self._lock:
+            candidates = list(self._instances.values())
+        for instance in candidates:
+            idle = self.idle_timeout_s > 0 and now - instance.last_used >= self.idle_timeout_s
+            if idle or not self._alive(instance):
+                expired.append(instance)
+        removed: List[_Instance] = []
+        with self._lock:
+            for instance in expired:
+                # Skip instances closed by a client while we were checking
+                if self._instances.get(instance.id) is instance:
+                    del self._instances[instance.id]
+                    removed.append(instance)
+                    self._reaped += 1
+            orphans = list(self._orphans)
+        for instance in removed:
+            self._shutdown(instance)
+        if orphans:
+            self._clean_orphans(orphans)
+
+    def _alive(self, instance: _Instance) -> bool:
+        browser = instance.browser
+        try:
+            return bool(instance.pw.call(lambda _p: browser.is_connected(), timeout=10))
+        except Exception:
+            return False
+
+    def _clean_orphans(self, ports: List[int]) -> None:
+        pw, _ = self._driver()
+        for port in ports:
+            if not _port_answers(port) or self._kill_port(pw, port):
+                with self._lock:
+                    self._orphans.discard(port)
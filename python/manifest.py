@@ -0,0 +1,168 @@
+import csv
+import json
+import queue
+import sys
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+from urllib.parse import urlparse
+
+# (url, label, options)
+Record = Tuple[str, str, Dict[str, Any]]
+FORMATS = ('csv', 'jsonl')
+
+
+def label_for(url: str) -> str:
+    """Short label for a URL: the second-level domain (``www.nytimes.com`` -> ``nytimes``)."""
+    try:
+        host = urlparse(url).hostname or 'site'
+        return host.split('.')[-2] if '.' in host else host
+    except Exception:
+        return 'site'
+
+
+def _detect(path: str, first: str) -> str:
+    lower = path.lower()
+    if lower.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if lower.endswith(('.csv', '.tsv', '.txt')):
+        return 'csv'
+    return 'jsonl' if first.lstrip().startswith('{') else 'csv'
+
+
+def _record(url: Any, label: Any, options: Dict[str, Any]) -> Optional[Record]:
+    if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+        return None
+    return url, (str(label) if label else label_for(url)), options
+
+
+def _jsonl(f: TextIO) -> Iterator[Optional[Record]]:
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        if isinstance(row, str):
+            yield _record(row, None, {})
+            continue
+        if not isinstance(row, dict):
+            yield None
+            continue
+        options = row.get('options')
+        if not isinstance(options, dict):
+            options = {k: v for k, v in row.items() if k not in ('url', 'label')}
+        yield _record(row.get('url'), row.get('label'), options)
+
+
+def _csv(f: TextIO, first: str) -> Iterator[Optional[Record]]:
+    delimiter = '\t' if '\t' in first and ',' not in first else ','
+    reader = csv.reader(f, delimiter=delimiter)
+    header = None
+    first_row = True
+    for row in reader:
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if first_row:
+            first_row = False
+            cells = [cell.strip().lower() for cell in row]
+            if 'url' in cells:
+                # Header row: 'url' is required, 'label' optional, the rest are options
+                header = cells
+                continue
+        if header is None:  # headerless: url[,label]; an invalid row is skipped
+            yield _record(row[0].strip(), row[1].strip() if len(row) > 1 else None, {})
+            continue
+        values = dict(zip(header, (cell.strip() for cell in row)))
+        url = values.pop('url', None)
+        label = values.pop('label', None)
+        yield _record(url, label, {k: v for k, v in values.items() if v != ''})
+
+
+def read_manifest(source: str, fmt: Optional[str] = None) -> Iterator[Record]:
+    """Lazily yield ``(url, label, options)`` from a CSV/JSONL file, or stdin for ``-``.
+
+    JSONL lines are objects (``url``, optional ``label``, ``options`` or any
+    other keys as options) or bare URL strings. CSV files have a header row
+    with a ``url`` column (``label`` and other columns optional) or no header
+    and ``url[,label]`` rows; a first row without a ``url`` cell is data. The format comes from ``fmt``, the extension or
+    the first line. Rows without an http(s) URL are skipped with a warning.
+    """
+    if fmt is not None and fmt not in FORMATS:
+        raise ValueError(f"Unknown manifest format '{fmt}' (choose from {', '.join(FORMATS)})")
+    f: TextIO = sys.stdin if source == '-' else open(source, 'r', encoding='utf-8', newline='')
+    try:
+        first = f.readline()
+        fmt = fmt or _detect('' if source == '-' else source, first)
+        # Put the sniffed line back in front of the rest of the stream
+        lines = _chain_first(first, f)
+        rows = _jsonl(lines) if fmt == 'jsonl' else _csv(lines, first)
+        for number, record in enumerate(rows, start=1):
+            if record is None:
+                print(f"[manifest] skipping row {number}: no http(s) url", file=sys.stderr)
+                continue
+            yield record
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _chain_first(first: str, f: TextIO) -> Iterator[str]:
+    if first:
+        yield first
+    yield from f
+
+
+class _Error:
+    __slots__ = ('exc',)
+
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+
+_END = object()
+
+
+def prefetch(items: Iterable[Any], size: int = 1000) -> Iterator[Any]:
+    """Iterate ``items`` on a background thread, keeping at most ``size`` read ahead.
+
+    Reading (disk, stdin, parsing) overlaps with whatever consumes the items,
+    memory stays bounded by ``size``, and the first item is available as soon
+    as it is read. Errors from the source are re-raised in the consumer.
+    """
+    buf: 'queue.Queue[Any]' = queue.Queue(maxsize=max(1, int(size)))
+    stop = threading.Event()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                buf.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fill() -> None:
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:  # noqa: BLE001 - handed to the consumer
+            put(_Error(e))
+            return
+        put(_END)
+
+    threading.Thread(target=fill, name='manifest-prefetch', daemon=True).start()
+    try:
+        while True:
+            item = buf.get()
+            if item is _END:
+                return
+            if isinstance(item, _Error):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+
@@ -1,7 +1,11 @@
 import os
+import requests
 from tzafon import Computer
-from utils import ensure_dir, timestamp, download_to_file
-from urllib.error import HTTPError, URLError
+from cas import dedupe
+from rate_limit import throttle_create
+from readiness import Readiness
+from storage import new_result_path
+from utils import DownloadError, ensure_dir, download_to_file
 
 
 def run() -> None:
@@ -9,12 +13,10 @@ def run() -> None:
     ensure_dir(out_dir)
 
     client = Computer()
+    throttle_create()
     computer = client.create(kind="browser")
     computer.navigate("https://www.nytimes.com/")
-    try:
-        computer.wait(2)
-    except Exception:
-        pass
+    Readiness.from_env().settle(computer, "https://www.nytimes.com/")
 
     # Take screenshot with HTTP status code extraction if SDK raises
     result = None
@@ -71,14 +73,15 @@ def run() -> None:
         except Exception:
             pass
     if url:
-        img = os.path.join(out_dir, f"{timestamp('nytimes_')}.png")
+        img = new_result_path(out_dir, 'nytimes_')
         try:
             download_to_file(url, img)
+            img = dedupe(img, label="nytimes")
             print(f"Saved: {img}")
-        except HTTPError as he:
-            print(f"Download failed: HTTP {he.code} - {he.reason}")
-        except URLError as ue:
-            print(f"Download failed: URL error - {ue.reason}")
+        except DownloadError as de:
+            print(f"Download failed: {de}")
+        except requests.RequestException as re_:
+            print(f"Download failed: request error - {re_}")
         except Exception as e:
             print(f"Download failed: {e}")
 
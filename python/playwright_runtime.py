@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+def load_sync_playwright() -> Callable[[], Any]:
+    try:
+        from playwright.sync_api import sync_playwright  # type: ignore
+    except Exception as e:  # pragma: no cover
+        raise RuntimeError('playwright not installed. Run: pip install playwright && playwright install') from e
+    return sync_playwright
+
+
+class PlaywrightThread:
+    """A dedicated thread that owns one Playwright driver.
+
+    Playwright sync objects may only be used from the thread that created
+    them, so every call that touches the driver (or anything launched from
+    it) goes through ``call``. Do not call back into the same instance from
+    inside a submitted function: it would wait on itself.
+    """
+
+    def __init__(self, name: str = 'playwright') -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._playwright: Any = None
+        self._closed = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def start(self) -> 'PlaywrightThread':
+        self._executor.submit(self._start).result()
+        return self
+
+    def _start(self) -> None:
+        sync_playwright = load_sync_playwright()
+        self._playwright = sync_playwright().start()
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any):
+        """Schedule ``fn(playwright, *args, **kwargs)`` and return its future."""
+        if self._closed:
+            raise RuntimeError('playwright thread is closed')
+        # Resolve the driver on the thread: calls queued behind start() see it
+        return self._executor.submit(lambda: fn(self._playwright, *args, **kwargs))
+
+    def call(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        return self.submit(fn, *args, **kwargs).result(timeout=timeout)
+
+    def stop(self, timeout: float = 30.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+
+        def _stop() -> None:
+            if self._playwright is not None:
+                try:
+                    self._playwright.stop()
+                except Exception:
+                    pass
+                self._playwright = None
+
+        try:
+            self._executor.submit(_stop).result(timeout=timeout)
+        except Exception:
+            pass
+        finally:
+            self._executor.shutdown(wait=False)
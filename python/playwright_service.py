@@ -1,22 +1,100 @@
 import json
 import os
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from typing import Any, Dict, Optional
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import math
+import queue
 import time
-import socket
+import threading
 import uuid
 import requests
 from playwright.sync_api import TimeoutError as PlaywrightTimeoutError  # type: ignore
-from utils import ensure_dir, timestamp
-
-# In-memory registry for locally launched CDP-enabled Chromium instances
-LOCAL_CDP: dict[str, dict[str, Any]] = {}
-
-def _find_free_port() -> int:
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind(("127.0.0.1", 0))
-        return int(s.getsockname()[1])
+from browser_pool import BrowserPool
+from cas import ContentStore
+from cdp_cache import CdpConnectionCache
+from computer_pool import ComputerPool
+import http_client
+from local_cdp import LocalCdpRegistry
+from pooled_server import ChunkedResponseMixin, PooledHTTPServer
+from rate_limit import create_limiter, throttle_create
+from readiness import Readiness
+from resource_profiles import ResourceBlocker, blocker_for, merge_reports
+from result_cache import ResultCache
+from singleflight import SingleFlight
+from storage import LAYOUT, new_result_path, put_result, result_exists
+from utils import ensure_dir
+from write_behind import WriteBehind
+
+# Default number of tabs a single /screenshot request loads at once
+TAB_CONCURRENCY = int(os.environ.get('PLAYWRIGHT_TAB_CONCURRENCY', '10'))
+
+# /screenshot/batch limits: max URLs per request and default pages in flight
+BATCH_MAX_URLS = int(os.environ.get('SCREENSHOT_BATCH_MAX_URLS', '1000'))
+BATCH_CONCURRENCY = int(os.environ.get('SCREENSHOT_BATCH_CONCURRENCY', '16'))
+# URLs captured per browser lease; between chunks the browser goes back to the pool
+BATCH_CHUNK = int(os.environ.get('SCREENSHOT_BATCH_CHUNK', '32'))
+
+# Open CDP sessions reused by /cdp/screenshot and /local-cdp/screenshot
+CDP_CONNECTIONS = CdpConnectionCache(
+    max_size=int(os.environ.get('CDP_CACHE_SIZE', '16')),
+    idle_timeout_s=float(os.environ.get('CDP_CACHE_IDLE_S', '300')),
+    drivers=int(os.environ.get('CDP_CACHE_DRIVERS', '2')),
+)
+
+# Optional TTL cache of /screenshot results (SCREENSHOT_CACHE_TTL_S > 0 enables it)
+RESULT_CACHE: Optional[ResultCache] = ResultCache.from_env()
+
+# Bounded registry of locally launched CDP-enabled Chromium instances
+LOCAL_CDP = LocalCdpRegistry(
+    max_size=int(os.environ.get('LOCAL_CDP_MAX', '16')),
+    idle_timeout_s=float(os.environ.get('LOCAL_CDP_IDLE_S', '600')),
+    reap_interval_s=float(os.environ.get('LOCAL_CDP_REAP_INTERVAL_S', '30')),
+    drivers=int(os.environ.get('LOCAL_CDP_DRIVERS', '1')),
+    on_close=CDP_CONNECTIONS.discard_local,
+)
+
+# Adaptive pre-capture wait with per-host learned defaults (see readiness.py)
+READINESS = Readiness.from_env()
+
+# Account used by the computer warm pool; requests with other credentials bypass it
+_TZAFON_DEFAULTS: Tuple[str, Optional[str]] = (
+    (os.environ.get('TZAFON_BASE_URL') or 'https://v2.tzafon.ai').rstrip('/'),
+    os.environ.get('TZAFON_API_KEY') or os.environ.get('TOKEN'),
+)
+
+# Pre-created Tzafon computers for /cdp/create and /scrape/sayro; started by main()
+COMPUTER_POOL: Optional[ComputerPool] = None
+
+# Screenshot files are written off the browser threads (see write_behind.py)
+WRITER = WriteBehind.from_env()
+
+# Optional content-addressed store for screenshot files (RESULTS_CAS_DIR); see cas.py
+CAS = ContentStore.from_env()  # puts run on WRITER's threads (see _persist)
+
+# Concurrent identical single-tab /screenshot requests share one capture
+IN_FLIGHT = SingleFlight()
+
+# Warm Chromium pool used by /screenshot; launched once at boot by main()
+BROWSER_POOL: Optional[BrowserPool] = None
+_BROWSER_POOL_LOCK = threading.Lock()
+
+
+def _browser_pool() -> BrowserPool:
+    global BROWSER_POOL
+    with _BROWSER_POOL_LOCK:
+        if BROWSER_POOL is None:
+            # Default to one browser per HTTP worker so throughput scales with workers
+            workers = os.environ.get('PLAYWRIGHT_SERVICE_WORKERS', '8')
+            BROWSER_POOL = BrowserPool(
+                size=int(os.environ.get('PLAYWRIGHT_POOL_SIZE', workers)),
+                max_pages=int(os.environ.get('PLAYWRIGHT_POOL_MAX_PAGES', '200')),
+                max_age_s=float(os.environ.get('PLAYWRIGHT_POOL_MAX_AGE_S', '900')),
+                acquire_timeout_s=float(os.environ.get('PLAYWRIGHT_POOL_WAIT_S', '60')),
+            ).start()
+        return BROWSER_POOL
 
 
 def read_json(body: bytes) -> Dict[str, Any]:
@@ -28,8 +106,300 @@ def read_json(body: bytes) -> Dict[str, Any]:
         return {}
 
 
-class Handler(BaseHTTPRequestHandler):
+def _capture_pipeline(
+    context: Any,
+    jobs: Iterable[Tuple[int, str]],
+    concurrency: int,
+    full_page: bool,
+    out_dir: Optional[str],
+    prefix: str = 'play',
+    budget_ms: Optional[float] = None,
+    raise_errors: bool = True,
+) -> Iterator[Dict[str, Any]]:
+    """Navigate and capture pages of one context with up to ``concurrency`` in flight.
+
+    Navigations are started with ``wait_until='commit'`` so the browser loads
+    the pages in parallel; pages are then finished in submission order. Each
+    page is captured once READINESS reports it settled (within ``budget_ms``);
+    its change tracking starts at page creation, so pages that settled while
+    an earlier one was being captured do not wait again.
+    With ``out_dir`` the PNG is handed to ``_persist`` and ``saved`` is the
+    pending write, which fills in ``image`` (see ``_await_saved``); without it nothing is written and
+    only the in-memory PNG (``data``) is returned. Yields one result dict per job as it completes;
+    with ``raise_errors`` off, a failed job yields ``{'index', 'url',
+    'error'}`` instead of raising.
+    """
+    pending: Deque[Tuple[int, str, Any, float, float]] = deque()
+    READINESS.install(context)
+    it = iter(jobs)
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    index, url = next(it)
+                except StopIteration:
+                    exhausted = True
+                    break
+                started = time.monotonic()
+                page = context.new_page()
+                try:
+                    page.goto(url, wait_until='commit')
+                except Exception as e:
+                    page.close()
+                    if raise_errors:
+                        raise
+                    yield {'index': index, 'url': url, 'error': str(e)}
+                    continue
+                pending.append((index, url, page, started, time.monotonic()))
+            if not pending:
+                return
+            index, url, page, started, committed = pending.popleft()
+            try:
+                page.wait_for_load_state('domcontentloaded')
+                loaded = time.monotonic()
+                ready = READINESS.wait(page, url, budget_ms)
+                shot_started = time.monotonic()
+                data = page.screenshot(full_page=full_page)
+                done = time.monotonic()
+                saved = _persist(out_dir, f'{prefix}_{index}_', data, url) if out_dir else None
+            except Exception as e:
+                if raise_errors:
+                    raise
+                yield {'index': index, 'url': url, 'error': str(e)}
+                continue
+            finally:
+                page.close()
+            yield {
+                'index': index,
+                'url': url,
+                'image': None,
+                'data': data,
+                'saved': saved,
+                'timings': {
+                    'navigate_ms': round((committed - started) * 1000, 1),
+                    'load_ms': round((loaded - started) * 1000, 1),
+                    'settle_ms': round(float(ready.get('waited_ms') or 0.0), 1),
+                    'ready': bool(ready.get('ready')),
+                    'capture_ms': round((done - shot_started) * 1000, 1),
+                    'total_ms': round((done - started) * 1000, 1),
+                },
+            }
+    finally:
+        for _, _, page, _, _ in pending:
+            try:
+                page.close()
+            except Exception:
+                pass
+
+
+def _await_saved(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Wait for a pipeline result's background write and set its ``image``; a failed write becomes the result's error."""
+    saved = result.pop('saved', None)
+    if saved is not None:
+        try:
+            result['image'] = saved.result()
+        except Exception as e:  # noqa: BLE001
+            return {'index': result['index'], 'url': result['url'], 'error': f'write failed: {e}'}
+    return result
+
+
+def _persist(out_dir: str, prefix: str, data: Any, url: str) -> 'Future[str]':
+    """Hand a PNG to WRITER (through CAS or the segment store when configured); resolves to its path.
+
+    Hashing, the CAS manifest and segment appends all run on WRITER's
+    threads, so the browser thread only queues the bytes.
+    """
+    if CAS is not None:
+        return WRITER.submit(data, _put_cas, data, url)
+    if LAYOUT.kind == 'segment':
+        return WRITER.submit(data, put_result, out_dir, prefix, data)
+    return WRITER.submit(data, _write_png, new_result_path(out_dir, prefix), data)
+
+
+def _put_cas(data: Any, url: str) -> str:
+    assert CAS is not None
+    stored = CAS.put(data, url=url)
+    if stored['saved'] is not None:
+        stored['saved'].result()  # the same image is still being written by another put
+    return stored['path']
+
+
+def _write_png(path: str, data: Any) -> str:
+    WRITER.write_file(path, data)
+    return path
+
+
+def _drain(jobs: 'queue.Queue[Tuple[int, str]]', limit: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    taken = 0
+    while limit is None or taken < limit:
+        try:
+            yield jobs.get_nowait()
+        except queue.Empty:
+            return
+        taken += 1
+
+
+def _capture_batch(
+    browser: Any,
+    chunk: List[Tuple[int, str]],
+    concurrency: int,
+    full_page: bool,
+    out_dir: Optional[str],
+    viewport: Dict[str, int],
+    emit: Callable[[Dict[str, Any]], None],
+    blocker: Optional[ResourceBlocker] = None,
+    budget_ms: Optional[float] = None,
+) -> None:
+    # Runs on a pooled browser's thread for one chunk of a batch; each result
+    # is emitted as soon as its page is captured
+    context = browser.new_context(viewport=viewport)
+    if blocker is not None:
+        blocker.attach(context)
+    try:
+        for result in _capture_pipeline(
+            context, chunk, concurrency, full_page, out_dir,
+            prefix='batch', budget_ms=budget_ms, raise_errors=False,
+        ):
+            if out_dir:
+                # Written by WRITER; only the path goes back to the client
+                result.pop('data', None)
+            emit(result)
+    finally:
+        context.close()
+
+
+def _read_viewport(body: Dict[str, Any]) -> Dict[str, int]:
+    viewport = body.get('viewport') or {}
+    try:
+        return {'width': int(viewport.get('width') or 1366), 'height': int(viewport.get('height') or 768)}
+    except Exception:
+        return {'width': 1366, 'height': 768}
+
+
+def _read_budget(body: Dict[str, Any]) -> Optional[float]:
+    # Per-request cap on the readiness wait; None uses READINESS_BUDGET_MS
+    try:
+        return max(0.0, float(body['budgetMs'])) if body.get('budgetMs') is not None else None
+    except Exception:
+        return None
+
+
+def _capture_over_cdp(
+    browser: Any, url: str, full_page: bool, out_dir: str, prefix: str, blocker: Optional[ResourceBlocker] = None,
+    budget_ms: Optional[float] = None,
+) -> 'Future[str]':
+    # Runs on the cached connection's driver thread (see CdpConnectionCache.run); the caller waits for the write
+    context = browser.new_context()
+    if blocker is not None:
+        blocker.attach(context)
+    READINESS.install(context)
+    try:
+        page = context.new_page()
+        page.goto(url, timeout=15000, wait_until='domcontentloaded')
+        READINESS.wait(page, url, budget_ms)
+        return _persist(out_dir, prefix, page.screenshot(full_page=full_page), url)
+    finally:
+        try:
+            context.close()
+        except Exception:
+            pass
+
+
+def _capture_tabs(
+    browser: Any, url: str, tabs: int, full_page: bool, out_dir: Optional[str], concurrency: int, viewport: Dict[str, int],
+    blocker: Optional[ResourceBlocker] = None, budget_ms: Optional[float] = None,
+) -> list[Dict[str, Any]]:
+    # Runs on the pooled browser's own thread (see BrowserPool.run)
+    context = browser.new_context(viewport=viewport)
+    if blocker is not None:
+        blocker.attach(context)
+    try:
+        jobs = ((i, url) for i in range(tabs))
+        return list(_capture_pipeline(context, jobs, concurrency, full_page, out_dir, budget_ms=budget_ms))
+    finally:
+        context.close()
+
+
+def _post_computer(base_url: str, token: str, attempts: int = 3, timeout_s: int = 180) -> str:
+    headers = {
+        'Authorization': f'Bearer {token}',
+        'Content-Type': 'application/json',
+        'Accept': 'application/json',
+    }
+    url = f"{base_url.rstrip('/')}/v1/computers"
+    last_err: Optional[Exception] = None
+    for i in range(1, max(1, attempts) + 1):
+        try:
+            throttle_create()
+            resp = http_client.client().request(
+                'POST', url,
+                json={'kind': 'browser'},
+                headers=headers,
+                timeout=timeout_s,
+            )
+            # Retry on 5xx
+            if 500 <= resp.status_code < 600:
+                last_err = requests.HTTPError(f"{resp.status_code} Server Error: {resp.text[:200]}")
+                if i < attempts:
+                    time.sleep(min(2 ** i, 8))
+                    continue
+            resp.raise_for_status()
+            data = resp.json()
+            return data['id']
+        except Exception as e:  # noqa: BLE001
+            last_err = e
+            if i < attempts:
+                time.sleep(min(2 ** i, 8))
+                continue
+            break
+    raise RuntimeError(f"Failed to create computer via {url}: {last_err}")
+
+
+def _computer_url(base_url: str, computer_id: str) -> str:
+    return f"{base_url.rstrip('/')}/v1/computers/{computer_id}"
+
+
+def _delete_computer(base_url: str, token: str, computer_id: str) -> Any:
+    headers = {
+        'Authorization': f'Bearer {token}',
+        'Accept': 'application/json',
+    }
+    return http_client.client().request('DELETE', _computer_url(base_url, computer_id), headers=headers, timeout=30)
+
+
+def _computer_alive(base_url: str, token: str, computer_id: str) -> bool:
+    # Only a definite "gone" counts as unhealthy; transient errors keep the computer
+    headers = {'Authorization': f'Bearer {token}', 'Accept': 'application/json'}
+    try:
+        resp = http_client.client().request('GET', _computer_url(base_url, computer_id), headers=headers, timeout=10)
+    except http_client.TRANSPORT_ERRORS:
+        return True
+    return resp.status_code not in (404, 410)
+
+
+def _computer_pool() -> Optional[ComputerPool]:
+    """Warm pool of Tzafon computers for the env account (COMPUTER_POOL_SIZE > 0 and a token)."""
+    base_url, token = _TZAFON_DEFAULTS
+    if not token:
+        return None
+    return ComputerPool.from_env(
+        create=lambda: _post_computer(base_url, token),
+        destroy=lambda cid: _delete_computer(base_url, token, cid),
+        healthy=lambda cid: _computer_alive(base_url, token, cid),
+    )
+
+
+class Handler(ChunkedResponseMixin, BaseHTTPRequestHandler):
+    # Keep-alive; between requests the server parks the connection off the workers.
+    # The socket timeout only bounds reading a request.
+    protocol_version = 'HTTP/1.1'
+    timeout = float(os.environ.get('PLAYWRIGHT_SERVICE_READ_TIMEOUT_S', '15'))
+
     def _send(self, status: int, payload: Dict[str, Any]):
+        if self._abort_stream():
+            # An error after a streamed response started: the status was already sent
+            return
         data = json.dumps(payload).encode('utf-8')
         self.send_response(status)
         self.send_header('Content-Type', 'application/json; charset=utf-8')
@@ -37,12 +407,36 @@ class Handler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(data)
 
+    def _send_bytes(self, status: int, data: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
     def log_message(self, format: str, *args: Any) -> None:  # quieter default logging
         return
 
     def do_GET(self):  # noqa: N802
         if self.path == '/health':
             return self._send(200, {'ok': True})
+        if self.path == '/stats':
+            pool = BROWSER_POOL.stats() if BROWSER_POOL is not None else None
+            return self._send(200, {
+                'browser_pool': pool,
+                'cdp_connections': CDP_CONNECTIONS.stats(),
+                'result_cache': RESULT_CACHE.stats() if RESULT_CACHE is not None else None,
+                'readiness': READINESS.stats(),
+                'in_flight': IN_FLIGHT.stats(),
+                'local_cdp': LOCAL_CDP.stats(),
+                'computer_pool': COMPUTER_POOL.stats() if COMPUTER_POOL is not None else None,
+                'http_client': http_client.client().stats(),
+                'create_rate': create_limiter().stats() if create_limiter() is not None else None,
+                'write_behind': WRITER.stats(),
+                'cas': CAS.stats() if CAS is not None else None,
+            })
         return self._send(404, {'error': 'not found'})
 
     def do_POST(self):  # noqa: N802
@@ -56,6 +450,12 @@ class Handler(BaseHTTPRequestHandler):
             except Exception as e:
                 return self._send(500, {'error': str(e)})
 
+        if self.path == '/screenshot/batch':
+            try:
+                return self._handle_screenshot_batch(body)
+            except Exception as e:
+                return self._send(500, {'error': str(e)})
+
         if self.path == '/scrape/sayro':
             try:
                 return self._handle_scrape_sayro(body)
@@ -101,11 +501,6 @@ class Handler(BaseHTTPRequestHandler):
         return self._send(404, {'error': 'not found'})
 
     def _handle_screenshot(self, body: Dict[str, Any]):
-        try:
-            from playwright.sync_api import sync_playwright  # type: ignore
-        except Exception as e:  # pragma: no cover
-            raise RuntimeError('playwright not installed. Run: pip install playwright && playwright install') from e
-
         url = body.get('url')
         if not url:
             raise ValueError('Missing url')
@@ -115,71 +510,234 @@ class Handler(BaseHTTPRequestHandler):
         except Exception:
             tabs = 1
         full_page = bool(body.get('fullPage'))
+        try:
+            concurrency = int(body.get('concurrency') or TAB_CONCURRENCY)
+        except Exception:
+            concurrency = TAB_CONCURRENCY
+        concurrency = max(1, min(tabs, concurrency))
+        viewport = _read_viewport(body)
+        budget = _read_budget(body)
+
+        binary = body.get('response') == 'binary'
+        blocker_for(body, [url])  # reject an unknown profile before doing any work
+        extra = {}
+        if (body.get('profile') or 'full') != 'full':
+            extra = {'profile': body['profile'], 'allow': body.get('allow')}
+
+        # Single-tab results are cacheable and coalesced; multi-tab requests ask for N fresh captures
+        key = ResultCache.key(url, full_page, viewport, 'playwright', **extra)
+        if RESULT_CACHE is not None and tabs == 1 and body.get('cache', True):
+            hit = RESULT_CACHE.get(key)
+            if hit is not None and binary and hit[1]:
+                return self._send_bytes(200, hit[1], 'image/png', {'X-Cached': '1'})
+            if hit is not None and not binary and all(result_exists(p) for p in hit[0]['images']):
+                return self._send(200, dict(hit[0], cached=True))
+
+        # Binary responses never touch disk: Playwright hands back the PNG buffer
+        out_dir: Optional[str] = None
+        if not binary:
+            out_dir = os.path.join(os.path.dirname(__file__), 'results', 'service_playwright')
+            ensure_dir(out_dir)
+
+        def capture() -> Tuple[Dict[str, Any], list[bytes]]:
+            started = time.monotonic()
+            blocker = blocker_for(body, [url])
+            shots = _browser_pool().run(
+                _capture_tabs, url, tabs, full_page, out_dir, concurrency, viewport, blocker, budget, pages=tabs,
+            )
+            # The browser is already free; only this request waits for its files
+            for shot in shots:
+                checked = _await_saved(shot)
+                if 'error' in checked:
+                    raise RuntimeError(checked['error'])
+            payload = {
+                'engine': 'playwright',
+                'images': [s['image'] for s in shots],
+                'timings': [dict(s['timings'], tab=s['index']) for s in shots],
+                'concurrency': concurrency,
+                'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+            }
+            if blocker is not None:
+                payload['resources'] = blocker.report()
+            data = [s['data'] or b'' for s in shots]
+            if RESULT_CACHE is not None and tabs == 1:
+                RESULT_CACHE.put(key, payload, data[0])
+            return payload, data
+
+        if tabs > 1:
+            payload, data = capture()
+            shared = False
+        else:
+            # File and binary callers need different things from the leader
+            (payload, data), shared = IN_FLIGHT.do(f"{key}:{'binary' if binary else 'file'}", capture)
+
+        if not binary:
+            return self._send(200, dict(payload, coalesced=True) if shared else payload)
+        if tabs == 1:
+            headers = {'X-Elapsed-Ms': str(payload['elapsed_ms'])}
+            if shared:
+                headers['X-Coalesced'] = '1'
+            return self._send_bytes(200, data[0], 'image/png', headers)
+        boundary = uuid.uuid4().hex
+        self._start_multipart(200, boundary)
+        for timing, png in zip(payload['timings'], data):
+            self._write_part(boundary, 'image/png', png, {'X-Tab': str(timing['tab']), 'Content-Location': url})
+        self._end_multipart(boundary)
+
+    def _handle_screenshot_batch(self, body: Dict[str, Any]):
+        urls = [u for u in (body.get('urls') or []) if isinstance(u, str) and u]
+        if not urls:
+            raise ValueError('Missing urls')
+        if len(urls) > BATCH_MAX_URLS:
+            raise ValueError(f'Too many urls (max {BATCH_MAX_URLS})')
+        full_page = bool(body.get('fullPage'))
+        viewport = _read_viewport(body)
+        budget = _read_budget(body)
+        try:
+            concurrency = int(body.get('concurrency') or BATCH_CONCURRENCY)
+        except Exception:
+            concurrency = BATCH_CONCURRENCY
+        concurrency = max(1, min(len(urls), concurrency))
+        binary = body.get('response') == 'binary'
+        blocker_for(body, urls)  # reject an unknown profile before streaming starts
+
+        out_dir: Optional[str] = None
+        if not binary:
+            out_dir = os.path.join(os.path.dirname(__file__), 'results', 'service_playwright_batch')
+            ensure_dir(out_dir)
+
+        # Spread the pages in flight over as many pooled browsers as are useful
+        pool = _browser_pool()
+        browsers = max(1, min(pool.size, concurrency))
+        per_browser = math.ceil(concurrency / browsers)
+        # One blocker per browser context; their counters are summed in the summary
+        blockers = [blocker_for(body, urls) for _ in range(browsers)]
+        jobs: 'queue.Queue[Tuple[int, str]]' = queue.Queue()
+        for i, u in enumerate(urls):
+            jobs.put((i, u))
+        # Bounded: a slow client holds up capture instead of every screenshot piling up here
+        results: 'queue.Queue[Dict[str, Any]]' = queue.Queue(maxsize=max(concurrency, per_browser))
+        cancelled = threading.Event()
+        chunk_size = max(per_browser, BATCH_CHUNK)
+
+        def emit(record: Dict[str, Any]) -> None:
+            while not cancelled.is_set():
+                try:
+                    results.put(record, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
 
-        out_dir = os.path.join(os.path.dirname(__file__), 'results', 'service_playwright')
-        ensure_dir(out_dir)
-
-        images = []
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(viewport={'width': 1366, 'height': 768})
-            try:
-                for i in range(tabs):
-                    page = context.new_page()
-                    page.goto(url, wait_until='domcontentloaded')
-                    try:
-                        page.wait_for_timeout(1000)
-                    except Exception:
-                        pass
-                    file = os.path.join(out_dir, f"{timestamp(f'play_{i}_')}.png")
-                    page.screenshot(path=file, full_page=full_page)
-                    page.close()
-                    images.append(file)
-            finally:
-                context.close()
-                browser.close()
+        def work(blocker: Optional[ResourceBlocker]) -> None:
+            # One lease per chunk, so /screenshot requests get browsers between chunks
+            while not cancelled.is_set():
+                chunk = list(_drain(jobs, chunk_size))
+                if not chunk:
+                    return
+                emitted: set[int] = set()
 
-        return self._send(200, {'engine': 'playwright', 'images': images})
+                def emit_one(record: Dict[str, Any]) -> None:
+                    emitted.add(record['index'])
+                    emit(record)
 
-    # --- tzafon CDP: Sayro scraper ---
-    def _create_computer(self, base_url: str, token: str, attempts: int = 3, timeout_s: int = 180) -> str:
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-        }
-        url = f"{base_url.rstrip('/')}/v1/computers"
-        last_err: Optional[Exception] = None
-        for i in range(1, max(1, attempts) + 1):
-            try:
-                resp = requests.request(
-                    'POST', url,
-                    json={'kind': 'browser'},
-                    headers=headers,
-                    timeout=timeout_s,
-                )
-                # Retry on 5xx
-                if 500 <= resp.status_code < 600:
-                    last_err = requests.HTTPError(f"{resp.status_code} Server Error: {resp.text[:200]}")
-                    if i < attempts:
-                        time.sleep(min(2 ** i, 8))
-                        continue
-                resp.raise_for_status()
-                data = resp.json()
-                return data['id']
-            except Exception as e:  # noqa: BLE001
-                last_err = e
-                if i < attempts:
-                    time.sleep(min(2 ** i, 8))
+                try:
+                    pool.run(
+                        _capture_batch, chunk, per_browser, full_page, out_dir, viewport, emit_one, blocker, budget,
+                        pages=len(chunk),
+                    )
+                except Exception as e:  # noqa: BLE001 - e.g. PoolTimeout; the rest of the batch goes on
+                    for i, u in chunk:
+                        if i not in emitted:
+                            emit({'index': i, 'url': u, 'error': str(e)})
+
+        started = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=browsers, thread_name_prefix='batch')
+        futures = [executor.submit(work, blockers[i]) for i in range(browsers)]
+        executor.shutdown(wait=False)
+
+        boundary = uuid.uuid4().hex
+
+        def write(record: Dict[str, Any]) -> None:
+            data = record.pop('data', None)
+            if not binary:
+                self._write_ndjson(record)
+            elif data:
+                self._write_part(boundary, 'image/png', data, {
+                    'X-Index': str(record['index']),
+                    'Content-Location': record['url'],
+                    'X-Total-Ms': str(record['timings']['total_ms']),
+                })
+            else:
+                self._write_part(boundary, 'application/json', json.dumps(record).encode('utf-8'))
+
+        reported: set[int] = set()
+        failed = 0
+        try:
+            if binary:
+                self._start_multipart(200, boundary)
+            else:
+                self._start_chunked(200, 'application/x-ndjson')
+            while len(reported) < len(urls):
+                try:
+                    record = results.get(timeout=0.5)
+                except queue.Empty:
+                    if all(f.done() for f in futures) and results.empty():
+                        break
                     continue
-                break
-        raise RuntimeError(f"Failed to create computer via {url}: {last_err}")
+                # Waiting for the write here keeps the browsers capturing meanwhile
+                record = _await_saved(record)
+                reported.add(record['index'])
+                failed += 1 if 'error' in record else 0
+                write(record)
+
+            # Jobs lost to a browser-level failure (pool timeout, crashed context)
+            errors = [str(f.exception()) for f in futures if f.done() and f.exception() is not None]
+            for i, u in enumerate(urls):
+                if i not in reported:
+                    failed += 1
+                    write({'index': i, 'url': u, 'error': errors[0] if errors else 'not captured'})
+            write({
+                'done': True,
+                'count': len(urls),
+                'ok': len(urls) - failed,
+                'failed': failed,
+                'browsers': browsers,
+                'concurrency': concurrency,
+                'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+                'resources': merge_reports([b.report() for b in blockers if b is not None]),
+            })
+            if binary:
+                self._end_multipart(boundary)
+            else:
+                self._end_chunked()
+        except Exception as e:  # noqa: BLE001
+            # Headers are sent: no 500 now. Client went away, timed out reading, or a write failed
+            if not isinstance(e, (BrokenPipeError, ConnectionResetError)):
+                print(f"[py-playwright-service] batch aborted: {e}")
+            self._abort_stream()
+            self.close_connection = True
+        finally:
+            # Unblocks workers waiting on the full results queue
+            cancelled.set()
+            for _ in _drain(jobs):
+                pass
 
-    def _scrape_sayro_site(self, playwright, cdp_url: str, computer_id: str) -> Dict[str, Any]:
+    # --- tzafon CDP: Sayro scraper ---
+    def _create_computer(self, base_url: str, token: str) -> str:
+        # Lease a pre-created computer when the request uses the pool's account
+        if COMPUTER_POOL is not None and (base_url.rstrip('/'), token) == _TZAFON_DEFAULTS:
+            return COMPUTER_POOL.acquire()
+        return _post_computer(base_url, token)
+
+    def _scrape_sayro_site(
+        self, playwright, cdp_url: str, computer_id: str, blocker: Optional[ResourceBlocker] = None,
+    ) -> Dict[str, Any]:
         out_dir = os.path.join(os.path.dirname(__file__), 'results', 'service_playwright')
         ensure_dir(out_dir)
         browser = playwright.chromium.connect_over_cdp(cdp_url)
         context = browser.new_context()
+        if blocker is not None:
+            blocker.attach(context)
         page = context.new_page()
         try:
             page.goto('https://sayro-web.vercel.app/', timeout=10000)
@@ -200,13 +758,17 @@ class Handler(BaseHTTPRequestHandler):
                 }
                 """
             )
-            screenshot_path = os.path.join(out_dir, f"sayro_{computer_id}.png")
-            page.screenshot(path=screenshot_path, full_page=True)
+            # Bytes go to the writer; the browser thread never touches the disk
+            saved = _persist(
+                out_dir, f'sayro_{computer_id}_', page.screenshot(full_page=True), 'https://sayro-web.vercel.app/',
+            )
             return {
                 'success': True,
                 'computer_id': computer_id,
                 'data': { 'projects': projects },
-                'screenshot': screenshot_path,
+                'screenshot': None,
+                'saved': saved,
+                'resources': blocker.report() if blocker is not None else None,
             }
         except PlaywrightTimeoutError as e:
             return {
@@ -244,12 +806,29 @@ class Handler(BaseHTTPRequestHandler):
         except Exception as e:  # pragma: no cover
             raise RuntimeError('playwright not installed. Run: pip install playwright && playwright install') from e
 
+        blocker = blocker_for(body, ['https://sayro-web.vercel.app/'])
+        pooled = COMPUTER_POOL is not None and (base_url.rstrip('/'), token) == _TZAFON_DEFAULTS
         computer_id = self._create_computer(base_url, token)
         cdp_url = f"{base_url}/v1/computers/{computer_id}/cdp?token={token}"
 
-        with sync_playwright() as p:
-            result = self._scrape_sayro_site(p, cdp_url, computer_id)
+        try:
+            with sync_playwright() as p:
+                result = self._scrape_sayro_site(p, cdp_url, computer_id, blocker)
+        finally:
+            # The computer is single-use: hand it back to the pool (which closes it) or delete it
+            if pooled and COMPUTER_POOL is not None:
+                COMPUTER_POOL.release(computer_id)
+            else:
+                if COMPUTER_POOL is not None:
+                    COMPUTER_POOL.forget(computer_id)
+                try:
+                    _delete_computer(base_url, token, computer_id)
+                except Exception as e:  # noqa: BLE001
+                    print(f"[py-playwright-service] closing computer {computer_id} failed: {e}")
 
+        saved = result.pop('saved', None)
+        if saved is not None:
+            result['screenshot'] = saved.result()
         return self._send(200, result)
 
     # --- Generic CDP microservice endpoints ---
@@ -278,38 +857,23 @@ class Handler(BaseHTTPRequestHandler):
             raise ValueError('Missing cdp_url')
         if not url:
             raise ValueError('Missing url')
-        try:
-            from playwright.sync_api import sync_playwright  # type: ignore
-        except Exception as e:  # pragma: no cover
-            raise RuntimeError('playwright not installed. Run: pip install playwright && playwright install') from e
+        blocker = blocker_for(body, [url])
 
         out_dir = os.path.join(os.path.dirname(__file__), 'results', 'service_cdp')
         ensure_dir(out_dir)
-        with sync_playwright() as p:
-            browser = p.chromium.connect_over_cdp(cdp_url)
-            context = browser.new_context()
-            page = context.new_page()
-            try:
-                page.goto(url, timeout=15000)
-                try:
-                    page.wait_for_function(
-                        "document.readyState === 'complete' || document.readyState === 'interactive'",
-                        timeout=8000,
-                    )
-                except Exception:
-                    pass
-                file = os.path.join(out_dir, f"{timestamp('cdp_')}.png")
-                page.screenshot(path=file, full_page=full_page)
-                return self._send(200, { 'success': True, 'image': file })
-            finally:
-                try:
-                    context.close()
-                except Exception:
-                    pass
-                try:
-                    browser.close()
-                except Exception:
-                    pass
+        started = time.monotonic()
+        saved = CDP_CONNECTIONS.run(
+            cdp_url, _capture_over_cdp, url, full_page, out_dir, 'cdp_', blocker, _read_budget(body),
+        )
+        elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+        payload: Dict[str, Any] = {
+            'success': True,
+            'image': saved.result(),
+            'elapsed_ms': elapsed_ms,
+        }
+        if blocker is not None:
+            payload['resources'] = blocker.report()
+        return self._send(200, payload)
 
     def _handle_cdp_close(self, body: Dict[str, Any]):
         base_url: str = body.get('base_url') or os.environ.get('TZAFON_BASE_URL') or 'https://v2.tzafon.ai'
@@ -319,13 +883,13 @@ class Handler(BaseHTTPRequestHandler):
             raise ValueError('Missing token (set body.token or TZAFON_API_KEY)')
         if not computer_id:
             raise ValueError('Missing computer_id')
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Accept': 'application/json',
-        }
-        url = f"{base_url.rstrip('/')}/v1/computers/{computer_id}"
+        url = _computer_url(base_url, computer_id)
+        # Drop any cached CDP session to this computer (same URL as /cdp/create)
+        CDP_CONNECTIONS.discard(f"{url}/cdp?token={token}")
+        if COMPUTER_POOL is not None:
+            COMPUTER_POOL.forget(computer_id)
         try:
-            resp = requests.request('DELETE', url, headers=headers, timeout=30)
+            resp = _delete_computer(base_url, token, computer_id)
             # 404/410 treat as already closed
             if resp.status_code in (404, 410):
                 return self._send(200, { 'success': True, 'closed': True })
@@ -338,43 +902,9 @@ class Handler(BaseHTTPRequestHandler):
     # --- Local CDP management (no tzafon) ---
     def _handle_local_cdp_create(self, body: Dict[str, Any]):
         headless = bool(body.get('headless', True))
-        port = int(body.get('port') or 0) or _find_free_port()
-        try:
-            from playwright.sync_api import sync_playwright  # type: ignore
-        except Exception as e:  # pragma: no cover
-            raise RuntimeError('playwright not installed. Run: pip install playwright && playwright install') from e
-
-        # Start a dedicated Playwright instance for this browser
-        p = sync_playwright().start()
-        browser = None
-        try:
-            browser = p.chromium.launch(headless=headless, args=[f'--remote-debugging-port={port}'])
-        except Exception:
-            # Cleanup playwright on failure
-            try:
-                p.stop()
-            except Exception:
-                pass
-            raise
-
-        # Fetch WS debugger URL
-        ws_url: Optional[str] = None
-        try:
-            meta = requests.get(f'http://127.0.0.1:{port}/json/version', timeout=5).json()
-            ws_url = meta.get('webSocketDebuggerUrl')
-        except Exception:
-            ws_url = None
-
-        instance_id = uuid.uuid4().hex[:12]
-        LOCAL_CDP[instance_id] = { 'p': p, 'browser': browser, 'port': port, 'headless': headless }
-        return self._send(200, {
-            'success': True,
-            'id': instance_id,
-            'cdp_url': f'http://127.0.0.1:{port}',
-            'ws_url': ws_url,
-            'port': port,
-            'headless': headless,
-        })
+        port = int(body.get('port') or 0) or None
+        instance = LOCAL_CDP.create(headless=headless, port=port)
+        return self._send(200, dict(instance, success=True))
 
     def _handle_local_cdp_screenshot(self, body: Dict[str, Any]):
         # Accept either id (server-managed) or raw cdp_url/ws_url
@@ -392,73 +922,68 @@ class Handler(BaseHTTPRequestHandler):
             entry = LOCAL_CDP.get(instance_id)
             if not entry:
                 raise ValueError('Unknown id')
-            cdp_url = f"http://127.0.0.1:{entry['port']}"
+            cdp_url = entry.cdp_url
+        blocker = blocker_for(body, [url])
 
-        # Connect over CDP and take screenshot
+        # Screenshot over a cached CDP connection
         out_dir = os.path.join(os.path.dirname(__file__), 'results', 'service_local_cdp')
         ensure_dir(out_dir)
-        try:
-            from playwright.sync_api import sync_playwright  # type: ignore
-        except Exception as e:  # pragma: no cover
-            raise RuntimeError('playwright not installed. Run: pip install playwright && playwright install') from e
-
-        with sync_playwright() as p:
-            endpoint = ws_url or cdp_url
-            assert endpoint is not None
-            browser = p.chromium.connect_over_cdp(endpoint)
-            context = browser.new_context()
-            page = context.new_page()
-            try:
-                page.goto(url, timeout=15000)
-                try:
-                    page.wait_for_function(
-                        "document.readyState === 'complete' || document.readyState === 'interactive'",
-                        timeout=8000,
-                    )
-                except Exception:
-                    pass
-                file = os.path.join(out_dir, f"{timestamp('localcdp_')}.png")
-                page.screenshot(path=file, full_page=full_page)
-                return self._send(200, { 'success': True, 'image': file })
-            finally:
-                try:
-                    context.close()
-                except Exception:
-                    pass
-                try:
-                    browser.close()
-                except Exception:
-                    pass
+        endpoint = ws_url or cdp_url
+        assert endpoint is not None
+        LOCAL_CDP.touch_endpoint(endpoint)
+        started = time.monotonic()
+        saved = CDP_CONNECTIONS.run(
+            endpoint, _capture_over_cdp, url, full_page, out_dir, 'localcdp_', blocker, _read_budget(body),
+        )
+        elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+        payload: Dict[str, Any] = {
+            'success': True,
+            'image': saved.result(),
+            'elapsed_ms': elapsed_ms,
+        }
+        if blocker is not None:
+            payload['resources'] = blocker.report()
+        return self._send(200, payload)
 
     def _handle_local_cdp_close(self, body: Dict[str, Any]):
         instance_id: Optional[str] = body.get('id')
         if not instance_id:
             raise ValueError('Missing id')
-        entry = LOCAL_CDP.pop(instance_id, None)
-        if not entry:
-            return self._send(200, { 'success': True, 'closed': True })
-        # Close browser and stop playwright
-        try:
-            entry['browser'].close()
-        except Exception:
-            pass
-        try:
-            entry['p'].stop()
-        except Exception:
-            pass
+        LOCAL_CDP.close(instance_id)
         return self._send(200, { 'success': True, 'closed': True })
 
 
 def main() -> None:
     port = int(os.environ.get('PLAYWRIGHT_SERVICE_PORT', '8002'))
-    server = HTTPServer(('0.0.0.0', port), Handler)
-    print(f"[py-playwright-service] listening on :{port}")
+    pool = _browser_pool()
+    print(f"[py-playwright-service] browser pool ready ({pool.size} browsers)")
+    LOCAL_CDP.start_reaper()
+    CDP_CONNECTIONS.start_reaper()
+    workers = int(os.environ.get('PLAYWRIGHT_SERVICE_WORKERS', '8'))
+    # One pooled API connection per worker, plus room for the computer pool's filler
+    http_client.configure(workers + int(os.environ.get('COMPUTER_POOL_SIZE', '0')))
+    global COMPUTER_POOL
+    COMPUTER_POOL = _computer_pool()
+    if COMPUTER_POOL is not None:
+        COMPUTER_POOL.start()
+        print(f"[py-playwright-service] computer pool filling ({COMPUTER_POOL.size} ready, max {COMPUTER_POOL.max_total})")
+    backlog = int(os.environ.get('PLAYWRIGHT_SERVICE_BACKLOG', '128'))
+    keepalive_s = float(os.environ.get('PLAYWRIGHT_SERVICE_KEEPALIVE_S', '15'))
+    server = PooledHTTPServer(('0.0.0.0', port), Handler, workers=workers, backlog=backlog, keepalive_s=keepalive_s)
+    print(f"[py-playwright-service] listening on :{port} ({workers} workers)")
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         pass
     finally:
         server.server_close()
+        WRITER.close()
+        LOCAL_CDP.close_all()
+        CDP_CONNECTIONS.close_all()
+        pool.close()
+        READINESS.save()
+        if COMPUTER_POOL is not None:
+            COMPUTER_POOL.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,272 @@
+import json
+import queue
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from http.server import HTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+class _Connection:
+    __slots__ = ('request', 'client_address', 'handler', 'idle_since')
+
+    def __init__(self, request: Any, client_address: Any) -> None:
+        self.request = request
+        self.client_address = client_address
+        self.handler: Any = None
+        self.idle_since = 0.0
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands connections to a fixed set of worker threads.
+
+    Unlike ``ThreadingHTTPServer`` the number of threads is bounded: once
+    every worker is busy and the hand-off queue is full, the accept loop
+    stops pulling connections and new clients wait in the kernel's listen
+    backlog (``backlog``).
+
+    A worker serves one request at a time, not a whole connection. Between
+    requests a keep-alive connection waits in a selector on a single idle
+    thread and goes back to the workers when its next request arrives, so
+    idle clients never hold a worker. Connections idle for ``keepalive_s``
+    are closed. The handler's ``timeout`` only bounds reading a request.
+    The idle thread never blocks on the workers: a connection whose next
+    request arrives while every worker is busy waits on that thread's
+    hand-off list, and the hand-off is retried every ``HANDOFF_RETRY_S``.
+    """
+
+    HANDOFF_RETRY_S = 0.05
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        server_address: Tuple[str, int],
+        handler_class: Any,
+        workers: int = 8,
+        backlog: int = 128,
+        keepalive_s: float = 15.0,
+    ) -> None:
+        self.workers = max(1, int(workers))
+        self.request_queue_size = max(1, int(backlog))
+        self.keepalive_s = max(0.0, float(keepalive_s))
+        self._requests: 'queue.Queue[Optional[_Connection]]' = queue.Queue(maxsize=self.workers)
+        self._parking: 'queue.SimpleQueue[_Connection]' = queue.SimpleQueue()
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._closing = threading.Event()
+        self._threads: List[threading.Thread] = []
+        super().__init__(server_address, handler_class)
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f'http-worker-{i}', daemon=self.daemon_threads)
+            t.start()
+            self._threads.append(t)
+        self._idle = threading.Thread(target=self._watch_idle, name='http-idle', daemon=True)
+        self._idle.start()
+
+    def _work(self) -> None:
+        while True:
+            conn = self._requests.get()
+            if conn is None:
+                return
+            try:
+                keep = self._serve(conn)
+            except Exception:
+                self.handle_error(conn.request, conn.client_address)
+                keep = False
+            if keep and not self._closing.is_set():
+                self._park(conn)
+            else:
+                self._close(conn)
+
+    def _serve(self, conn: _Connection) -> bool:
+        """Handle the connection's next request(s); True if it stays open for keep-alive."""
+        handler = conn.handler
+        if handler is None:
+            # BaseHTTPRequestHandler.handle() minus its loop: one request per pass
+            handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+            handler.request = handler.connection = conn.request
+            handler.client_address = conn.client_address
+            handler.server = self
+            handler.setup()
+            conn.handler = handler
+        while True:
+            handler.close_connection = True
+            handler.handle_one_request()
+            if handler.close_connection:
+                return False
+            if not _buffered(handler):
+                return True
+            # A pipelined request is already in the read buffer: the selector would not see it
+
+    def _park(self, conn: _Connection) -> None:
+        conn.idle_since = time.monotonic()
+        self._parking.put(conn)
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass  # already woken (buffer full) or closing
+
+    def _watch_idle(self) -> None:
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        idle: Dict[int, _Connection] = {}
+        ready: Deque[_Connection] = deque()  # next request arrived, no free worker yet
+        while not self._closing.is_set():
+            timeout = min(1.0, self.keepalive_s) if idle else None
+            if ready:
+                timeout = self.HANDOFF_RETRY_S
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                conn = key.data
+                self._selector.unregister(key.fileobj)
+                del idle[id(conn)]
+                # Next request (or EOF) arrived; waits for a free worker like a new connection
+                ready.append(conn)
+            while ready:
+                try:
+                    self._requests.put_nowait(ready[0])
+                except queue.Full:
+                    break
+                ready.popleft()
+            while True:
+                try:
+                    conn = self._parking.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    self._selector.register(conn.request, selectors.EVENT_READ, conn)
+                except (ValueError, OSError):
+                    self._close(conn)
+                    continue
+                idle[id(conn)] = conn
+            cutoff = time.monotonic() - self.keepalive_s
+            for key in [k for k, c in idle.items() if c.idle_since <= cutoff]:
+                conn = idle.pop(key)
+                self._selector.unregister(conn.request)
+                self._close(conn)
+        for conn in list(idle.values()) + list(ready):
+            self._close(conn)
+
+    def _close(self, conn: _Connection) -> None:
+        if conn.handler is not None:
+            try:
+                conn.handler.finish()
+            except Exception:
+                pass
+        self.shutdown_request(conn.request)
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        # Blocks the accept loop while every worker is busy (backpressure).
+        self._requests.put(_Connection(request, client_address))
+
+    def server_close(self) -> None:
+        super().server_close()
+        self._closing.set()
+        self._wake()
+        self._idle.join(timeout=5)
+        for _ in self._threads:
+            try:
+                self._requests.put(None, timeout=5)
+            except queue.Full:
+                break
+        for t in self._threads:
+            t.join(timeout=5)
+        while True:
+            try:
+                self._close(self._parking.get_nowait())
+            except queue.Empty:
+                break
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
+
+def _buffered(handler: Any) -> bool:
+    """True if the handler's read buffer (or the socket, right now) holds more bytes."""
+    peek = getattr(handler.rfile, 'peek', None)
+    if peek is None:
+        return False
+    sock = handler.connection
+    try:
+        sock.setblocking(False)
+        return bool(peek(1))
+    except OSError:
+        return False
+    finally:
+        try:
+            sock.settimeout(handler.timeout)
+        except OSError:
+            pass
+
+
+class ChunkedResponseMixin:
+    """Streaming responses for ``BaseHTTPRequestHandler`` subclasses.
+
+    Uses chunked transfer encoding so results can be written as they are
+    produced while the connection stays usable for keep-alive. Bodies are
+    either NDJSON records or ``multipart/mixed`` parts carrying raw bytes;
+    part payloads are written as their own chunk, never concatenated.
+    Once a stream has started its status is on the wire: ``_abort_stream``
+    tells an error path to drop the connection instead of sending another.
+    """
+
+    _streaming = False
+
+    def _start_chunked(self, status: int, content_type: str) -> None:
+        self.send_response(status)  # type: ignore[attr-defined]
+        self.send_header('Content-Type', content_type)  # type: ignore[attr-defined]
+        self.send_header('Transfer-Encoding', 'chunked')  # type: ignore[attr-defined]
+        self.end_headers()  # type: ignore[attr-defined]
+        self._streaming = True
+
+    def _abort_stream(self) -> bool:
+        """If a chunked response is under way, mark the connection for closing; True if so."""
+        if not self._streaming:
+            return False
+        self._streaming = False
+        self.close_connection = True
+        return True
+
+    def _write_chunk(self, data: bytes) -> None:
+        if not data:
+            return
+        wfile = self.wfile  # type: ignore[attr-defined]
+        wfile.write(f'{len(data):X}\r\n'.encode('ascii'))
+        wfile.write(data)
+        wfile.write(b'\r\n')
+        wfile.flush()
+
+    def _end_chunked(self) -> None:
+        self.wfile.write(b'0\r\n\r\n')  # type: ignore[attr-defined]
+        self.wfile.flush()  # type: ignore[attr-defined]
+        self._streaming = False
+
+    def _write_ndjson(self, record: Any) -> None:
+        self._write_chunk(json.dumps(record).encode('utf-8') + b'\n')
+
+    def _start_multipart(self, status: int, boundary: str) -> None:
+        self._start_chunked(status, f'multipart/mixed; boundary={boundary}')
+
+    def _write_part(self, boundary: str, content_type: str, data: bytes, headers: Optional[Dict[str, str]] = None) -> None:
+        lines = [f'--{boundary}', f'Content-Type: {content_type}', f'Content-Length: {len(data)}']
+        lines.extend(f'{name}: {value}' for name, value in (headers or {}).items())
+        self._write_chunk(('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8'))
+        self._write_chunk(data)
+        self._write_chunk(b'\r\n')
+
+    def _end_multipart(self, boundary: str) -> None:
+        self._write_chunk(f'--{boundary}--\r\n'.encode('utf-8'))
+        self._end_chunked()
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+try:  # cross-process backend (POSIX only)
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover - e.g. Windows
+    fcntl = None  # type: ignore
+
+
+class TokenBucket:
+    """Token bucket pacing calls to ``rate`` per second with bursts of up to ``burst``.
+
+    ``acquire()`` takes a token, sleeping until one is available. Callers
+    reserve their slot before sleeping, so waiters are served in order and
+    never retry in a burst. With ``path`` the bucket state lives in that
+    file under ``flock``, so every process on the host using the same path
+    shares one budget; otherwise it is shared by the threads of this process.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, path: Optional[str] = None) -> None:
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        if path and fcntl is None:
+            print('[rate-limit] file locking unavailable; limiting this process only')
+            path = None
+        self.path = path
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._acquired = 0
+        self._waited_s = 0.0
+
+    @classmethod
+    def from_env(cls) -> Optional['TokenBucket']:
+        """Build from CREATE_RATE_* variables; None when CREATE_RATE_PER_S is unset or 0."""
+        rate = float(os.environ.get('CREATE_RATE_PER_S', '0') or 0)
+        if rate <= 0:
+            return None
+        return cls(
+            rate,
+            burst=int(os.environ.get('CREATE_RATE_BURST', '5')),
+            path=os.environ.get('CREATE_RATE_FILE') or None,
+        )
+
+    def acquire(self) -> float:
+        """Take one token; returns the seconds slept for it."""
+        with self._lock:
+            # The process lock also keeps threads from interleaving on the shared file
+            wait = self._reserve_shared() if self.path else self._reserve_local()
+            self._acquired += 1
+            self._waited_s += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'rate_per_s': self.rate,
+                'burst': self.burst,
+                'shared_file': self.path,
+                'acquired': self._acquired,
+                'waited_s': round(self._waited_s, 2),
+            }
+
+    # --- internals (lock held) ---
+    def _take(self, tokens: float, last: float, now: float) -> Tuple[float, float]:
+        # Refill, then spend; a negative balance is the queue of reserved slots
+        tokens = min(float(self.burst), tokens + max(0.0, now - last) * self.rate) - 1.0
+        return tokens, (-tokens / self.rate if tokens < 0 else 0.0)
+
+    def _reserve_local(self) -> float:
+        now = time.monotonic()
+        self._tokens, wait = self._take(self._tokens, self._last, now)
+        self._last = now
+        return wait
+
+    def _reserve_shared(self) -> float:
+        assert self.path is not None
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            now = time.time()  # wall clock: comparable across processes
+            tokens, last = float(self.burst), now
+            raw = os.pread(fd, 64, 0).decode('ascii', 'replace').split()
+            if len(raw) == 2:
+                try:
+                    tokens, last = float(raw[0]), float(raw[1])
+                except ValueError:
+                    pass
+            tokens, wait = self._take(tokens, last, now)
+            state = f'{tokens:.6f} {now:.6f}\n'.encode('ascii')
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, state, 0)
+            return wait
+        finally:
+            os.close(fd)  # releases the flock
+
+
+_CREATE: Optional[TokenBucket] = None
+_CREATE_LOCK = threading.Lock()
+_CREATE_READY = False
+
+
+def create_limiter() -> Optional[TokenBucket]:
+    """The bucket shared by every computer-create call in this process (None when disabled)."""
+    global _CREATE, _CREATE_READY
+    with _CREATE_LOCK:
+        if not _CREATE_READY:
+            _CREATE = TokenBucket.from_env()
+            _CREATE_READY = True
+        return _CREATE
+
+
+def throttle_create() -> float:
+    """Wait for a computer-create token; call right before each create (including retries)."""
+    bucket = create_limiter()
+    return bucket.acquire() if bucket is not None else 0.0
@@ -0,0 +1,276 @@
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+from utils import ensure_dir
+
+# Installed on every new document: remembers when the DOM and the root box last changed
+# and counts fetch/XHR requests in flight, so a page that settled while an earlier one
+# was being captured is ready immediately
+_INIT_JS = """
+(() => {
+  if (window.__readiness) return;
+  const r = window.__readiness = { mutation: 0, resize: 0, network: 0, pending: 0 };
+  // The default 250-entry buffer fills up on heavy pages and then stops recording
+  if (performance.setResourceTimingBufferSize) performance.setResourceTimingBufferSize(10000);
+  new MutationObserver(() => { r.mutation = performance.now(); })
+    .observe(document, { subtree: true, childList: true, characterData: true });
+  const watch = () => new ResizeObserver(() => { r.resize = performance.now(); }).observe(document.documentElement);
+  if (document.documentElement) watch(); else document.addEventListener('DOMContentLoaded', watch, { once: true });
+  const begin = () => { r.pending++; r.network = performance.now(); };
+  const end = () => { r.pending = Math.max(0, r.pending - 1); r.network = performance.now(); };
+  if (window.fetch) {
+    const fetch = window.fetch;
+    window.fetch = function (...args) {
+      begin();
+      try {
+        const p = fetch.apply(this, args);
+        p.then(end, end);
+        return p;
+      } catch (e) {
+        end();
+        throw e;
+      }
+    };
+  }
+  const send = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function (...args) {
+    begin();
+    this.addEventListener('loadend', end, { once: true });
+    try {
+      return send.apply(this, args);
+    } catch (e) {
+      end();
+      throw e;
+    }
+  };
+})();
+"""
+
+# Resolves once the network, the DOM and the layout have all been quiet for quietMs
+# (or the budget runs out). Times are page-clock milliseconds. settled_ms is when the
+# last activity happened, relative to DOMContentLoaded, so time spent waiting for this
+# check to start (e.g. queued behind other tabs) is not counted.
+_WAIT_JS = """
+({ budgetMs, quietMs }) => new Promise(resolve => {
+  const start = performance.now();
+  let r = window.__readiness;
+  let layout = r ? 0 : start;
+  if (!r) {
+    // No init script on this page: start observing now and assume it just changed
+    r = { mutation: start, resize: start, network: 0, pending: 0 };
+    new MutationObserver(() => { r.mutation = performance.now(); })
+      .observe(document, { subtree: true, childList: true, characterData: true });
+  }
+  let size = '';
+  const nav = () => performance.getEntriesByType('navigation')[0];
+  const network = now => r.pending > 0 ? now : performance.getEntriesByType('resource')
+    .reduce((m, e) => Math.max(m, e.responseEnd), r.network);
+  const sinceDcl = t => {
+    const n = nav();
+    return n && n.domContentLoadedEventEnd ? Math.max(0, t - n.domContentLoadedEventEnd) : 0;
+  };
+  const tick = () => {
+    const now = performance.now();
+    const el = document.documentElement;
+    const next = el ? `${el.scrollWidth}x${el.scrollHeight}` : '';
+    if (size && next !== size) layout = now;
+    size = next;
+    const n = nav();
+    const last = {
+      load: document.readyState === 'complete' ? (n && n.loadEventEnd) || 0 : now,
+      network: network(now),
+      dom: r.mutation,
+      layout: Math.max(layout, r.resize),
+    };
+    const busy = Object.keys(last).reduce((a, b) => (last[a] >= last[b] ? a : b));
+    const waited = now - start;
+    if (now - last[busy] >= quietMs || waited >= budgetMs) {
+      resolve({ ready: now - last[busy] >= quietMs, waited_ms: waited, settled_ms: sinceDcl(last[busy]), busy });
+      return;
+    }
+    setTimeout(tick, 50);
+  };
+  tick();
+})
+"""
+
+
+def host_of(url: str) -> str:
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class Readiness:
+    """Adaptive "is the page ready to capture" engine.
+
+    With Playwright, ``wait`` runs one in-page check that resolves once the
+    network (fetch/XHR in flight and resource timing), the DOM
+    (MutationObserver) and the layout (document size) have all been quiet
+    for ``quiet_ms``, or after the budget. Each result feeds a per-host
+    moving average of how long after DOMContentLoaded the host's last
+    activity came; averages are saved to ``path`` and reloaded on start.
+    For a host already learned, the budget shrinks to that time (with a
+    margin) plus ``quiet_ms``, so pages that never go quiet stop costing
+    the full ``budget_ms``.
+
+    Tzafon computers cannot run page scripts, so ``settle`` measures
+    nothing: it waits for the time learned by Playwright captures sharing
+    ``path`` (with a margin), falling back to ``default_ms`` for hosts they
+    never measured.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        budget_ms: float = 5000.0,
+        quiet_ms: float = 500.0,
+        default_ms: float = 2000.0,
+        alpha: float = 0.3,
+        margin: float = 1.25,
+        save_interval_s: float = 5.0,
+    ) -> None:
+        self.path = path
+        self.budget_ms = max(0.0, float(budget_ms))
+        self.quiet_ms = max(0.0, float(quiet_ms))
+        self.default_ms = max(0.0, float(default_ms))
+        self.alpha = min(1.0, max(0.01, float(alpha)))
+        self.margin = max(1.0, float(margin))
+        self.save_interval_s = float(save_interval_s)
+        self._hosts: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._waits = 0
+        self._timeouts = 0
+        self._waited_ms = 0.0
+        if path:
+            self._load()
+            atexit.register(self.save)
+
+    @classmethod
+    def from_env(cls) -> 'Readiness':
+        """Build from READINESS_* variables; learned waits live in READINESS_STATE_FILE."""
+        default_path = os.path.join(os.path.dirname(__file__), 'results', 'readiness.json')
+        return cls(
+            path=os.environ.get('READINESS_STATE_FILE', default_path) or None,
+            budget_ms=float(os.environ.get('READINESS_BUDGET_MS', '5000')),
+            quiet_ms=float(os.environ.get('READINESS_QUIET_MS', '500')),
+            default_ms=float(os.environ.get('READINESS_DEFAULT_MS', '2000')),
+        )
+
+    # --- Playwright ---
+    def install(self, context: Any) -> None:
+        """Start tracking DOM/layout changes from the first byte of every page in ``context``."""
+        context.add_init_script(_INIT_JS)
+
+    def wait(self, page: Any, url: str, budget_ms: Optional[float] = None) -> Dict[str, Any]:
+        """Wait until ``page`` is ready and learn from it; returns the in-page report."""
+        budget = self.budget_for(url) if budget_ms is None else max(0.0, float(budget_ms))
+        try:
+            report = page.evaluate(_WAIT_JS, {'budgetMs': budget, 'quietMs': self.quiet_ms})
+        except Exception as e:  # noqa: BLE001
+            # Navigated away or the context closed: capture what is there
+            return {'ready': False, 'waited_ms': 0.0, 'error': str(e)}
+        self.record(url, float(report.get('settled_ms') or 0.0), bool(report.get('ready')), float(report.get('waited_ms') or 0.0))
+        return report
+
+    def budget_for(self, url: str) -> float:
+        """Wait budget for a Playwright capture of ``url``: the learned time plus one quiet window.
+
+        A timed-out wait still records when the page was last busy, so a
+        budget that turns out too short grows again.
+        """
+        with self._lock:
+            known = host_of(url) in self._hosts
+        if not known:
+            return self.budget_ms
+        return min(self.budget_ms, self.learned_ms(url) + self.quiet_ms)
+
+    # --- Tzafon ---
+    def learned_ms(self, url: str) -> float:
+        with self._lock:
+            entry = self._hosts.get(host_of(url))
+        if entry is None:
+            return self.default_ms
+        return min(self.budget_ms, entry['ewma_ms'] * self.margin)
+
+    def settle(self, computer: Any, url: str) -> float:
+        """``computer.wait`` for the ready time Playwright learned for ``url``'s host; returns seconds waited.
+
+        Nothing is recorded: a Tzafon computer gives no signal of when the page settled.
+        """
+        seconds = round(self.learned_ms(url) / 1000.0, 2)
+        if seconds > 0:
+            try:
+                computer.wait(seconds)
+            except Exception:
+                pass
+        return seconds
+
+    # --- learning/persistence ---
+    def record(self, url: str, ready_ms: float, ready: bool = True, waited_ms: float = 0.0) -> None:
+        host = host_of(url)
+        if not host:
+            return
+        with self._lock:
+            self._waits += 1
+            self._timeouts += 0 if ready else 1
+            self._waited_ms += waited_ms
+            entry = self._hosts.get(host)
+            if entry is None:
+                self._hosts[host] = {'ewma_ms': ready_ms, 'samples': 1}
+            else:
+                entry['ewma_ms'] += self.alpha * (ready_ms - entry['ewma_ms'])
+                entry['samples'] += 1
+            self._dirty = True
+            due = time.monotonic() - self._saved_at >= self.save_interval_s
+        if due:
+            self.save()
+
+    def _load(self) -> None:
+        assert self.path is not None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                hosts = json.load(f).get('hosts') or {}
+        except Exception:
+            return
+        for host, entry in hosts.items():
+            try:
+                self._hosts[host] = {'ewma_ms': float(entry['ewma_ms']), 'samples': int(entry.get('samples', 1))}
+            except Exception:
+                continue
+
+    def save(self) -> None:
+        """Write the learned waits (atomically) if anything changed; last writer wins."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {'hosts': {h: dict(e) for h, e in self._hosts.items()}}
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        try:
+            ensure_dir(os.path.dirname(self.path) or '.')
+            tmp = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except Exception as e:  # noqa: BLE001
+            print(f"[readiness] could not save {self.path}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'hosts': len(self._hosts),
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': round(self._waited_ms / self._waits, 1) if self._waits else None,
+                'budget_ms': self.budget_ms,
+                'quiet_ms': self.quiet_ms,
+            }
@@ -0,0 +1,188 @@
+import threading
+from typing import Any, Dict, Iterable, Optional, Set
+from urllib.parse import urlparse
+
+# Analytics, tag-manager and ad hosts; subdomains match too
+TRACKER_DOMAINS = frozenset({
+    'google-analytics.com',
+    'googletagmanager.com',
+    'googletagservices.com',
+    'googlesyndication.com',
+    'googleadservices.com',
+    'doubleclick.net',
+    'adservice.google.com',
+    'facebook.net',
+    'connect.facebook.net',
+    'analytics.twitter.com',
+    'ads-twitter.com',
+    'static.ads-twitter.com',
+    'bat.bing.com',
+    'clarity.ms',
+    'hotjar.com',
+    'segment.com',
+    'segment.io',
+    'mixpanel.com',
+    'amplitude.com',
+    'fullstory.com',
+    'newrelic.com',
+    'nr-data.net',
+    'scorecardresearch.com',
+    'quantserve.com',
+    'criteo.com',
+    'criteo.net',
+    'taboola.com',
+    'outbrain.com',
+    'adnxs.com',
+    'amazon-adsystem.com',
+    'moatads.com',
+    'chartbeat.com',
+    'optimizely.com',
+})
+
+# What each named profile blocks. 'full' installs no route at all.
+PROFILES: Dict[str, Dict[str, Any]] = {
+    'full': {},
+    'no-trackers': {'domains': TRACKER_DOMAINS},
+    'no-media': {'types': frozenset({'media', 'font'})},
+    'lite': {'domains': TRACKER_DOMAINS, 'types': frozenset({'media', 'font'})},
+    'allowlist': {'allowlist': True},
+}
+
+# Fallback sizes (bytes) for estimating what a blocked request would have cost
+_DEFAULT_SIZES = {
+    'script': 40_000,
+    'image': 30_000,
+    'media': 500_000,
+    'font': 40_000,
+    'stylesheet': 20_000,
+    'xhr': 5_000,
+    'fetch': 5_000,
+}
+
+# Running per-resource-type average of observed response sizes, shared by all requests
+_SIZES: Dict[str, list] = {}
+_SIZES_LOCK = threading.Lock()
+
+
+def _record_size(resource_type: str, size: int) -> None:
+    with _SIZES_LOCK:
+        stats = _SIZES.setdefault(resource_type, [0, 0])
+        stats[0] += 1
+        stats[1] += size
+
+
+def _estimated_size(resource_type: str) -> int:
+    with _SIZES_LOCK:
+        stats = _SIZES.get(resource_type)
+        if stats and stats[0]:
+            return stats[1] // stats[0]
+    return _DEFAULT_SIZES.get(resource_type, 10_000)
+
+
+def _host_matches(host: str, domains: Iterable[str]) -> bool:
+    return any(host == d or host.endswith('.' + d) for d in domains)
+
+
+class ResourceBlocker:
+    """Per-context request filter for one named profile.
+
+    ``attach`` installs a Playwright route on the context. Blocked requests
+    are aborted and counted; since their size is unknown, ``bytes_saved``
+    is estimated from the average size of responses of the same resource
+    type seen so far. In ``allowlist`` mode only requests to the page hosts
+    (and their subdomains) plus ``allow_hosts`` go through.
+    """
+
+    def __init__(self, profile: str = 'full', page_urls: Iterable[str] = (), allow_hosts: Iterable[str] = ()) -> None:
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile '{profile}' (choose from {', '.join(PROFILES)})")
+        self.profile = profile
+        spec = PROFILES[profile]
+        self._domains: Set[str] = set(spec.get('domains') or ())
+        self._types: Set[str] = set(spec.get('types') or ())
+        self._allowlist = bool(spec.get('allowlist'))
+        self._allow: Set[str] = {h.lower() for h in allow_hosts if h}
+        for u in page_urls:
+            host = urlparse(u).hostname
+            if host:
+                self._allow.add(host.lower()[4:] if host.lower().startswith('www.') else host.lower())
+        self.blocked = 0
+        self.allowed = 0
+        self.bytes_loaded = 0
+        self.bytes_saved = 0
+        self.blocked_by_type: Dict[str, int] = {}
+
+    @property
+    def active(self) -> bool:
+        return bool(self._domains or self._types or self._allowlist)
+
+    def attach(self, context: Any) -> None:
+        context.on('response', self._on_response)
+        if self.active:
+            context.route('**/*', self._route)
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if resource_type == 'document':
+            return False
+        host = (urlparse(url).hostname or '').lower()
+        if self._allowlist:
+            return not _host_matches(host, self._allow)
+        if resource_type in self._types:
+            return True
+        return bool(host) and _host_matches(host, self._domains)
+
+    def _route(self, route: Any, request: Any) -> None:
+        resource_type = request.resource_type
+        if self.should_block(request.url, resource_type):
+            self.blocked += 1
+            self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+            self.bytes_saved += _estimated_size(resource_type)
+            route.abort('blockedbyclient')
+            return
+        self.allowed += 1
+        route.continue_()
+
+    def _on_response(self, response: Any) -> None:
+        try:
+            size = int(response.headers.get('content-length') or 0)
+        except Exception:
+            size = 0
+        if size <= 0:
+            return
+        self.bytes_loaded += size
+        try:
+            _record_size(response.request.resource_type, size)
+        except Exception:
+            pass
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            'profile': self.profile,
+            'blocked': self.blocked,
+            'blocked_by_type': dict(self.blocked_by_type),
+            'bytes_loaded': self.bytes_loaded,
+            'bytes_saved_est': self.bytes_saved,
+        }
+
+
+def blocker_for(body: Dict[str, Any], page_urls: Iterable[str]) -> Optional[ResourceBlocker]:
+    """Build a blocker from a request body's ``profile``/``allow``; None for 'full'."""
+    profile = body.get('profile') or 'full'
+    if profile == 'full':
+        return None
+    allow = body.get('allow') or []
+    return ResourceBlocker(profile, page_urls, allow if isinstance(allow, list) else [])
+
+
+def merge_reports(reports: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Sum several ``ResourceBlocker.report()`` results; None when there are none."""
+    merged: Optional[Dict[str, Any]] = None
+    for r in reports:
+        if merged is None:
+            merged = dict(r, blocked_by_type=dict(r['blocked_by_type']))
+            continue
+        for field in ('blocked', 'bytes_loaded', 'bytes_saved_est'):
+            merged[field] += r[field]
+        for t, n in r['blocked_by_type'].items():
+            merged['blocked_by_type'][t] = merged['blocked_by_type'].get(t, 0) + n
+    return merged
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils import ensure_dir
+
+# Accounting charge per entry so payload-only entries still count against max_bytes
+_ENTRY_OVERHEAD = 1024
+
+
+class _Entry:
+    __slots__ = ('payload', 'data', 'expires_at', 'size')
+
+    def __init__(self, payload: Dict[str, Any], data: bytes, expires_at: float, size: Optional[int] = None) -> None:
+        self.payload = payload
+        self.data = data
+        self.expires_at = expires_at
+        self.size = len(data) + _ENTRY_OVERHEAD if size is None else size
+
+
+class ResultCache:
+    """In-memory TTL cache of screenshot results with optional disk spill.
+
+    Each entry holds the JSON payload returned to the client and, when
+    available, the PNG bytes. Memory use is capped at ``max_bytes`` of image
+    data; the least recently used entries beyond that are written to
+    ``spill_dir`` (if set, capped at ``max_disk_bytes``) or dropped.
+    """
+
+    def __init__(
+        self,
+        ttl_s: float = 30.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        spill_dir: Optional[str] = None,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        self.ttl_s = float(ttl_s)
+        self.max_bytes = max(0, int(max_bytes))
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max(0, int(max_disk_bytes))
+        self._mem: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._disk: 'OrderedDict[str, _Entry]' = OrderedDict()  # data lives in the spill file
+        self._mem_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        if spill_dir:
+            ensure_dir(spill_dir)
+
+    @classmethod
+    def from_env(cls) -> Optional['ResultCache']:
+        """Build the cache from SCREENSHOT_CACHE_* variables; None when disabled."""
+        ttl = float(os.environ.get('SCREENSHOT_CACHE_TTL_S', '0'))
+        if ttl <= 0:
+            return None
+        return cls(
+            ttl_s=ttl,
+            max_bytes=int(os.environ.get('SCREENSHOT_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+            spill_dir=os.environ.get('SCREENSHOT_CACHE_SPILL_DIR') or None,
+            max_disk_bytes=int(os.environ.get('SCREENSHOT_CACHE_MAX_DISK_BYTES', str(512 * 1024 * 1024))),
+        )
+
+    @staticmethod
+    def key(url: str, full_page: bool, viewport: Optional[Dict[str, int]], engine: str, **extra: Any) -> str:
+        raw = json.dumps([url, bool(full_page), viewport, engine, extra], sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._mem.move_to_end(key)
+                    self._hits += 1
+                    return entry.payload, entry.data
+                self._remove_mem(key)
+            entry = self._disk.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove_disk(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._disk.move_to_end(key)
+            self._hits += 1
+        try:
+            with open(self._spill_path(key), 'rb') as f:
+                return entry.payload, f.read()
+        except OSError:
+            with self._lock:
+                self._remove_disk(key)
+            return None
+
+    def put(self, key: str, payload: Dict[str, Any], data: bytes = b'') -> None:
+        entry = _Entry(payload, data, time.monotonic() + self.ttl_s)
+        with self._lock:
+            self._remove_mem(key)
+            self._remove_disk(key)
+            self._mem[key] = entry
+            self._mem_bytes += entry.size
+            spill = self._shrink_mem()
+        for k, e in spill:
+            self._spill(k, e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._mem) + len(self._disk),
+                'memory_bytes': self._mem_bytes,
+                'disk_bytes': self._disk_bytes,
+                'evictions': self._evictions,
+            }
+
+    # --- internals (callers hold self._lock unless noted) ---
+    def _spill_path(self, key: str) -> str:
+        assert self.spill_dir
+        return os.path.join(self.spill_dir, f'{key}.bin')
+
+    def _remove_mem(self, key: str) -> None:
+        entry = self._mem.pop(key, None)
+        if entry is not None:
+            self._mem_bytes -= entry.size
+
+    def _remove_disk(self, key: str) -> None:
+        entry = self._disk.pop(key, None)
+        if entry is None:
+            return
+        self._disk_bytes -= entry.size
+        try:
+            os.remove(self._spill_path(key))
+        except OSError:
+            pass
+
+    def _shrink_mem(self) -> list:
+        now = time.monotonic()
+        for key in [k for k, e in self._mem.items() if e.expires_at <= now]:
+            self._remove_mem(key)
+        spill = []
+        while self._mem_bytes > self.max_bytes and self._mem:
+            key, entry = self._mem.popitem(last=False)
+            self._mem_bytes -= entry.size
+            if self.spill_dir and entry.data:
+                spill.append((key, entry))
+            else:
+                self._evictions += 1
+        return spill
+
+    def _spill(self, key: str, entry: _Entry) -> None:
+        # Called without the lock: file I/O stays off the hot path
+        path = self._spill_path(key)
+        tmp = f'{path}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(entry.data)
+            os.replace(tmp, path)
+        except OSError:
+            with self._lock:
+                self._evictions += 1
+            return
+        with self._lock:
+            self._disk[key] = _Entry(entry.payload, b'', entry.expires_at, size=entry.size)
+            self._disk_bytes += entry.size
+            while self._disk_bytes > self.max_disk_bytes and self._disk:
+                oldest = next(iter(self._disk))
+                self._remove_disk(oldest)
+                self._evictions += 1
@@ -0,0 +1,486 @@
+import os
+import argparse
+import asyncio
+import itertools
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from tzafon import Computer
+from cas import dedupe
+from concurrency import AimdController
+import http_client
+from manifest import FORMATS, label_for, prefetch, read_manifest
+from rate_limit import throttle_create
+from readiness import Readiness
+from storage import new_result_path
+from utils import ensure_dir, download_to_file
+
+# Learned per-host wait between navigate and screenshot
+READINESS = Readiness.from_env()
+
+MODES = ("thread", "async")
+
+# How long a worker waits when the job source has nothing ready yet (it yielded None)
+IDLE_WAIT_S = 1.0
+_END = object()
+
+URLS = [
+    ("wikipedia", "https://www.wikipedia.org/"),
+    ("nytimes", "https://www.nytimes.com/"),
+    ("airbnb", "https://www.airbnb.com/"),
+    ("github", "https://github.com/"),
+    ("reddit", "https://www.reddit.com/"),
+]
+
+# (index, label, url, options)
+Job = Tuple[int, str, str, Dict[str, Any]]
+
+
+def select_site(site: str | None, n: int | None = None) -> Tuple[str, str]:
+    """Resolve ``--site`` (a label from URLS or a full URL); prompts when it is missing."""
+    label_to_url: Dict[str, str] = {k: v for k, v in URLS}
+    if site:
+        if site in label_to_url:
+            return site, label_to_url[site]
+        if site.startswith("http://") or site.startswith("https://"):
+            return label_for(site), site
+
+    shots = f" ({n} shots)" if n else ""
+    print(f"Choose a site to screenshot concurrently{shots}:")
+    for idx, (lbl, url) in enumerate(URLS, start=1):
+        print(f"  {idx}. {lbl} -> {url}")
+    choice = input("Enter number (1-{}): ".format(len(URLS))).strip()
+    try:
+        i = int(choice)
+        assert 1 <= i <= len(URLS)
+    except Exception:
+        i = 1
+    return URLS[i - 1]
+
+
+def repeat_jobs(label: str, url: str, n: int) -> Iterator[Job]:
+    """The same page ``n`` times, generated lazily."""
+    return ((i, label, url, {}) for i in range(n))
+
+
+def manifest_jobs(source: str, fmt: str | None = None, limit: int | None = None, prefetch_size: int = 1000) -> Iterator[Job]:
+    """Jobs from a CSV/JSONL manifest (or ``-`` for stdin), read ahead by at most ``prefetch_size`` records."""
+    records = prefetch(read_manifest(source, fmt), prefetch_size)
+    if limit is not None:
+        records = itertools.islice(records, limit)
+    return ((i, label, url, options) for i, (url, label, options) in enumerate(records))
+
+
+def _cleanup(client: object, c: object) -> None:
+    for obj in (c, client):
+        for name in ("close", "quit", "shutdown", "destroy", "stop", "end", "exit", "delete", "dispose"):
+            try:
+                fn = getattr(obj, name, None)
+                if callable(fn):
+                    fn()
+            except Exception:
+                pass
+
+    # Try client.delete(computer) or client.delete(id)
+    try:
+        delete = getattr(client, "delete", None)
+        if callable(delete):
+            try:
+                delete(c)
+            except Exception:
+                comp_id = getattr(c, "id", None)
+                if comp_id is not None:
+                    try:
+                        delete(comp_id)
+                    except Exception:
+                        pass
+    except Exception:
+        pass
+
+
+def is_capacity_error(e: Exception) -> bool:
+    msg = str(e).lower()
+    return ("429" in msg) or ("concurrent" in msg and "computer" in msg) or ("limit" in msg)
+
+
+class Runner:
+    """Capture a stream of jobs on a fixed number of workers.
+
+    ``workers`` bounds the computers in flight independently of the number
+    of jobs: jobs are pulled from the iterable one at a time as workers free
+    up, and finished results wait in a queue of ``2 * workers``, so a
+    10,000-shot run holds neither 10,000 threads nor 10,000 jobs in memory.
+    ``mode`` is ``thread`` (one thread per worker) or ``async`` (worker
+    coroutines on an event loop, running the blocking SDK calls on an
+    executor of ``workers`` threads). Files go to ``results/<name>_<label>/``.
+
+    How many of the workers actually hold a computer is decided by a shared
+    ``AimdController``: with ``adaptive`` it probes upwards while creates
+    succeed and backs off on capacity errors (429s), settling near the
+    account's real limit; otherwise all ``workers`` may create at once.
+
+    With ``reuse`` above 1 each worker keeps its computer for up to ``reuse``
+    jobs, resetting it with a blank navigation between them, instead of
+    creating one per job. The computer is replaced after a failed job or when
+    the controller has lowered the limit below the computers held.
+
+    A source that has no job ready yet (e.g. a queue still being filled) may
+    yield ``None``; the worker then waits ``IDLE_WAIT_S`` without holding the
+    intake lock, so other workers keep pulling, and asks again.
+    """
+
+    def __init__(
+        self, name: str = "runner", workers: int = 5, mode: str = "thread", retries: int = 12, client: Any = None,
+        adaptive: bool = True, reuse: int = 1,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}' (choose from {', '.join(MODES)})")
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.mode = mode
+        self.retries = max(0, int(retries))
+        self.reuse = max(1, int(reuse))
+        self._client = client
+        self.controller = AimdController.from_env(self.workers) if adaptive else AimdController.fixed(self.workers)
+        self._lock = threading.Lock()
+        self._intake = threading.Lock()  # serialises next() on the shared job iterator
+        self._started = 0.0
+        self._done = 0
+        self._failed = 0
+        self._retried = 0
+        self._created = 0
+        self._local = threading.local()  # this worker thread's _Session
+        self._sessions: Set[_Session] = set()
+
+    def run(self, jobs: Iterable[Optional[Job]]) -> Iterator[Dict[str, Any]]:
+        """Yield one result dict per job as jobs finish (not in job order)."""
+        if self._client is None:
+            self._client = Computer()
+        # Screenshot downloads reuse keep-alive connections, one per worker
+        http_client.configure(self.workers)
+        it = iter(jobs)
+        results: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=2 * self.workers)
+        stop = threading.Event()
+        if self.mode == "async":
+            drivers = [threading.Thread(target=lambda: asyncio.run(self._drive_async(it, results, stop)), daemon=True)]
+        else:
+            drivers = [threading.Thread(target=self._work, args=(it, results, stop), daemon=True) for _ in range(self.workers)]
+        self._started = time.monotonic()
+        for t in drivers:
+            t.start()
+        running = len(drivers)
+        try:
+            while running:
+                result = results.get()
+                if result is None:
+                    running -= 1
+                    continue
+                yield result
+        finally:
+            # Consumer gave up early: let workers finish their current job and exit
+            stop.set()
+            while running:
+                if results.get() is None:
+                    running -= 1
+            self._close_sessions()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = time.monotonic() - self._started if self._started else 0.0
+            return {
+                "workers": self.workers,
+                "mode": self.mode,
+                "done": self._done,
+                "failed": self._failed,
+                "retried": self._retried,
+                "computers_created": self._created,
+                "creates_per_shot": round(self._created / self._done, 3) if self._done else 0.0,
+                "concurrency": self.controller.stats(),
+                "elapsed_s": round(elapsed, 1),
+                "shots_per_s": round(self._done / elapsed, 2) if elapsed > 0 else 0.0,
+            }
+
+    # --- internals ---
+    def _pull(self, it: Iterator[Optional[Job]], stop: threading.Event) -> Any:
+        """The next job, None when the source has none ready, or _END."""
+        with self._intake:
+            if stop.is_set():
+                return _END
+            return next(it, _END)
+
+    def _next(self, it: Iterator[Optional[Job]], stop: threading.Event) -> Optional[Job]:
+        while True:
+            job = self._pull(it, stop)
+            if job is not None:
+                return None if job is _END else job
+            stop.wait(IDLE_WAIT_S)
+
+    def _work(self, it: Iterator[Optional[Job]], results: "queue.Queue[Optional[Dict[str, Any]]]", stop: threading.Event) -> None:
+        try:
+            while True:
+                job = self._next(it, stop)
+                if job is None:
+                    return
+                results.put(self._capture(job))
+        finally:
+            results.put(None)
+
+    async def _drive_async(self, it: Iterator[Optional[Job]], results: "queue.Queue[Optional[Dict[str, Any]]]", stop: threading.Event) -> None:
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-worker")
+
+        async def worker() -> None:
+            while True:
+                # Pulling may block on the intake lock or a slow manifest; keep it off the event loop
+                job = await loop.run_in_executor(executor, self._pull, it, stop)
+                if job is _END:
+                    return
+                if job is None:
+                    await asyncio.sleep(IDLE_WAIT_S)
+                    continue
+                # results.put may block on a slow consumer; keep it off the event loop
+                await loop.run_in_executor(executor, lambda j=job: results.put(self._capture(j)))
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.workers)))
+        finally:
+            executor.shutdown(wait=True)
+            results.put(None)
+
+    def _capture(self, job: Job) -> Dict[str, Any]:
+        """Take one job, retrying on capacity errors with backoff."""
+        index, label, url, options = job
+        started = time.monotonic()
+        attempts = 0
+        while True:
+            try:
+                image = self._take_one(index, label, url, options)
+                error = None
+                break
+            except Exception as e:
+                if is_capacity_error(e) and attempts < self.retries:
+                    attempts += 1
+                    with self._lock:
+                        self._retried += 1
+                    # The controller already lowered the limit; the wait is shared, not per worker
+                    time.sleep(self.controller.backoff_s())
+                    continue
+                image, error = "", str(e)
+                break
+        with self._lock:
+            self._done += 1
+            self._failed += 1 if error else 0
+        return {
+            "index": index,
+            "label": label,
+            "url": url,
+            "image": image,
+            "error": error,
+            "attempts": attempts + 1,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+        }
+
+    def _take_one(self, i: int, label: str, url: str, options: Dict[str, Any]) -> str:
+        base = os.path.join(os.path.dirname(__file__), "results", f"{self.name}_{label}")
+        ensure_dir(base)
+        if self.reuse > 1:
+            shot_url = self._take_reused(url, options)
+        else:
+            c = self._open()
+            try:
+                shot_url = self._shoot(c, url, options)
+            finally:
+                self._close(c)
+        # Downloaded after the computer and its concurrency slot are given back
+        return self._save(shot_url, base, i, label, url)
+
+    def _take_reused(self, url: str, options: Dict[str, Any]) -> Optional[str]:
+        session = getattr(self._local, "session", None)
+        if session is None or session.computer is None:
+            session = _Session(self._open())
+            self._local.session = session
+            with self._lock:
+                self._sessions.add(session)
+        ok = False
+        try:
+            if session.jobs:
+                # Drop the previous page (and its timers, media, scroll) before the next one
+                session.computer.navigate("about:blank")
+            shot_url = self._shoot(session.computer, url, options)
+            ok = True
+            return shot_url
+        finally:
+            session.jobs += 1
+            if not ok or session.jobs >= self.reuse or self.controller.over_limit():
+                self._end(session)
+
+    def _open(self) -> Any:
+        """Create a computer, holding a controller slot until ``_close``."""
+        self.controller.acquire()
+        try:
+            throttle_create()
+            c = self._client.create(kind="browser")
+        except Exception as e:
+            if is_capacity_error(e):
+                self.controller.on_capacity()
+            self.controller.release()
+            raise
+        self.controller.on_success()
+        with self._lock:
+            self._created += 1
+        return c
+
+    def _close(self, c: Any) -> None:
+        try:
+            _cleanup(self._client, c)
+        finally:
+            self.controller.release()
+
+    def _end(self, session: "_Session") -> None:
+        with self._lock:
+            c, session.computer = session.computer, None
+            self._sessions.discard(session)
+        if c is not None:
+            self._close(c)
+
+    def _close_sessions(self) -> None:
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            self._end(session)
+
+    def _shoot(self, c: Any, url: str, options: Dict[str, Any]) -> Optional[str]:
+        """Capture ``url`` on ``c``; returns the screenshot URL (None if there is none)."""
+        c.navigate(url)
+        if options.get("wait_ms") not in (None, ""):
+            # Manifest override: fixed wait for this page instead of the learned one
+            c.wait(float(options["wait_ms"]) / 1000.0)
+        else:
+            READINESS.settle(c, url)
+        result = c.screenshot()
+        try:
+            return result.result["screenshot_url"]
+        except Exception:
+            return None
+
+    def _save(self, shot_url: Optional[str], base: str, i: int, label: str, url: str) -> str:
+        if shot_url:
+            img = new_result_path(base, f'{label}_{i}_')
+            download_to_file(shot_url, img)
+            return dedupe(img, url=url, label=label)
+        return ""
+
+
+class _Session:
+    """A computer kept by one worker across jobs."""
+
+    __slots__ = ("computer", "jobs")
+
+    def __init__(self, computer: Any) -> None:
+        self.computer = computer
+        self.jobs = 0
+
+
+class LiveStatus:
+    """One status line (concurrency limit, in flight, progress), redrawn in place every ``interval_s``."""
+
+    def __init__(self, runner: Runner, total: int | None = None, interval_s: float = 1.0, enabled: bool | None = None) -> None:
+        self.runner = runner
+        self.total = total
+        self.interval_s = interval_s
+        self.enabled = sys.stdout.isatty() if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "LiveStatus":
+        if self.enabled:
+            self._thread = threading.Thread(target=self._loop, name="live-status", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            with self._lock:
+                sys.stdout.write("\r\033[K")
+                sys.stdout.flush()
+
+    def print(self, message: str) -> None:
+        """Print a line above the status line."""
+        with self._lock:
+            if self.enabled:
+                sys.stdout.write("\r\033[K")
+            print(message)
+            if self.enabled:
+                self._draw()
+
+    def _line(self) -> str:
+        stats = self.runner.stats()
+        c = stats["concurrency"]
+        done = f"{stats['done']}/{self.total}" if self.total else str(stats["done"])
+        return (
+            f"concurrency {c['in_flight']}/{c['limit']} (max {c['max_limit']}, 429s {c['capacity_errors']}) | "
+            f"done {done} | failed {stats['failed']} | {stats['shots_per_s']}/s"
+        )
+
+    def _draw(self) -> None:  # lock held
+        sys.stdout.write("\r\033[K" + self._line())
+        sys.stdout.flush()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            with self._lock:
+                self._draw()
+
+
+def run_shots(
+    name: str, jobs: Iterable[Job], workers: int, mode: str = "thread", total: int | None = None,
+    adaptive: bool = True, live: bool | None = None, reuse: int = 1,
+) -> List[str]:
+    """Run ``jobs`` and return the saved paths, printing progress as shots finish."""
+    runner = Runner(name, workers=workers, mode=mode, adaptive=adaptive, reuse=reuse)
+    imgs: List[str] = []
+    with LiveStatus(runner, total, enabled=live) as status:
+        for count, result in enumerate(runner.run(jobs), start=1):
+            prefix = f"[{count}/{total}]" if total else f"[{count}]"
+            if result["image"]:
+                imgs.append(result["image"])
+                status.print(f"{prefix} Saved: {result['image']}")
+            elif result["error"]:
+                status.print(f"{prefix} Job {result['index']} failed: {result['error']}")
+    print(f"Summary: {runner.stats()}")
+    return imgs
+
+
+def main(argv: List[str] | None = None, name: str = "runner", n: int = 10, workers: int = 5, mode: str = "thread") -> None:
+    parser = argparse.ArgumentParser(description="Take screenshots of a site, or of every URL in a manifest, on a fixed number of workers.")
+    parser.add_argument("--site", help="Site label (wikipedia, nytimes, airbnb, github, reddit) or full URL", default=None)
+    parser.add_argument("--n", type=int, help=f"Number of screenshots (default {n}; with --manifest, all records)", default=None)
+    parser.add_argument("--manifest", help="CSV/JSONL file of url[,label,options] records, or - for stdin", default=None)
+    parser.add_argument("--format", choices=FORMATS, default=None, help="Manifest format (default: from the extension or first line)")
+    parser.add_argument("--prefetch", type=int, help="Manifest records to read ahead", default=1000)
+    parser.add_argument("--workers", type=int, help="Most computers in flight at once", default=workers)
+    parser.add_argument("--fixed", action="store_true", help="Always use all workers instead of adapting to 429s")
+    parser.add_argument("--reuse", type=int, default=1, help="Jobs per computer before it is replaced (1 = a fresh computer per shot)")
+    parser.add_argument("--live", action=argparse.BooleanOptionalAction, default=None, help="Show a live status line (default: when on a terminal)")
+    parser.add_argument("--mode", choices=MODES, default=mode, help="Worker threads or asyncio tasks")
+    parser.add_argument("--name", help="Results directory prefix", default=name)
+    args = parser.parse_args(argv)
+
+    if args.manifest:
+        jobs, total = manifest_jobs(args.manifest, args.format, args.n, args.prefetch), args.n
+    else:
+        count = args.n if args.n is not None else n
+        label, url = select_site(args.site, count)
+        jobs, total = repeat_jobs(label, url, count), count
+    run_shots(args.name, jobs, args.workers, args.mode, total=total, adaptive=not args.fixed, live=args.live, reuse=args.reuse)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,43 @@
 import json
 import os
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from typing import Any, Dict
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler
+from typing import Any, Dict, Optional, Tuple
 
-from utils import ensure_dir, timestamp, download_to_file
+from cas import dedupe
+from computer_pool import ComputerPool
+import http_client
+from pooled_server import ChunkedResponseMixin, PooledHTTPServer
+from rate_limit import create_limiter, throttle_create
+from readiness import Readiness
+from result_cache import ResultCache
+from singleflight import SingleFlight
+from storage import new_result_path, result_exists
+from utils import ensure_dir, download_to_file, fetch_bytes
 
 try:
     from tzafon import Computer
 except Exception as e:  # pragma: no cover - runtime import
     Computer = None  # type: ignore
 
+# Optional TTL cache of /screenshot results (SCREENSHOT_CACHE_TTL_S > 0 enables it)
+RESULT_CACHE: Optional[ResultCache] = ResultCache.from_env()
+
+# /screenshot/batch limits: max URLs per request and default computers in flight
+BATCH_MAX_URLS = int(os.environ.get('SCREENSHOT_BATCH_MAX_URLS', '1000'))
+BATCH_CONCURRENCY = int(os.environ.get('SCREENSHOT_BATCH_CONCURRENCY', '8'))
+
+# Learned per-host wait between navigate and screenshot (see readiness.py)
+READINESS = Readiness.from_env()
+
+# Pre-created computers (COMPUTER_POOL_SIZE > 0 enables it); started by main()
+COMPUTER_POOL: Optional[ComputerPool] = None
+
+# Concurrent identical /screenshot requests share one computer and capture
+IN_FLIGHT = SingleFlight()
+
 
 def read_json(body: bytes) -> Dict[str, Any]:
     if not body:
@@ -20,8 +48,100 @@ def read_json(body: bytes) -> Dict[str, Any]:
         return {}
 
 
-class Handler(BaseHTTPRequestHandler):
+def _close_computer(computer: Any) -> None:
+    try:
+        computer.close()
+    except Exception:
+        pass
+
+
+def _computer_alive(computer: Any) -> bool:
+    """Health probe for pooled computers: only a definite "gone" (404/410) counts as unhealthy."""
+    computer_id = getattr(computer, 'id', None) or getattr(computer, 'computer_id', None)
+    token = os.environ.get('TZAFON_API_KEY') or os.environ.get('TOKEN')
+    if not computer_id or not token:
+        return True
+    base_url = (os.environ.get('TZAFON_BASE_URL') or 'https://v2.tzafon.ai').rstrip('/')
+    headers = {'Authorization': f'Bearer {token}', 'Accept': 'application/json'}
+    try:
+        resp = http_client.client().request('GET', f'{base_url}/v1/computers/{computer_id}', headers=headers, timeout=10)
+    except http_client.TRANSPORT_ERRORS:
+        return True
+    return resp.status_code not in (404, 410)
+
+
+def _new_computer() -> Any:
+    throttle_create()
+    return Computer().create(kind='browser')
+
+
+def _capture(url: str, binary: bool = False) -> Tuple[Dict[str, Any], bytes]:
+    """Capture ``url`` on a fresh computer (leased from the warm pool when enabled).
+
+    The computer is given back as soon as the screenshot URL is known; the
+    PNG is downloaded afterwards. In binary mode it is fetched into memory
+    and never written to disk.
+    """
+    computer = COMPUTER_POOL.acquire() if COMPUTER_POOL is not None else _new_computer()
+    try:
+        computer.navigate(url)
+        READINESS.settle(computer, url)
+        result = computer.screenshot()
+        shot_url = None
+        try:
+            shot_url = result.result.get('screenshot_url')
+        except Exception:
+            shot_url = None
+    finally:
+        # Computers are single-use: the pool closes this one and creates a replacement
+        if COMPUTER_POOL is not None:
+            COMPUTER_POOL.release(computer)
+        else:
+            _close_computer(computer)
+
+    file = ''
+    data = b''
+    if shot_url and binary:
+        data = fetch_bytes(shot_url)
+    elif shot_url:
+        out_dir = os.path.join(os.path.dirname(__file__), 'results', 'service_python')
+        ensure_dir(out_dir)
+        file = new_result_path(out_dir, 'py_')
+        download_to_file(shot_url, file)
+        file = dedupe(file, url=url)
+    return {'engine': 'tzafon', 'image': file}, data
+
+
+def _screenshot(url: str, full_page: bool = False, use_cache: bool = True, binary: bool = False) -> Tuple[Dict[str, Any], bytes]:
+    key = ResultCache.key(url, full_page, None, 'tzafon')
+    if RESULT_CACHE is not None and use_cache:
+        hit = RESULT_CACHE.get(key)
+        if hit is not None and binary and hit[1]:
+            return dict(hit[0], cached=True), hit[1]
+        if hit is not None and not binary and result_exists(hit[0]['image']):
+            return dict(hit[0], cached=True), hit[1]
+
+    def capture() -> Tuple[Dict[str, Any], bytes]:
+        payload, data = _capture(url, binary)
+        if RESULT_CACHE is not None and (payload['image'] or data):
+            RESULT_CACHE.put(key, payload, data)
+        return payload, data
+
+    # Identical requests arriving while this capture runs share its result
+    (payload, data), shared = IN_FLIGHT.do(f"{key}:{'binary' if binary else 'file'}", capture)
+    return (dict(payload, coalesced=True) if shared else payload), data
+
+
+class Handler(ChunkedResponseMixin, BaseHTTPRequestHandler):
+    # Keep-alive; between requests the server parks the connection off the workers.
+    # The socket timeout only bounds reading a request.
+    protocol_version = 'HTTP/1.1'
+    timeout = float(os.environ.get('PY_SERVICE_READ_TIMEOUT_S', '15'))
+
     def _send(self, status: int, payload: Dict[str, Any]):
+        if self._abort_stream():
+            # An error after a streamed response started: the status was already sent
+            return
         data = json.dumps(payload).encode('utf-8')
         self.send_response(status)
         self.send_header('Content-Type', 'application/json; charset=utf-8')
@@ -29,9 +149,26 @@ class Handler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(data)
 
+    def _send_bytes(self, status: int, data: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
     def do_GET(self):  # noqa: N802
         if self.path == '/health':
             return self._send(200, {'ok': True})
+        if self.path == '/stats':
+            return self._send(200, {
+                'result_cache': RESULT_CACHE.stats() if RESULT_CACHE is not None else None,
+                'in_flight': IN_FLIGHT.stats(),
+                'computer_pool': COMPUTER_POOL.stats() if COMPUTER_POOL is not None else None,
+                'http_client': http_client.client().stats(),
+                'create_rate': create_limiter().stats() if create_limiter() is not None else None,
+            })
         return self._send(404, {'error': 'not found'})
 
     def do_POST(self):  # noqa: N802
@@ -45,6 +182,12 @@ class Handler(BaseHTTPRequestHandler):
             except Exception as e:
                 return self._send(500, {'error': str(e)})
 
+        if self.path == '/screenshot/batch':
+            try:
+                return self._handle_screenshot_batch(body)
+            except Exception as e:
+                return self._send(500, {'error': str(e)})
+
         return self._send(404, {'error': 'not found'})
 
     def _handle_screenshot(self, body: Dict[str, Any]):
@@ -54,46 +197,123 @@ class Handler(BaseHTTPRequestHandler):
         if not url:
             raise ValueError('Missing url')
 
-        out_dir = os.path.join(os.path.dirname(__file__), 'results', 'service_python')
-        ensure_dir(out_dir)
+        binary = body.get('response') == 'binary'
+        payload, data = _screenshot(url, bool(body.get('fullPage')), bool(body.get('cache', True)), binary)
+        if not binary:
+            return self._send(200, payload)
+        if not data:
+            return self._send(502, {'error': 'screenshot not available'})
+        headers = {'X-Cached': '1'} if payload.get('cached') else {}
+        return self._send_bytes(200, data, 'image/png', headers)
 
-        client = Computer()
-        computer = client.create(kind='browser')
-        computer.navigate(url)
-        try:
-            computer.wait(2)
-        except Exception:
-            pass
-        result = computer.screenshot()
-        shot_url = None
+    def _handle_screenshot_batch(self, body: Dict[str, Any]):
+        if Computer is None:
+            raise RuntimeError('tzafon package not available')
+        urls = [u for u in (body.get('urls') or []) if isinstance(u, str) and u]
+        if not urls:
+            raise ValueError('Missing urls')
+        if len(urls) > BATCH_MAX_URLS:
+            raise ValueError(f'Too many urls (max {BATCH_MAX_URLS})')
+        full_page = bool(body.get('fullPage'))
+        use_cache = bool(body.get('cache', True))
         try:
-            shot_url = result.result.get('screenshot_url')
+            concurrency = int(body.get('concurrency') or BATCH_CONCURRENCY)
         except Exception:
-            shot_url = None
+            concurrency = BATCH_CONCURRENCY
+        concurrency = max(1, min(len(urls), concurrency))
+        binary = body.get('response') == 'binary'
+        boundary = uuid.uuid4().hex
 
-        file = ''
-        if shot_url:
-            file = os.path.join(out_dir, f"{timestamp('py_')}.png")
-            download_to_file(shot_url, file)
+        def write(record: Dict[str, Any], data: bytes = b'') -> None:
+            if not binary:
+                self._write_ndjson(record)
+            elif data:
+                self._write_part(boundary, 'image/png', data, {'X-Index': str(record['index']), 'Content-Location': record['url']})
+            else:
+                self._write_part(boundary, 'application/json', json.dumps(record).encode('utf-8'))
 
-        try:
-            computer.close()
-        except Exception:
-            pass
+        # One computer per URL, at most `concurrency` at a time; stream as each completes.
+        # URLs are submitted as results drain, so only `concurrency` results (and PNGs) exist at once.
+        started = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch')
+        queued = iter(enumerate(urls))
+        futures: Dict[Future, Tuple[int, str]] = {}
+
+        def submit_next() -> None:
+            for i, u in queued:
+                futures[executor.submit(_screenshot, u, full_page, use_cache, binary)] = (i, u)
+                return
 
-        return self._send(200, {'engine': 'tzafon', 'image': file})
+        for _ in range(concurrency):
+            submit_next()
+        failed = 0
+        try:
+            if binary:
+                self._start_multipart(200, boundary)
+            else:
+                self._start_chunked(200, 'application/x-ndjson')
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    i, u = futures.pop(fut)
+                    data = b''
+                    try:
+                        payload, data = fut.result()
+                        record = dict(payload, index=i, url=u)
+                    except Exception as e:
+                        failed += 1
+                        record = {'index': i, 'url': u, 'error': str(e)}
+                    write(record, data)
+                    data = b''  # the PNG is on the wire; don't keep it until the next result
+                    submit_next()
+            write({
+                'done': True,
+                'count': len(urls),
+                'ok': len(urls) - failed,
+                'failed': failed,
+                'concurrency': concurrency,
+                'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+            })
+            if binary:
+                self._end_multipart(boundary)
+            else:
+                self._end_chunked()
+        except Exception as e:  # noqa: BLE001
+            # Headers are sent: no 500 now. Client went away, timed out reading, or a write failed;
+            # don't start computers nobody will read
+            if not isinstance(e, (BrokenPipeError, ConnectionResetError)):
+                print(f"[python-service] batch aborted: {e}")
+            for fut in futures:
+                fut.cancel()
+            self._abort_stream()
+            self.close_connection = True
+        finally:
+            executor.shutdown(wait=False)
 
 
 def main() -> None:
     port = int(os.environ.get('PY_SERVICE_PORT', '8001'))
-    server = HTTPServer(('0.0.0.0', port), Handler)
-    print(f"[python-service] listening on :{port}")
+    workers = int(os.environ.get('PY_SERVICE_WORKERS', '8'))
+    backlog = int(os.environ.get('PY_SERVICE_BACKLOG', '128'))
+    keepalive_s = float(os.environ.get('PY_SERVICE_KEEPALIVE_S', '15'))
+    server = PooledHTTPServer(('0.0.0.0', port), Handler, workers=workers, backlog=backlog, keepalive_s=keepalive_s)
+    global COMPUTER_POOL
+    # Screenshot downloads share keep-alive connections, one per worker
+    http_client.configure(workers + int(os.environ.get('COMPUTER_POOL_SIZE', '0')))
+    if Computer is not None:
+        COMPUTER_POOL = ComputerPool.from_env(create=_new_computer, destroy=_close_computer, healthy=_computer_alive)
+    if COMPUTER_POOL is not None:
+        COMPUTER_POOL.start()
+        print(f"[python-service] computer pool filling ({COMPUTER_POOL.size} ready, max {COMPUTER_POOL.max_total})")
+    print(f"[python-service] listening on :{port} ({workers} workers)")
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         pass
     finally:
         server.server_close()
+        if COMPUTER_POOL is not None:
+            COMPUTER_POOL.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,340 @@
+import os
+import argparse
+import glob
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from manifest import FORMATS, read_manifest
+from runner import MODES, Job, Runner
+from storage import new_id
+from utils import ensure_dir
+
+# A file-based work queue shared by worker processes on one host, or by
+# several hosts through a shared directory (NFS, a mounted bucket, ...):
+#
+#   <queue>/pending/chunk-<split>-00000001.jsonl      split from the manifest, waiting
+#   <queue>/claimed/chunk-<split>-00000001.jsonl@<w>  taken by worker <w> (an atomic rename)
+#   <queue>/done/chunk-<split>-00000001.jsonl         every record in it has a result
+#   <queue>/results/<w>.jsonl                         one result line per job, per worker
+#   <queue>/stats/<w>.json                            each worker's runner stats
+#   <queue>/SPLIT_DONE                                the manifest has been split completely
+#
+# <split> is a ULID taken once per ``split`` call, so two splits into the
+# same queue never reuse a chunk name; one split's chunks are claimed in order.
+# Chunks whose claim has not been refreshed for ``stale_s`` (a worker died)
+# are taken over by idle workers, so every record runs at least once.
+
+_SPLIT_DONE = "SPLIT_DONE"
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _dirs(queue_dir: str) -> Dict[str, str]:
+    dirs = {name: os.path.join(queue_dir, name) for name in ("pending", "claimed", "done", "results", "stats", "tmp")}
+    for d in dirs.values():
+        ensure_dir(d)
+    return dirs
+
+
+def _reopen(queue_dir: str) -> None:
+    # Adding records to a queue: idle workers must wait for the new split to finish
+    try:
+        os.remove(os.path.join(queue_dir, _SPLIT_DONE))
+    except FileNotFoundError:
+        pass
+
+
+def split(source: str, queue_dir: str, chunk_size: int = 500, fmt: Optional[str] = None) -> int:
+    """Stream a manifest into ``pending`` chunks; workers may start on the first chunk right away."""
+    dirs = _dirs(queue_dir)
+    _reopen(queue_dir)
+    chunk_size = max(1, int(chunk_size))
+    split_id = new_id()
+    seq = 0
+    buf: List[str] = []
+    total = 0
+
+    def flush() -> None:
+        nonlocal seq
+        if not buf:
+            return
+        seq += 1
+        name = f"chunk-{split_id}-{seq:08d}.jsonl"
+        tmp = os.path.join(dirs["tmp"], name)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(buf)
+        os.replace(tmp, os.path.join(dirs["pending"], name))
+        buf.clear()
+
+    for url, label, options in read_manifest(source, fmt):
+        buf.append(json.dumps({"url": url, "label": label, "options": options}) + "\n")
+        total += 1
+        if len(buf) >= chunk_size:
+            flush()
+    flush()
+    with open(os.path.join(queue_dir, _SPLIT_DONE), "w", encoding="utf-8") as f:
+        f.write(f"{total}\n")
+    return total
+
+
+class ShardWorker:
+    """Claims chunks from a queue directory and captures them with its own ``Runner``."""
+
+    def __init__(self, queue_dir: str, runner: Runner, stale_s: float = 300.0, heartbeat_s: float = 10.0) -> None:
+        self.queue_dir = queue_dir
+        self.runner = runner
+        self.stale_s = float(stale_s)
+        self.heartbeat_s = float(heartbeat_s)
+        self.id = worker_id()
+        self.dirs = _dirs(queue_dir)
+        self._owner: Dict[int, Tuple[str, int]] = {}  # job index -> (claimed chunk path, line in it)
+        self._left: Dict[str, int] = {}  # claimed chunk path -> results still missing
+        self._read_all: Dict[str, bool] = {}  # claimed chunk path -> every record handed out
+        self._chunks = 0
+        self._lock = threading.Lock()  # _jobs runs on the runner's threads, results arrive on ours
+
+    def run(self) -> Dict[str, Any]:
+        started = time.time()
+        # Claims are refreshed on a timer, so a long capture cannot make them look stale
+        stop = threading.Event()
+        beat = threading.Thread(target=self._beat, args=(stop, started), name="shard-heartbeat", daemon=True)
+        beat.start()
+        results_path = os.path.join(self.dirs["results"], f"{self.id}.jsonl")
+        try:
+            with open(results_path, "a", encoding="utf-8") as out:
+                for result in self.runner.run(self._jobs()):
+                    with self._lock:
+                        chunk, line = self._owner.pop(result["index"])
+                        self._left[chunk] -= 1
+                    # Write before the chunk moves to done, so a finished chunk always has its results
+                    out.write(json.dumps(dict(result, chunk=_chunk_name(chunk), chunk_index=line, worker=self.id)) + "\n")
+                    out.flush()
+                    with self._lock:
+                        self._finish_if_done(chunk)
+        finally:
+            stop.set()
+            beat.join()
+        return self._write_stats(started, time.time())
+
+    # --- internals ---
+    def _beat(self, stop: threading.Event, started: float) -> None:
+        while not stop.wait(self.heartbeat_s):
+            try:
+                self._heartbeat()
+                self._write_stats(started)
+            except Exception as e:  # noqa: BLE001 - e.g. a transient OSError on a shared filesystem
+                # Keep beating: a dead heartbeat lets other workers take over our claims
+                print(f"[shard] {self.id} heartbeat failed: {e}")
+
+    def _jobs(self) -> Iterator[Optional[Job]]:
+        index = 0
+        while True:
+            # Read the marker first: a chunk split before it is then visible to _claim
+            split_done = os.path.exists(os.path.join(self.queue_dir, _SPLIT_DONE))
+            claimed = self._claim()
+            if claimed is None:
+                if split_done:
+                    return
+                yield None  # the coordinator is still splitting; the runner waits outside its intake lock
+                continue
+            with self._lock:
+                self._chunks += 1
+                self._left[claimed] = 0
+                self._read_all[claimed] = False
+            with open(claimed, "r", encoding="utf-8") as f:
+                for line, text in enumerate(f):
+                    try:
+                        row = json.loads(text)
+                    except ValueError:
+                        continue
+                    with self._lock:
+                        self._owner[index] = (claimed, line)
+                        self._left[claimed] += 1
+                    yield index, row["label"], row["url"], row.get("options") or {}
+                    index += 1
+            with self._lock:
+                self._read_all[claimed] = True
+                self._finish_if_done(claimed)
+
+    def _finish_if_done(self, chunk: str) -> None:  # lock held
+        if self._read_all.get(chunk) and self._left.get(chunk) == 0:
+            del self._left[chunk], self._read_all[chunk]
+            try:
+                os.replace(chunk, os.path.join(self.dirs["done"], _chunk_name(chunk)))
+            except FileNotFoundError:
+                pass  # taken over as stale by another worker; it will finish it too
+
+    def _claim(self) -> Optional[str]:
+        for name in sorted(os.listdir(self.dirs["pending"])):
+            target = os.path.join(self.dirs["claimed"], f"{name}@{self.id}")
+            try:
+                os.rename(os.path.join(self.dirs["pending"], name), target)
+            except FileNotFoundError:
+                continue  # another worker got it first
+            os.utime(target)  # the claim's age counts from now, not from the split
+            return target
+        return self._steal()
+
+    def _steal(self) -> Optional[str]:
+        cutoff = time.time() - self.stale_s
+        for path in sorted(glob.glob(os.path.join(self.dirs["claimed"], "chunk-*@*"))):
+            with self._lock:
+                if path in self._left:
+                    continue
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                target = os.path.join(self.dirs["claimed"], f"{_chunk_name(path)}@{self.id}")
+                os.rename(path, target)
+                os.utime(target)
+            except FileNotFoundError:
+                continue
+            print(f"[shard] {self.id} took over stale {os.path.basename(path)}")
+            return target
+        return None
+
+    def _heartbeat(self) -> None:
+        with self._lock:
+            chunks = list(self._left)
+        for chunk in chunks:
+            try:
+                os.utime(chunk)
+            except FileNotFoundError:
+                pass
+
+    def _write_stats(self, started: float, ended: Optional[float] = None) -> Dict[str, Any]:
+        stats = dict(self.runner.stats(), worker=self.id, chunks=self._chunks, started=started, ended=ended)
+        path = os.path.join(self.dirs["stats"], f"{self.id}.json")
+        with open(f"{path}.part", "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(f"{path}.part", path)
+        return stats
+
+
+def _chunk_name(path: str) -> str:
+    return os.path.basename(path).split("@", 1)[0]
+
+
+def merge(queue_dir: str) -> Dict[str, Any]:
+    """Combine every worker's stats and results into ``stats.json`` and ``results.jsonl``.
+
+    A chunk taken over as stale may have results from two workers; only one
+    record per ``(chunk, chunk_index)`` is kept, a successful one if any.
+    """
+    dirs = _dirs(queue_dir)
+    workers: List[Dict[str, Any]] = []
+    for path in sorted(glob.glob(os.path.join(dirs["stats"], "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            workers.append(json.load(f))
+    totals = {key: sum(int(w.get(key) or 0) for w in workers) for key in ("done", "failed", "retried", "chunks")}
+    totals["capacity_errors"] = sum(int((w.get("concurrency") or {}).get("capacity_errors") or 0) for w in workers)
+    starts = [w["started"] for w in workers if w.get("started")]
+    ends = [w["ended"] for w in workers if w.get("ended")]
+    wall = (max(ends) - min(starts)) if starts and ends else 0.0
+    merged: Dict[str, Any] = dict(
+        totals,
+        workers=len(workers),
+        unfinished=[w["worker"] for w in workers if not w.get("ended")],
+        pending_chunks=len(os.listdir(dirs["pending"])),
+        claimed_chunks=len(os.listdir(dirs["claimed"])),
+        elapsed_s=round(wall, 1),
+        shots_per_s=round(totals["done"] / wall, 2) if wall > 0 else 0.0,
+    )
+    best: Dict[Tuple[str, int], Tuple[bool, str]] = {}  # (chunk, line in it) -> (succeeded, result line)
+    for path in sorted(glob.glob(os.path.join(dirs["results"], "*.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    key = (record["chunk"], int(record["chunk_index"]))
+                except (ValueError, KeyError, TypeError):
+                    continue  # a line cut short by a crashed worker
+                ok = not record.get("error")
+                if key not in best or (ok and not best[key][0]):
+                    best[key] = (ok, line if line.endswith("\n") else line + "\n")
+    with open(os.path.join(queue_dir, "results.jsonl"), "w", encoding="utf-8") as out:
+        out.writelines(line for _, line in best.values())
+    with open(os.path.join(queue_dir, "stats.json"), "w", encoding="utf-8") as f:
+        json.dump(merged, f, indent=2)
+    return merged
+
+
+def _worker_args(args: argparse.Namespace) -> List[str]:
+    argv = ["--queue", args.queue, "--workers", str(args.workers), "--mode", args.mode, "--name", args.name, "--stale-s", str(args.stale_s), "--reuse", str(args.reuse)]
+    return argv + (["--fixed"] if args.fixed else [])
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Capture a URL manifest across processes or hosts through a shared queue directory.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--queue", required=True, help="Queue directory (shared between hosts for multi-host runs)")
+
+    def worker_opts(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--workers", type=int, default=10, help="Most computers in flight per process")
+        p.add_argument("--mode", choices=MODES, default="thread", help="Worker threads or asyncio tasks")
+        p.add_argument("--fixed", action="store_true", help="Always use all workers instead of adapting to 429s")
+        p.add_argument("--reuse", type=int, default=1, help="Jobs per computer before it is replaced")
+        p.add_argument("--name", default="sharded", help="Results directory prefix")
+        p.add_argument("--stale-s", type=float, default=300.0, help="Take over claims not refreshed for this long")
+
+    def split_opts(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--manifest", required=True, help="CSV/JSONL manifest, or - for stdin")
+        p.add_argument("--format", choices=FORMATS, default=None, help="Manifest format")
+        p.add_argument("--chunk", type=int, default=500, help="Records per chunk")
+
+    p_split = sub.add_parser("split", help="Split a manifest into queue chunks")
+    common(p_split)
+    split_opts(p_split)
+    p_work = sub.add_parser("work", help="Run one worker process (on any host that sees the queue)")
+    common(p_work)
+    worker_opts(p_work)
+    p_run = sub.add_parser("run", help="Split and run --processes local workers, then merge")
+    common(p_run)
+    split_opts(p_run)
+    worker_opts(p_run)
+    p_run.add_argument("--processes", type=int, default=os.cpu_count() or 2, help="Local worker processes")
+    p_merge = sub.add_parser("merge", help="Merge worker results and stats")
+    common(p_merge)
+    args = parser.parse_args(argv)
+
+    if args.command == "split":
+        print(f"Split {split(args.manifest, args.queue, args.chunk, args.format)} records into {args.queue}")
+    elif args.command == "work":
+        runner = Runner(args.name, workers=args.workers, mode=args.mode, adaptive=not args.fixed, reuse=args.reuse)
+        stats = ShardWorker(args.queue, runner, stale_s=args.stale_s).run()
+        print(f"Worker summary: {stats}")
+    elif args.command == "run":
+        _dirs(args.queue)
+        _reopen(args.queue)
+        # Workers start on the first chunks while the rest of the manifest is still being split
+        procs = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), "work"] + _worker_args(args))
+            for _ in range(max(1, args.processes))
+        ]
+        try:
+            total = split(args.manifest, args.queue, args.chunk, args.format)
+            print(f"Split {total} records; waiting for {len(procs)} workers")
+            codes = [p.wait() for p in procs]
+        except KeyboardInterrupt:
+            for p in procs:
+                p.terminate()
+            raise
+        merged = merge(args.queue)
+        print(f"Summary: {merged}")
+        if any(codes):
+            sys.exit(1)
+    else:
+        print(json.dumps(merge(args.queue), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+import glob
+import hashlib
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils import ensure_dir
+
+_CROCKFORD = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_ID_LEN = 26
+LAYOUTS = ('flat', 'hash', 'date', 'segment')
+# Subdirectory holding a results directory's segment files (RESULTS_LAYOUT=segment)
+SEGMENT_DIR = 'segments'
+
+
+def new_id() -> str:
+    """Unique, time-sortable id (ULID: 48-bit ms timestamp + 80 random bits).
+
+    Needs no coordination between threads, processes or hosts; two ids
+    from the same millisecond differ in their random part.
+    """
+    value = (int(time.time() * 1000) << 80) | int.from_bytes(os.urandom(10), 'big')
+    out = []
+    for _ in range(_ID_LEN):
+        out.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return ''.join(reversed(out))
+
+
+def id_time(file_id: str) -> float:
+    """Creation time (epoch seconds) encoded in an id from ``new_id``."""
+    ms = 0
+    for ch in file_id[:10]:
+        ms = (ms << 5) | _CROCKFORD.index(ch)
+    return ms / 1000.0
+
+
+def _id_from_name(name: str) -> Optional[str]:
+    stem = os.path.splitext(name)[0]
+    if len(stem) < _ID_LEN:
+        return None
+    candidate = stem[-_ID_LEN:]
+    return candidate if all(ch in _CROCKFORD for ch in candidate) else None
+
+
+class Layout:
+    """Where result files go inside a results directory.
+
+    Files are named ``<prefix><id><ext>`` and placed by id alone, so a file
+    can be found without listing the whole tree:
+
+    - ``flat``: directly in the directory (the old layout)
+    - ``hash``: ``ab/cd/`` from the id's SHA-1, ``depth`` levels of 256 dirs
+    - ``date``: ``YYYY-MM-DD/HH/`` (UTC) from the id's timestamp; old days
+      are removed as whole directories
+    - ``segment``: files are staged flat and then packed by ``pack`` into
+      the directory's ``SegmentStore`` (under ``segments/``); the returned
+      path names the image but only ``read_result`` can open it
+    """
+
+    def __init__(self, kind: str = 'date', depth: int = 2) -> None:
+        if kind not in LAYOUTS:
+            raise ValueError(f"Unknown layout '{kind}' (choose from {', '.join(LAYOUTS)})")
+        self.kind = kind
+        self.depth = max(1, min(4, int(depth)))
+
+    @classmethod
+    def from_env(cls) -> 'Layout':
+        return cls(os.environ.get('RESULTS_LAYOUT', 'date'), int(os.environ.get('RESULTS_HASH_DEPTH', '2')))
+
+    def shard(self, file_id: str) -> str:
+        if self.kind == 'hash':
+            digest = hashlib.sha1(file_id.encode('ascii')).hexdigest()
+            return os.path.join(*(digest[2 * i:2 * i + 2] for i in range(self.depth)))
+        if self.kind == 'date':
+            t = datetime.fromtimestamp(id_time(file_id), tz=timezone.utc)
+            return os.path.join(t.strftime('%Y-%m-%d'), t.strftime('%H'))
+        return ''
+
+    def path_for(self, directory: str, file_id: str, prefix: str = '', ext: str = '.png') -> str:
+        return os.path.join(directory, self.shard(file_id), f'{prefix}{file_id}{ext}')
+
+    def new_path(self, directory: str, prefix: str = '', ext: str = '.png') -> str:
+        """A fresh, collision-free path for a new file; its shard directory is created."""
+        path = self.path_for(directory, new_id(), prefix, ext)
+        ensure_dir(os.path.dirname(path))
+        return path
+
+    def find(self, directory: str, file_id: str) -> Optional[str]:
+        """Locate a file by id; only its shard directory (or the segment index) is looked at."""
+        if self.kind == 'segment':
+            name = segment_store(directory).name(file_id)
+            if name is not None:
+                return os.path.join(directory, SEGMENT_DIR, name)
+        matches = glob.glob(os.path.join(directory, glob.escape(self.shard(file_id)), f'*{file_id}.*'))
+        return matches[0] if matches else None
+
+    def iter_files(self, directory: str) -> Iterator[str]:
+        """Yield every result under ``directory``, oldest shard first for ``date``.
+
+        Images packed into segments come last, as ``segments/<name>`` paths.
+        """
+        yield from self._iter_disk(directory)
+        if os.path.isdir(os.path.join(directory, SEGMENT_DIR)):
+            store = segment_store(directory)
+            for name in store.names():
+                yield os.path.join(directory, SEGMENT_DIR, name)
+
+    def _iter_disk(self, directory: str) -> Iterator[str]:
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            try:
+                entries = sorted(os.scandir(current), key=lambda e: e.name)
+            except FileNotFoundError:
+                continue
+            dirs = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not (current == directory and entry.name == SEGMENT_DIR):
+                        dirs.append(entry.path)
+                elif _id_from_name(entry.name):
+                    yield entry.path
+            stack.extend(reversed(dirs))
+
+    def cleanup(self, directory: str, older_than_s: float) -> int:
+        """Delete files created more than ``older_than_s`` ago; returns how many were removed."""
+        cutoff = time.time() - older_than_s
+        removed = 0
+        if os.path.isdir(os.path.join(directory, SEGMENT_DIR)):
+            removed += segment_store(directory).cleanup(older_than_s)
+        if self.kind == 'date':
+            # Whole days first (one rmtree each), then hours of the boundary day
+            for day in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+                day_path = os.path.join(directory, day)
+                try:
+                    day_start = datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp()
+                except ValueError:
+                    continue
+                if day_start + 86400 <= cutoff:
+                    removed += sum(1 for _ in self._iter_disk(day_path))
+                    shutil.rmtree(day_path, ignore_errors=True)
+                    continue
+                for hour in sorted(os.listdir(day_path)):
+                    hour_path = os.path.join(day_path, hour)
+                    if not hour.isdigit() or day_start + int(hour) * 3600 >= cutoff:
+                        continue
+                    if day_start + (int(hour) + 1) * 3600 <= cutoff:
+                        removed += sum(1 for _ in self._iter_disk(hour_path))
+                        shutil.rmtree(hour_path, ignore_errors=True)
+                    else:
+                        removed += self._remove_older(hour_path, cutoff)
+            return removed
+        return removed + self._remove_older(directory, cutoff)
+
+    def _remove_older(self, directory: str, cutoff: float) -> int:
+        removed = 0
+        for path in list(self._iter_disk(directory)):
+            file_id = _id_from_name(os.path.basename(path))
+            if file_id and id_time(file_id) < cutoff:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+# Layout used by the services and scripts for their result files (RESULTS_LAYOUT)
+LAYOUT = Layout.from_env()
+
+
+def new_result_path(directory: str, prefix: str = '', ext: str = '.png') -> str:
+    """Path for a new result file under ``directory`` in the configured layout."""
+    return LAYOUT.new_path(directory, prefix, ext)
+
+
+class SegmentStore:
+    """Append-only segment files for many small images.
+
+    Each process appends to its own ``seg-<id>.dat`` with a matching
+    ``seg-<id>.idx`` (one ``<id> <offset> <length> [<name>]`` line per
+    image), so
+    writers never coordinate. A segment is sealed at ``max_segment_bytes``.
+    Readers load every index once and then read blobs with a single
+    ``pread``; cleanup drops whole segments.
+    """
+
+    def __init__(self, directory: str, max_segment_bytes: int = 64 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.max_segment_bytes = max(1, int(max_segment_bytes))
+        ensure_dir(directory)
+        self._lock = threading.Lock()
+        self._index: Dict[str, Tuple[str, int, int, str]] = {}
+        self._loaded: Dict[str, int] = {}  # idx file -> bytes already read
+        self._segment: Optional[str] = None
+        self._data = None
+        self._idx = None
+        self._size = 0
+
+    def put(self, data: Any, file_id: Optional[str] = None, name: str = '') -> str:
+        file_id = file_id or new_id()
+        name = ' '.join(name.split()) if name else f'{file_id}.png'
+        with self._lock:
+            if self._data is None or self._size >= self.max_segment_bytes:
+                self._roll()
+            assert self._data is not None and self._idx is not None and self._segment is not None
+            offset = self._size
+            length = self._data.write(data)
+            self._data.flush()
+            self._size += length
+            # Data first, then its index line: an index entry never points past the data
+            self._idx.write(f'{file_id} {offset} {length} {name}\n'.encode('utf-8'))
+            self._idx.flush()
+            self._index[file_id] = (self._segment, offset, length, name)
+        return file_id
+
+    def get(self, file_id: str) -> Optional[bytes]:
+        with self._lock:
+            loc = self._index.get(file_id)
+            if loc is None:
+                self._refresh()
+                loc = self._index.get(file_id)
+        if loc is None:
+            return None
+        segment, offset, length, _ = loc
+        fd = os.open(os.path.join(self.directory, f'{segment}.dat'), os.O_RDONLY)
+        try:
+            return os.pread(fd, length, offset)
+        finally:
+            os.close(fd)
+
+    def __contains__(self, file_id: str) -> bool:
+        with self._lock:
+            if file_id not in self._index:
+                self._refresh()
+            return file_id in self._index
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return sorted(self._index)
+
+    def name(self, file_id: str) -> Optional[str]:
+        """File name an image was stored under, or None if it is not in the store."""
+        with self._lock:
+            if file_id not in self._index:
+                self._refresh()
+            loc = self._index.get(file_id)
+        return loc[3] if loc is not None else None
+
+    def names(self) -> List[str]:
+        """File names of every stored image, oldest first."""
+        with self._lock:
+            self._refresh()
+            return [self._index[i][3] for i in sorted(self._index)]
+
+    def cleanup(self, older_than_s: float) -> int:
+        """Drop sealed segments last written more than ``older_than_s`` ago; returns images removed."""
+        cutoff = time.time() - older_than_s
+        removed = 0
+        with self._lock:
+            self._refresh()
+            for data_path in glob.glob(os.path.join(self.directory, 'seg-*.dat')):
+                segment = os.path.basename(data_path)[:-4]
+                if segment == self._segment or os.path.getmtime(data_path) >= cutoff:
+                    continue
+                gone = [i for i, loc in self._index.items() if loc[0] == segment]
+                for i in gone:
+                    del self._index[i]
+                removed += len(gone)
+                idx_path = os.path.join(self.directory, f'{segment}.idx')
+                self._loaded.pop(idx_path, None)
+                for path in (idx_path, data_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            self._seal()
+
+    def _seal(self) -> None:  # lock held
+        for f in (self._data, self._idx):
+            if f is not None:
+                f.close()
+        self._data = self._idx = None
+        self._segment = None
+
+    def _roll(self) -> None:  # lock held
+        self._seal()
+        self._segment = f'seg-{new_id()}'
+        base = os.path.join(self.directory, self._segment)
+        self._data = open(f'{base}.dat', 'ab')
+        self._idx = open(f'{base}.idx', 'ab')
+        self._loaded[f'{base}.idx'] = 0  # written by us; _index is kept current directly
+        self._size = 0
+
+    def _refresh(self) -> None:  # lock held
+        """Read index lines added (by other processes) since the last refresh."""
+        for idx_path in glob.glob(os.path.join(self.directory, 'seg-*.idx')):
+            if self._segment and idx_path.endswith(f'{self._segment}.idx'):
+                continue
+            done = self._loaded.get(idx_path, 0)
+            try:
+                with open(idx_path, 'rb') as f:
+                    f.seek(done)
+                    chunk = f.read()
+            except OSError:
+                continue
+            # Only consume complete lines; a writer may be mid-line
+            complete = chunk[:chunk.rfind(b'\n') + 1]
+            segment = os.path.basename(idx_path)[:-4]
+            for line in complete.decode('utf-8', 'replace').splitlines():
+                parts = line.split(' ', 3)
+                if len(parts) >= 3:
+                    name = parts[3] if len(parts) == 4 else f'{parts[0]}.png'
+                    self._index[parts[0]] = (segment, int(parts[1]), int(parts[2]), name)
+            self._loaded[idx_path] = done + len(complete)
+
+
+_STORES: Dict[str, SegmentStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def segment_store(directory: str) -> SegmentStore:
+    """The process's ``SegmentStore`` for a results directory (``<directory>/segments``)."""
+    key = os.path.abspath(directory)
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            max_bytes = int(os.environ.get('RESULTS_SEGMENT_BYTES', str(64 * 1024 * 1024)))
+            store = _STORES[key] = SegmentStore(os.path.join(directory, SEGMENT_DIR), max_bytes)
+        return store
+
+
+def put_result(directory: str, prefix: str, data: Any, ext: str = '.png') -> str:
+    """Append a new result to ``directory``'s segment store; returns its ``segments/<name>`` path."""
+    file_id = new_id()
+    name = f'{prefix}{file_id}{ext}'
+    segment_store(directory).put(data, file_id, name)
+    return os.path.join(directory, SEGMENT_DIR, name)
+
+
+def pack(path: str) -> str:
+    """Move a finished result file into its directory's segment store (RESULTS_LAYOUT=segment).
+
+    Returns the ``segments/<name>`` path to report, or ``path`` unchanged
+    for the other layouts.
+    """
+    if LAYOUT.kind != 'segment' or not path or not os.path.isfile(path):
+        return path
+    directory, name = os.path.split(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    segment_store(directory).put(data, _id_from_name(name) or new_id(), name)
+    os.remove(path)
+    return os.path.join(directory, SEGMENT_DIR, name)
+
+
+def _segment_ref(path: str) -> Optional[Tuple[SegmentStore, str]]:
+    parent, name = os.path.split(path)
+    file_id = _id_from_name(name)
+    if os.path.basename(parent) != SEGMENT_DIR or file_id is None:
+        return None
+    return segment_store(os.path.dirname(parent)), file_id
+
+
+def read_result(path: str) -> Optional[bytes]:
+    """Bytes of a result, whether it is a plain file or packed into a segment."""
+    if os.path.isfile(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    ref = _segment_ref(path)
+    return ref[0].get(ref[1]) if ref is not None else None
+
+
+def result_exists(path: str) -> bool:
+    if not path:
+        return False
+    if os.path.exists(path):
+        return True
+    ref = _segment_ref(path)
+    return ref is not None and ref[1] in ref[0]
@@ -0,0 +1,164 @@
+import threading
+import time
+
+import cdp_cache
+from cdp_cache import CdpConnectionCache
+from playwright_runtime import PlaywrightThread
+
+
+class FakeSession:
+    def __init__(self, browser):
+        self.browser = browser
+
+    def send(self, method):
+        return {}
+
+    def detach(self):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.closed = False
+        self.probes = 0
+
+    def is_connected(self):
+        return not self.closed
+
+    def new_browser_cdp_session(self):
+        self.probes += 1
+        return FakeSession(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeChromium:
+    def __init__(self):
+        self.browsers = []
+
+    def connect_over_cdp(self, endpoint):
+        browser = FakeBrowser()
+        self.browsers.append(browser)
+        return browser
+
+
+class FakePlaywright:
+    chromium = FakeChromium()
+
+    def stop(self):
+        pass
+
+
+class FakeThread(PlaywrightThread):
+    def _start(self):
+        self._playwright = FakePlaywright()
+
+
+def test_busy_connection_is_not_probed_or_closed(monkeypatch):
+    monkeypatch.setattr(cdp_cache, 'PlaywrightThread', FakeThread)
+    FakePlaywright.chromium = FakeChromium()
+    cache = CdpConnectionCache(probe_after_s=0.05)
+    endpoint = 'ws://127.0.0.1:9222/devtools/browser/x'
+    try:
+        assert cache.run(endpoint, lambda browser: 'warm') == 'warm'
+        time.sleep(0.1)  # idle long enough for the next checkout to probe
+
+        slow_started = threading.Event()
+        results = {}
+
+        def slow():
+            def capture(browser):
+                slow_started.set()
+                time.sleep(0.5)
+                return 'slow'
+            results['slow'] = cache.run(endpoint, capture)
+
+        def fast():
+            slow_started.wait(5)
+            time.sleep(0.1)  # the connection looks idle by last_used, but it is busy
+            results['fast'] = cache.run(endpoint, lambda browser: 'fast')
+
+        threads = [threading.Thread(target=slow), threading.Thread(target=fast)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+
+        assert results == {'slow': 'slow', 'fast': 'fast'}
+        browsers = FakePlaywright.chromium.browsers
+        assert len(browsers) == 1
+        assert not browsers[0].closed
+        # Only the slow call's checkout (connection unused and idle) probed
+        assert browsers[0].probes == 1
+        assert cache.stats()['reconnects'] == 0
+    finally:
+        cache.close_all()
+
+
+def test_discard_local_drops_every_endpoint_for_the_port(monkeypatch):
+    monkeypatch.setattr(cdp_cache, 'PlaywrightThread', FakeThread)
+    FakePlaywright.chromium = FakeChromium()
+    cache = CdpConnectionCache()
+    try:
+        for endpoint in (
+            'http://127.0.0.1:9222',
+            'ws://127.0.0.1:9222/devtools/browser/x',
+            'http://127.0.0.1:9223',
+        ):
+            cache.run(endpoint, lambda browser: None)
+        cache.discard_local(9222)
+
+        closed = [b.closed for b in FakePlaywright.chromium.browsers]
+        assert closed == [True, True, False]
+        assert cache.stats()['open'] == 1
+    finally:
+        cache.close_all()
+
+
+def test_connections_share_a_fixed_set_of_drivers(monkeypatch):
+    monkeypatch.setattr(cdp_cache, 'PlaywrightThread', FakeThread)
+    FakePlaywright.chromium = FakeChromium()
+    cache = CdpConnectionCache(drivers=2)
+    try:
+        for port in range(9222, 9228):
+            cache.run(f'http://127.0.0.1:{port}', lambda browser: None)
+        stats = cache.stats()
+        assert stats['open'] == 6
+        assert stats['drivers'] == 2
+        threads = {conn.thread for conn in cache._conns.values()}
+        assert len(threads) == 2
+
+        # A dropped connection is reconnected on a shared driver and the call retried
+        FakePlaywright.chromium.browsers[0].closed = True
+
+        def capture(browser):
+            if browser.closed:
+                raise RuntimeError('Target closed')
+            return 'ok'
+
+        assert cache.run('http://127.0.0.1:9222', capture) == 'ok'
+        assert cache.stats()['reconnects'] == 1
+        assert cache.stats()['drivers'] == 2
+    finally:
+        cache.close_all()
+
+
+def test_reaper_closes_idle_connections_without_traffic(monkeypatch):
+    monkeypatch.setattr(cdp_cache, 'PlaywrightThread', FakeThread)
+    FakePlaywright.chromium = FakeChromium()
+    cache = CdpConnectionCache(idle_timeout_s=0.1)
+    try:
+        cache.run('http://127.0.0.1:9222', lambda browser: None)
+        cache.start_reaper()
+        browser = FakePlaywright.chromium.browsers[0]
+        deadline = time.monotonic() + 5
+        while not browser.closed and time.monotonic() < deadline:
+            time.sleep(0.05)
+        # Closed by the reaper thread: nothing called run() or stats() meanwhile
+        assert browser.closed
+        assert len(cache._conns) == 0
+    finally:
+        cache.close_all()
+    cache._reaper.join(5)
+    assert not cache._reaper.is_alive()
@@ -0,0 +1,66 @@
+import threading
+import time
+
+from computer_pool import ComputerPool
+
+
+class FakeApi:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.alive = set()
+        self.destroyed = []
+
+    def create(self):
+        with self.lock:
+            self.next_id += 1
+            self.alive.add(self.next_id)
+            return self.next_id
+
+    def destroy(self, item):
+        with self.lock:
+            self.alive.discard(item)
+            self.destroyed.append(item)
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_overdue_lease_is_destroyed_and_counted_until_closed():
+    api = FakeApi()
+    pool = ComputerPool(api.create, api.destroy, size=0, max_total=1, max_lease_s=0.05)
+    try:
+        item = pool.acquire()
+        time.sleep(0.1)
+        pool._sweep()
+        assert _wait_for(lambda: item in api.destroyed)
+        assert _wait_for(lambda: pool.stats()['closing'] == 0)
+        assert pool.stats()['leased'] == 0
+        # A late release of the closed computer is ignored
+        pool.release(item)
+        assert api.destroyed.count(item) == 1
+        assert api.alive == set()
+    finally:
+        pool.close()
+
+
+def test_unhealthy_ready_computer_is_replaced():
+    api = FakeApi()
+    pool = ComputerPool(api.create, api.destroy, healthy=lambda item: item in api.alive, size=1, max_total=2)
+    try:
+        pool.start()
+        assert _wait_for(lambda: pool.stats()['ready'] == 1)
+        dead = next(iter(api.alive))
+        api.alive.discard(dead)  # died while idle
+        pool._sweep()
+        assert _wait_for(lambda: dead in api.destroyed)
+        assert _wait_for(lambda: pool.stats()['ready'] == 1)
+        assert pool.acquire(timeout=1) != dead
+    finally:
+        pool.close()
@@ -0,0 +1,46 @@
+from concurrency import AimdController
+
+
+def test_slow_start_then_additive_increase():
+    aimd = AimdController(initial=2, max_limit=20, cooldown_s=0)
+    for _ in range(3):
+        aimd.on_success()
+    assert aimd.limit == 5  # one per success while in slow start
+
+    aimd.on_capacity()
+    assert aimd.limit == 2  # 5 * 0.5, rounded down
+    assert aimd.stats()['slow_start'] is False
+    # Additive increase: about one per `limit` successes
+    aimd.on_success()
+    assert aimd.limit == 2
+    aimd.on_success()
+    assert aimd.limit == 3
+
+
+def test_decrease_is_bounded_and_once_per_cooldown():
+    aimd = AimdController(initial=8, min_limit=2, max_limit=8, cooldown_s=60)
+    for _ in range(5):  # one burst of 429s
+        aimd.on_capacity()
+    assert aimd.limit == 4
+    assert aimd.stats()['cuts'] == 1
+    assert aimd.stats()['capacity_errors'] == 5
+
+    floor = AimdController(initial=3, min_limit=2, max_limit=8, cooldown_s=0)
+    for _ in range(5):
+        floor.on_capacity()
+    assert floor.limit == 2
+
+
+def test_limit_caps_in_flight_and_never_exceeds_max():
+    aimd = AimdController(initial=2, max_limit=3, cooldown_s=0)
+    assert aimd.acquire(0) and aimd.acquire(0)
+    assert not aimd.acquire(0)
+    for _ in range(10):
+        aimd.on_success()
+    assert aimd.limit == 3
+    assert aimd.acquire(0)
+    aimd.on_capacity()
+    assert aimd.over_limit()
+    for _ in range(3):
+        aimd.release()
+    assert aimd.stats()['in_flight'] == 0
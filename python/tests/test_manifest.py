@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from manifest import prefetch, read_manifest
+
+
+def _rows(tmp_path, name, text, fmt=None):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return list(read_manifest(str(path), fmt))
+
+
+def test_csv_with_header_headerless_and_tsv(tmp_path):
+    rows = _rows(tmp_path, 'm.csv', 'URL,label,fullPage\nhttps://a.example/x,alpha,1\nhttps://www.nytimes.com/,,\n')
+    assert rows == [
+        ('https://a.example/x', 'alpha', {'fullpage': '1'}),
+        ('https://www.nytimes.com/', 'nytimes', {}),
+    ]
+    # A first row without a url cell is data, not a header
+    assert _rows(tmp_path, 'h.csv', 'https://a.example/,first\nnot a url\nhttps://b.example/\n') == [
+        ('https://a.example/', 'first', {}),
+        ('https://b.example/', 'b', {}),
+    ]
+    assert _rows(tmp_path, 't.tsv', 'url\tlabel\nhttps://a.example/\tx\n') == [('https://a.example/', 'x', {})]
+
+
+def test_jsonl_objects_strings_and_bad_lines(tmp_path, capsys):
+    text = (
+        '{"url": "https://a.example/", "label": "a", "options": {"fullPage": true}}\n'
+        '"https://b.example/"\n'
+        '\n'
+        '{"url": "https://c.example/", "width": 800}\n'
+        'not json\n'
+        '{"url": "ftp://d.example/"}\n'
+    )
+    # Detected from the first line when the extension says nothing
+    rows = _rows(tmp_path, 'm.manifest', text)
+    assert rows == [
+        ('https://a.example/', 'a', {'fullPage': True}),
+        ('https://b.example/', 'b', {}),
+        ('https://c.example/', 'c', {'width': 800}),
+    ]
+    assert capsys.readouterr().err.count('skipping row') == 2
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        _rows(tmp_path, 'm.csv', 'https://a.example/\n', fmt='xml')
+
+
+def test_prefetch_keeps_order_bounds_read_ahead_and_reraises():
+    read = []
+
+    def source():
+        for i in range(10):
+            read.append(i)
+            yield i
+
+    it = prefetch(source(), size=2)
+    assert next(it) == 0
+    threading.Event().wait(0.2)  # give the reader time to run ahead
+    assert len(read) <= 4  # the one handed out, `size` buffered, one waiting to be put
+    assert list(it) == list(range(1, 10))
+
+    def failing():
+        yield 1
+        raise OSError('disk gone')
+
+    it = prefetch(failing())
+    assert next(it) == 1
+    with pytest.raises(OSError, match='disk gone'):
+        next(it)
@@ -0,0 +1,162 @@
+import http.client
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from pooled_server import ChunkedResponseMixin, PooledHTTPServer
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = 5
+
+    def do_GET(self):
+        if self.path == '/slow':
+            time.sleep(2)
+        body = self.path.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(keepalive_s):
+    server = PooledHTTPServer(('127.0.0.1', 0), Handler, workers=1, keepalive_s=keepalive_s)
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    return server
+
+
+def _get(port, path, conn=None):
+    conn = conn or http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    conn.request('GET', path)
+    resp = conn.getresponse()
+    return conn, resp.read().decode('utf-8')
+
+
+def test_idle_keepalive_connection_does_not_hold_the_worker():
+    server = _serve(keepalive_s=30)
+    port = server.server_address[1]
+    try:
+        idle, body = _get(port, '/first')
+        assert body == '/first'
+
+        # The only worker is free while the first client sits idle
+        started = time.monotonic()
+        other, body = _get(port, '/health')
+        assert body == '/health'
+        assert time.monotonic() - started < 2
+        other.close()
+
+        # The idle connection is still usable
+        _, body = _get(port, '/again', idle)
+        assert body == '/again'
+        idle.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_pipelined_requests_and_idle_expiry():
+    server = _serve(keepalive_s=0.3)
+    port = server.server_address[1]
+    try:
+        sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+        sock.sendall(b'GET /a HTTP/1.1\r\nHost: x\r\n\r\nGET /b HTTP/1.1\r\nHost: x\r\n\r\n')
+        data = b''
+        while data.count(b'HTTP/1.1 200') < 2 or not data.endswith(b'/b'):
+            chunk = sock.recv(4096)
+            assert chunk
+            data += chunk
+        # Left idle past keepalive_s, the server closes it
+        assert sock.recv(4096) == b''
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_idle_connections_expire_while_every_worker_is_busy():
+    server = _serve(keepalive_s=0.3)
+    port = server.server_address[1]
+    try:
+        idle = socket.create_connection(('127.0.0.1', port), timeout=5)
+        idle.sendall(b'GET /idle HTTP/1.1\r\nHost: x\r\n\r\n')
+        data = b''
+        while not data.endswith(b'/idle'):
+            chunk = idle.recv(4096)
+            assert chunk
+            data += chunk
+        waiting, _ = _get(port, '/first')
+
+        slow = threading.Thread(target=_get, args=(port, '/slow'), daemon=True)
+        slow.start()
+        time.sleep(0.1)
+        queued = threading.Thread(target=_get, args=(port, '/queued'), daemon=True)
+        queued.start()
+        time.sleep(0.1)
+        # The worker is busy and the hand-off queue is full when this request arrives
+        waiting.request('GET', '/again')
+
+        # The idle thread keeps expiring connections instead of waiting for the worker
+        started = time.monotonic()
+        assert idle.recv(4096) == b''
+        assert time.monotonic() - started < 1.2
+        idle.close()
+
+        assert waiting.getresponse().read() == b'/again'
+        waiting.close()
+        slow.join(5)
+        queued.join(5)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class StreamingHandler(ChunkedResponseMixin, BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = 5
+
+    def _send(self, status, payload):
+        if self._abort_stream():
+            return
+        body = repr(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        try:
+            self._start_chunked(200, 'application/x-ndjson')
+            self._write_ndjson({'index': 0})
+            raise TimeoutError('client reads too slowly')
+        except Exception as e:
+            return self._send(500, {'error': str(e)})
+
+    def log_message(self, *args):
+        pass
+
+
+def test_error_after_stream_started_closes_instead_of_a_second_status():
+    server = PooledHTTPServer(('127.0.0.1', 0), StreamingHandler, workers=1, keepalive_s=30)
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    try:
+        sock = socket.create_connection(('127.0.0.1', server.server_address[1]), timeout=5)
+        sock.sendall(b'GET / HTTP/1.1\r\nHost: x\r\n\r\n')
+        data = b''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        sock.close()
+        assert data.count(b'HTTP/1.1') == 1
+        assert b'{"index": 0}' in data
+        assert b'500' not in data
+    finally:
+        server.shutdown()
+        server.server_close()
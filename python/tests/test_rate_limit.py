@@ -0,0 +1,34 @@
+import pytest
+
+import rate_limit
+from rate_limit import TokenBucket
+
+
+def test_burst_then_paced():
+    bucket = TokenBucket(rate=20, burst=2)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    # Waiters reserve their slot: each one queues a further 1/rate
+    assert bucket._reserve_local() == pytest.approx(0.05, abs=0.02)
+    assert bucket._reserve_local() == pytest.approx(0.10, abs=0.02)
+
+
+@pytest.mark.skipif(rate_limit.fcntl is None, reason='needs flock')
+def test_buckets_on_one_file_share_the_budget(tmp_path):
+    path = str(tmp_path / 'create.bucket')
+    first = TokenBucket(rate=20, burst=2, path=path)
+    second = TokenBucket(rate=20, burst=2, path=path)  # as another process would
+    assert first.acquire() == 0
+    assert second.acquire() == 0
+    assert first._reserve_shared() == pytest.approx(0.05, abs=0.02)
+    assert second._reserve_shared() == pytest.approx(0.10, abs=0.02)
+
+
+@pytest.mark.skipif(rate_limit.fcntl is None, reason='needs flock')
+def test_unreadable_state_file_starts_full(tmp_path):
+    path = tmp_path / 'create.bucket'
+    path.write_text('garbage\n', encoding='ascii')
+    bucket = TokenBucket(rate=20, burst=3, path=str(path))
+    assert bucket._reserve_shared() == 0
+    tokens, _ = path.read_text(encoding='ascii').split()
+    assert float(tokens) == pytest.approx(2.0, abs=0.02)
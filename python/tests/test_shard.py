@@ -0,0 +1,57 @@
+import json
+import os
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("tzafon")
+
+import shard  # noqa: E402
+from shard import ShardWorker  # noqa: E402
+
+
+def _manifest(tmp_path, name, urls):
+    path = tmp_path / name
+    path.write_text("".join(f"{u}\n" for u in urls), encoding="utf-8")
+    return str(path)
+
+
+def test_two_splits_into_one_queue_keep_every_chunk(tmp_path):
+    queue_dir = str(tmp_path / "queue")
+    first = _manifest(tmp_path, "a.txt", [f"https://a.example/{i}" for i in range(5)])
+    second = _manifest(tmp_path, "b.txt", [f"https://b.example/{i}" for i in range(5)])
+    assert shard.split(first, queue_dir, chunk_size=2) == 5
+    assert shard.split(second, queue_dir, chunk_size=2) == 5
+
+    pending = sorted(os.listdir(os.path.join(queue_dir, "pending")))
+    assert len(pending) == 6  # nothing overwritten by the second split
+    urls = []
+    for name in pending:
+        with open(os.path.join(queue_dir, "pending", name), encoding="utf-8") as f:
+            urls.extend(json.loads(line)["url"] for line in f)
+    assert sorted(urls) == sorted([f"https://a.example/{i}" for i in range(5)] + [f"https://b.example/{i}" for i in range(5)])
+    # Within one split, chunks sort in manifest order
+    assert [u for u in urls if "a.example" in u] == [f"https://a.example/{i}" for i in range(5)]
+
+
+def test_claim_then_steal_a_stale_chunk(tmp_path):
+    queue_dir = str(tmp_path / "queue")
+    shard.split(_manifest(tmp_path, "m.txt", ["https://example.com/1"]), queue_dir)
+
+    owner = ShardWorker(queue_dir, runner=None, stale_s=60)
+    owner.id = "host-1"
+    claimed = owner._claim()
+    assert claimed is not None and claimed.endswith("@host-1")
+    assert os.listdir(os.path.join(queue_dir, "pending")) == []
+
+    other = ShardWorker(queue_dir, runner=None, stale_s=60)
+    other.id = "host-2"
+    assert other._claim() is None  # the claim is fresh
+
+    old = time.time() - 120
+    os.utime(claimed, (old, old))  # the owner stopped heartbeating
+    stolen = other._claim()
+    assert stolen is not None and stolen.endswith("@host-2")
+    assert shard._chunk_name(stolen) == shard._chunk_name(claimed)
+    assert not os.path.exists(claimed)
@@ -0,0 +1,41 @@
+import base64
+import io
+import os
+
+import pytest
+
+pytest.importorskip('requests')
+
+import utils  # noqa: E402
+
+
+@pytest.mark.parametrize('size', [0, 1, 2, 3, 4, 57, 1000, 4099])
+def test_chunked_decode_matches_b64decode(monkeypatch, size):
+    monkeypatch.setattr(utils, '_B64_CHUNK', 16)  # many chunk boundaries
+    data = os.urandom(size)
+    text = base64.b64encode(data).decode('ascii')
+    # MIME-style line breaks land at every offset relative to the chunks
+    wrapped = '\n'.join(text[i:i + 19] for i in range(0, len(text), 19))
+    for payload in (text, wrapped, f'data:image/png;base64,{wrapped}'):
+        out = io.BytesIO()
+        written = utils._write_image(payload, out)
+        assert out.getvalue() == base64.b64decode(text)
+        assert written == size
+
+
+def test_decode_image_keeps_buffers_and_decodes_dict_shapes(monkeypatch):
+    monkeypatch.setattr(utils, '_B64_CHUNK', 8)
+    data = os.urandom(100)
+    assert bytes(utils._decode_image(data)) == data
+    encoded = base64.b64encode(data).decode('ascii')
+    assert utils._decode_image({'png': encoded}) == base64.b64decode(encoded)
+
+
+def test_invalid_base64_is_written_as_text(monkeypatch):
+    monkeypatch.setattr(utils, '_B64_CHUNK', 8)
+    out = io.BytesIO()
+    utils._write_image('abcde', out)  # one character short of a full quantum
+    assert out.getvalue() == b'abcde'
+    out = io.BytesIO()
+    assert utils._write_image('data:image/png;base64,abcde', out) == 0
+    assert out.getvalue() == b''
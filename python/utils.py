@@ -1,7 +1,14 @@
+import binascii
+import hashlib
+import io
 import os
+import random
+import re
+import time
 from datetime import datetime
-from typing import Any
-from urllib.request import urlopen
+from typing import Any, BinaryIO, Optional, Tuple, Union
+
+import http_client
 
 
 def ensure_dir(path: str) -> None:
@@ -13,62 +20,243 @@ def timestamp(prefix: str = "") -> str:
     return f"{prefix}{ts}"
 
 
-def _decode_image(result: Any) -> bytes:
-    """Decode screenshot result into raw PNG bytes.
+# Base64 characters decoded per step (a multiple of 4); bounds the temporary copies
+_B64_CHUNK = 1 << 20
+_B64_JUNK = re.compile(r"[^A-Za-z0-9+/=]+")
+
 
-    Handles bytes-like, memoryview, base64 strings, or data URLs.
+def _image_payload(result: Any) -> Tuple[Any, int]:
+    """Find the image in a screenshot result without copying it.
+
+    Returns ``(buffer, 0)`` for bytes-like data, ``(text, start)`` for a
+    base64 string or data URL whose payload begins at ``start``, or
+    ``(None, 0)``.
     """
-    if result is None:
-        return b""
     if isinstance(result, (bytes, bytearray, memoryview)):
-        return bytes(result)
+        return memoryview(result), 0
     if isinstance(result, str):
-        data = result.strip()
-        if data.startswith("data:image/"):
-            # data URL
-            try:
-                header, b64 = data.split(",", 1)
-                import base64
-
-                return base64.b64decode(b64)
-            except Exception:
-                return b""
-        # assume base64-encoded string
-        try:
-            import base64
-
-            return base64.b64decode(data)
-        except Exception:
-            return data.encode("utf-8", errors="ignore")
+        start = 0
+        while start < len(result) and result[start].isspace():
+            start += 1
+        if result.startswith("data:image/", start):
+            comma = result.find(",", start)
+            return (result, comma + 1) if comma >= 0 else (None, 0)
+        return result, start
     # Try common dict shapes
     if isinstance(result, dict):
         for key in ("png", "image", "data"):
             if key in result:
-                return _decode_image(result[key])
-    return b""
+                return _image_payload(result[key])
+    return None, 0
+
+
+def _write_b64(text: str, start: int, out: BinaryIO) -> int:
+    """Decode ``text[start:]`` into ``out`` a chunk at a time; returns bytes written."""
+    written = 0
+    carry = ""
+    for i in range(start, len(text), _B64_CHUNK):
+        chunk = text[i:i + _B64_CHUNK]
+        if not chunk.isascii():
+            raise ValueError("non-ASCII characters in base64 data")
+        # Drop what a2b_base64 would skip anyway, so the 4-character alignment is right
+        piece = carry + _B64_JUNK.sub("", chunk)
+        cut = len(piece) - len(piece) % 4
+        carry = piece[cut:]
+        if cut:
+            written += out.write(binascii.a2b_base64(piece[:cut]))
+    if carry:
+        raise binascii.Error("Incorrect padding")
+    return written
+
+
+def _write_image(result: Any, out: BinaryIO) -> int:
+    """Write a screenshot result's image bytes to ``out``; returns the decoded size.
+
+    Buffers are written as-is (no copy); base64 strings and data URLs are
+    decoded in ``_B64_CHUNK`` pieces. A string that is not valid base64 is
+    written as UTF-8 text, as before.
+    """
+    payload, start = _image_payload(result)
+    if payload is None:
+        return 0
+    if isinstance(payload, memoryview):
+        return out.write(payload)
+    pos = out.tell()
+    try:
+        return _write_b64(payload, start, out)
+    except (binascii.Error, ValueError):
+        out.seek(pos)
+        out.truncate()
+        if payload[:start].lstrip().startswith("data:"):
+            return 0  # a broken data URL is dropped, not saved as text
+        return out.write(payload[start:].strip().encode("utf-8", errors="ignore"))
+
+
+def _decode_image(result: Any) -> Union[bytes, memoryview]:
+    """Decode screenshot result into raw PNG bytes.
+
+    Handles bytes-like, memoryview, base64 strings, or data URLs. Bytes-like
+    input comes back as a memoryview over the same memory.
+    """
+    payload, _ = _image_payload(result)
+    if isinstance(payload, memoryview):
+        return payload
+    buf = io.BytesIO()
+    _write_image(result, buf)
+    return buf.getvalue()
 
 
-def save_screenshot(computer: Any, path: str) -> None:
-    """Call computer.screenshot() and persist to path."""
+def save_screenshot(computer: Any, path: str) -> int:
+    """Call computer.screenshot() and persist to path; returns the image size in bytes.
+
+    The image is streamed into ``path + '.part'`` and renamed into place, so
+    large captures are never held twice in memory.
+    """
     ensure_dir(os.path.dirname(path))
     try:
         fn = getattr(computer, "screenshot")
     except Exception:
         fn = None
-    data: bytes = b""
+    result: Any = None
     if callable(fn):
         try:
             result = fn()
-            data = _decode_image(result)
         except Exception:
-            data = b""
-    with open(path, "wb") as f:
-        f.write(data)
+            result = None
+    part = f"{path}.part"
+    with open(part, "wb") as f:
+        try:
+            size = _write_image(result, f)
+        except Exception:
+            f.seek(0)
+            f.truncate()
+            size = 0
+    os.replace(part, path)
+    return size
+
+
+# Statuses worth retrying; any other 4xx fails the download immediately
+_RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+def _download_defaults(
+    timeout: Optional[Tuple[float, float]], retries: Optional[int], backoff_s: Optional[float],
+) -> Tuple[Tuple[float, float], int, float]:
+    """Fill in unset download settings from DOWNLOAD_* variables, read at call time."""
+    if timeout is None:
+        timeout = (
+            float(os.environ.get("DOWNLOAD_CONNECT_TIMEOUT_S", "10")),
+            float(os.environ.get("DOWNLOAD_READ_TIMEOUT_S", "60")),
+        )
+    if retries is None:
+        retries = int(os.environ.get("DOWNLOAD_RETRIES", "3"))
+    if backoff_s is None:
+        backoff_s = float(os.environ.get("DOWNLOAD_BACKOFF_S", "0.5"))
+    return timeout, retries, backoff_s
 
 
-def download_to_file(url: str, path: str) -> None:
+def download_to_file(
+    url: str,
+    path: str,
+    timeout: Optional[Tuple[float, float]] = None,
+    retries: Optional[int] = None,
+    chunk_size: int = 64 * 1024,
+    sha256: Optional[str] = None,
+    backoff_s: Optional[float] = None,
+) -> int:
+    """Stream ``url`` to ``path`` and return the number of bytes written.
+
+    The body goes to ``path + '.part'`` one chunk at a time and is renamed
+    into place only when complete, so readers never see a partial file and
+    memory stays bounded by ``chunk_size``. A dropped transfer is resumed
+    with a ``Range`` request (or restarted if the server ignores it), up to
+    ``retries`` times with jittered exponential backoff. ``timeout`` is
+    (connect, read) seconds. Unset settings come from ``DOWNLOAD_*``
+    variables. If ``sha256`` is given the file is verified
+    before the rename and ``DownloadError`` is raised on a mismatch.
+    """
     ensure_dir(os.path.dirname(path))
-    with urlopen(url) as resp:  # nosec - URL provided by trusted SDK
-        data = resp.read()
-    with open(path, "wb") as f:
-        f.write(data)
+    part = f"{path}.part"
+    try:
+        with open(part, "wb") as f:
+            written, digest = _download(url, f, timeout, retries, chunk_size, backoff_s)
+        if sha256 and digest != sha256.lower():
+            raise DownloadError(f"sha256 mismatch for {url}: got {digest}")
+        os.replace(part, path)
+        return written
+    except BaseException:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        raise
+
+
+def fetch_bytes(
+    url: str,
+    timeout: Optional[Tuple[float, float]] = None,
+    retries: Optional[int] = None,
+    backoff_s: Optional[float] = None,
+) -> bytes:
+    """Download ``url`` into memory without touching disk, retrying like ``download_to_file``."""
+    buf = io.BytesIO()
+    _download(url, buf, timeout, retries, 64 * 1024, backoff_s)
+    return buf.getvalue()
+
+
+def _download(
+    url: str,
+    f: BinaryIO,
+    timeout: Optional[Tuple[float, float]],
+    retries: Optional[int],
+    chunk_size: int,
+    backoff_s: Optional[float],
+) -> Tuple[int, str]:
+    """Stream ``url`` into the seekable ``f`` with resume and retries; returns (size, sha256 hex)."""
+    timeout, retries, backoff_s = _download_defaults(timeout, retries, backoff_s)
+    written = 0
+    digest = hashlib.sha256()
+    last_err: Optional[Exception] = None
+    for attempt in range(max(0, retries) + 1):
+        if attempt:
+            time.sleep(backoff_s * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+        headers = {"Range": f"bytes={written}-"} if written else None
+        try:
+            stream = http_client.client().stream(url, headers=headers, timeout=timeout, chunk_size=chunk_size)
+            with stream as (resp, chunks):  # URL provided by trusted SDK
+                status = resp.status_code
+                if status == 416 and written and resp.headers.get("content-range") == f"bytes */{written}":
+                    break  # the previous attempt already had every byte
+                if status >= 400:
+                    last_err = DownloadError(f"HTTP {status} for {url}")
+                    if status in _RETRY_STATUSES:
+                        continue
+                    raise last_err
+                if written and status != 206:
+                    # Range not honoured: start over
+                    f.seek(0)
+                    f.truncate()
+                    written = 0
+                    digest = hashlib.sha256()
+                length = resp.headers.get("content-length")
+                expected = written + int(length) if length and "content-encoding" not in resp.headers else None
+                for chunk in chunks:
+                    f.write(chunk)
+                    digest.update(chunk)
+                    written += len(chunk)
+            if expected is not None and written < expected:
+                last_err = DownloadError(f"connection closed at {written}/{expected} bytes")
+                continue
+            break
+        except DownloadError:
+            raise
+        except Exception as e:  # noqa: BLE001 - network errors: resume from what we have
+            last_err = e
+            f.flush()
+    else:
+        raise DownloadError(f"download failed after {retries + 1} attempts: {last_err}")
+    return written, digest.hexdigest()
@@ -0,0 +1,153 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils import ensure_dir
+
+FSYNC_POLICIES = ('none', 'file', 'dir')
+
+
+class WriteBehind:
+    """Background writer that takes screenshot bytes off the capture path.
+
+    ``write(path, data)`` queues the bytes and returns a ``Future`` at once;
+    ``workers`` threads write each file to ``path + '.part'`` and rename it
+    into place. ``submit(data, fn, *args)`` runs any other storage step
+    (a CAS put, a segment append) on the same threads under the same cap. Queued data is capped at ``max_pending_bytes``: past that,
+    ``write`` blocks (backpressure) until writers catch up, so a slow disk
+    slows capture down instead of growing memory. ``fsync`` is ``none``
+    (leave it to the OS), ``file`` (fsync each file before the rename) or
+    ``dir`` (also fsync the directory after it). ``flush`` waits for
+    everything queued so far; ``close`` flushes and stops the writers.
+    With ``workers=0`` writes happen inline on the caller's thread.
+    """
+
+    def __init__(self, workers: int = 2, max_pending_bytes: int = 256 * 1024 * 1024, fsync: str = 'none') -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}' (choose from {', '.join(FSYNC_POLICIES)})")
+        self.workers = max(0, int(workers))
+        self.max_pending_bytes = max(1, int(max_pending_bytes))
+        self.fsync = fsync
+        self._queue: 'queue.Queue[Optional[Tuple[Callable[..., Any], Tuple[Any, ...], Any, Future]]]' = queue.Queue()
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._pending_bytes = 0
+        self._closed = False
+        self._written = 0
+        self._bytes_written = 0
+        self._errors = 0
+        self._blocked = 0
+        self._threads: List[threading.Thread] = []
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f'write-behind-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    @classmethod
+    def from_env(cls) -> 'WriteBehind':
+        return cls(
+            workers=int(os.environ.get('WRITE_BEHIND_WORKERS', '2')),
+            max_pending_bytes=int(os.environ.get('WRITE_BEHIND_MAX_BYTES', str(256 * 1024 * 1024))),
+            fsync=os.environ.get('WRITE_BEHIND_FSYNC', 'none'),
+        )
+
+    def write(self, path: str, data: Any) -> 'Future[int]':
+        """Queue ``data`` (any bytes-like object) for ``path``; the future resolves to its size."""
+        return self.submit(data, self.write_file, path, data)
+
+    def submit(self, data: Any, fn: Callable[..., Any], *args: Any) -> Future:
+        """Queue ``fn(*args)``, counting ``data`` against the cap; the future resolves to its result."""
+        fut: Future = Future()
+        size = memoryview(data).nbytes
+        if self.workers == 0:
+            self._run(fn, args, size, fut)
+            return fut
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('write-behind is closed')
+            if self._pending_bytes and self._pending_bytes + size > self.max_pending_bytes:
+                self._blocked += 1
+                # An oversized file still goes through once the queue has drained
+                while self._pending_bytes and self._pending_bytes + size > self.max_pending_bytes:
+                    self._cond.wait()
+            self._pending += 1
+            self._pending_bytes += size
+        self._queue.put((fn, args, size, fut))
+        return fut
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued write has finished; False if ``timeout`` ran out first."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+        self.flush(timeout)
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'fsync': self.fsync,
+                'pending': self._pending,
+                'pending_bytes': self._pending_bytes,
+                'written': self._written,
+                'bytes_written': self._bytes_written,
+                'errors': self._errors,
+                'blocked': self._blocked,
+            }
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            fn, args, size, fut = item
+            try:
+                self._run(fn, args, size, fut)
+            finally:
+                with self._cond:
+                    self._pending -= 1
+                    self._pending_bytes -= size
+                    self._cond.notify_all()
+
+    def _run(self, fn: Callable[..., Any], args: Tuple[Any, ...], size: int, fut: Future) -> None:
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            with self._cond:
+                self._errors += 1
+            fut.set_exception(e)
+            return
+        with self._cond:
+            self._written += 1
+            self._bytes_written += size
+        fut.set_result(result)
+
+    def write_file(self, path: str, data: Any) -> int:
+        """Write ``data`` to ``path`` now, on the caller's thread (what the writer threads run)."""
+        directory = os.path.dirname(path)
+        ensure_dir(directory or '.')
+        part = f'{path}.part'
+        with open(part, 'wb') as f:
+            size = f.write(data)
+            if self.fsync != 'none':
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(part, path)
+        if self.fsync == 'dir':
+            fd = os.open(directory or '.', os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        return size